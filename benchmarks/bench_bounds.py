@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for converting CF bounds to cell edges
+"""
+
+from xncview.plot import _get_bounds
+from xncview.edges import centre_edges, curvilinear_edges
+
+from .generators import km_scale_grid, curvilinear_grid
+
+
+class TimeGetBoundsRegular:
+    params = [100, 10]
+    param_names = ['resolution_km']
+
+    def setup(self, resolution_km):
+        self.dataset = km_scale_grid(resolution_km)
+
+    def time_get_bounds(self, resolution_km):
+        _get_bounds(self.dataset, 'lat')
+        _get_bounds(self.dataset, 'lon')
+
+
+class TimeGetBoundsCurvilinear:
+    params = [(300, 360), (1080, 1440), (2700, 3600)]
+    param_names = ['shape']
+
+    def setup(self, shape):
+        self.dataset = curvilinear_grid(*shape)
+
+    def time_get_bounds(self, shape):
+        _get_bounds(self.dataset, 'lat')
+        _get_bounds(self.dataset, 'lon')
+
+    def peakmem_get_bounds(self, shape):
+        _get_bounds(self.dataset, 'lat')
+        _get_bounds(self.dataset, 'lon')
+
+
+class TimeInferEdges:
+    params = [(300, 360), (1080, 1440), (2700, 3600)]
+    param_names = ['shape']
+
+    def setup(self, shape):
+        dataset = curvilinear_grid(*shape)
+        self.lat = dataset.lat.values
+        self.lon = dataset.lon.values
+
+    def time_centre_edges(self, shape):
+        centre_edges(self.lat[:, 0])
+        centre_edges(self.lon[0, :], period=360)
+
+    def time_curvilinear_edges(self, shape):
+        curvilinear_edges(self.lat)
+        curvilinear_edges(self.lon, period=360)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for the lookup table image renderer
+"""
+
+from xncview.image import LutImage
+
+from .generators import regular_grid
+
+
+class TimeLutImage:
+    params = [(720, 1440), (2160, 4320)]
+    param_names = ['shape']
+
+    def setup(self, shape):
+        self.dataset = regular_grid(*shape)
+        self.values = self.dataset['var0'].isel(time=0).load()
+        self.image = LutImage.for_slice(self.dataset, self.values, 'lon', 'lat', vmin=-1, vmax=1)
+
+    def time_for_slice(self, shape):
+        LutImage.for_slice(self.dataset, self.values, 'lon', 'lat', vmin=-1, vmax=1)
+
+    def time_set_array(self, shape):
+        self.image.set_array(self.values.values)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for working out what the variables in a dataset are
+"""
+
+import xarray
+
+from xncview.interpret_cf import classify_vars, identify_lat, identify_lon
+from xncview.plot import _get_variable_dims
+
+from .generators import regular_grid, curvilinear_grid
+
+
+class TimeClassifyVars:
+    params = [10, 1000]
+    param_names = ['nvars']
+
+    def setup(self, nvars):
+        self.dataset = regular_grid(10, 20, nvars=nvars)
+
+    def time_classify_vars(self, nvars):
+        classify_vars(self.dataset)
+
+
+class TimeVariableDims:
+    params = ['regular', 'curvilinear']
+    param_names = ['grid']
+
+    def setup(self, grid):
+        if grid == 'regular':
+            ds = regular_grid(1800, 3600, ntime=100)
+        else:
+            ds = curvilinear_grid(1080, 1440, ntime=100)
+        self.variable = xarray.decode_cf(ds).var0
+
+    def time_get_variable_dims(self, grid):
+        _get_variable_dims(self.variable)
+
+    def time_identify_axes(self, grid):
+        identify_lat(self.variable)
+        identify_lon(self.variable)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for opening multi-file collections
+"""
+
+import argparse
+
+from xncview.cli import Preprocessor
+
+from .generators import write_collection
+
+
+class TimeOpenDataset:
+    params = ([10, 2000], ['standard', 'noleap', '360_day'])
+    param_names = ['nfiles', 'calendar']
+    timeout = 600
+
+    def setup_cache(self):
+        # Files are written to the benchmark's cache directory once per run
+        files = {}
+        for nfiles in self.params[0]:
+            for calendar in self.params[1]:
+                files[nfiles, calendar] = write_collection(f'collection_{nfiles}_{calendar}',
+                        nfiles, 90, 180, calendar=calendar)
+        return files
+
+    def _preprocessor(self, files):
+        return Preprocessor(argparse.ArgumentParser(add_help=False), files)
+
+    def time_open_dataset(self, files, nfiles, calendar):
+        self._preprocessor(files[nfiles, calendar])._open_dataset()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for the aggregating rasteriser
+"""
+
+from xncview.raster import build_mapping
+
+from .generators import curvilinear_grid
+
+
+class TimeRaster:
+    params = [(1080, 1440), (2700, 3600)]
+    param_names = ['shape']
+
+    def setup(self, shape):
+        self.dataset = curvilinear_grid(*shape)
+        self.mapping = build_mapping(self.dataset, 'lon', 'lat', (800, 1200))
+        self.values = self.dataset['var0'].isel(time=0).load()
+
+    def time_build_mapping(self, shape):
+        build_mapping(self.dataset, 'lon', 'lat', (800, 1200))
+
+    def time_rasterise_mean(self, shape):
+        self.mapping.rasterise(self.values.transpose(*self.mapping.dims).values, 'mean')
+
+    def time_rasterise_max(self, shape):
+        self.mapping.rasterise(self.values.transpose(*self.mapping.dims).values, 'max')
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for reprojecting grids onto the screen
+"""
+
+from xncview.plot import geographic_projection
+from xncview.reproject import ReprojectionWeights, grid_extent
+
+from .generators import regular_grid, curvilinear_grid
+
+
+class TimeReproject:
+    params = [['regular', 'curvilinear'], ['Robinson', 'NorthPolarStereo']]
+    param_names = ['grid', 'projection']
+
+    def setup(self, grid, projection):
+        if grid == 'regular':
+            self.dataset = regular_grid(721, 1440)
+        else:
+            self.dataset = curvilinear_grid(720, 1440)
+        self.projection = geographic_projection(projection)
+        self.extent = grid_extent(self.dataset, 'lon', 'lat', self.projection)
+        self.weights = ReprojectionWeights(self.dataset, 'lon', 'lat', self.projection, self.extent, (600, 1000))
+        self.values = self.dataset['var0'].isel(time=0).transpose(*self.weights.dims).values
+
+    def time_weights(self, grid, projection):
+        ReprojectionWeights(self.dataset, 'lon', 'lat', self.projection, self.extent, (600, 1000))
+
+    def time_frame(self, grid, projection):
+        self.weights.rasterise(self.values)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for drawing frames in the QT widget
+"""
+
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import sys
+import xarray
+from matplotlib.backends.qt_compat import QtWidgets as QW
+
+from xncview.widget import Widget
+
+from .generators import regular_grid, curvilinear_grid
+
+
+class TimeRedraw:
+    params = ['regular', 'curvilinear']
+    param_names = ['grid']
+
+    def setup(self, grid):
+        self.app = QW.QApplication.instance() or QW.QApplication(sys.argv)
+
+        if grid == 'regular':
+            ds = regular_grid(720, 1440, ntime=10)
+        else:
+            ds = curvilinear_grid(300, 360, ntime=10)
+        ds = xarray.decode_cf(ds).chunk({'time': 1})
+
+        self.widget = Widget(ds)
+        self.widget.resize(1200, 800)
+
+    def teardown(self, grid):
+        self.widget.close()
+
+    def time_redraw(self, grid):
+        self.widget.redraw()
+
+    def time_change_variable(self, grid):
+        self.widget.change_variable()
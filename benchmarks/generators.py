@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reproducible synthetic datasets for the benchmarks
+
+All data comes from a seeded random generator, so the same arguments always
+give the same dataset. Collections can also be written from the command line
+to benchmark the viewer by hand:
+
+    python -m benchmarks.generators --files 2000 --shape 180 360 /tmp/collection
+"""
+
+import os
+import argparse
+import numpy
+import xarray
+
+
+#: Earth's circumference in km, for converting grid spacing to grid size
+circumference = 40075.0
+
+
+def _time(ntime, calendar, start=0):
+    """
+    Encoded time axis, decoding gives cftime objects for non-standard calendars
+    """
+    return xarray.DataArray(numpy.arange(start, start + ntime, dtype='f8'), dims=['time'],
+            attrs={'units': 'days since 2000-01-01', 'calendar': calendar, 'axis': 'T'})
+
+
+def _field(rng, shape):
+    return rng.standard_normal(shape).astype('f4')
+
+
+def regular_grid(nlat, nlon, ntime=1, calendar='standard', nvars=1, seed=0, time_start=0):
+    """
+    Regular lat-lon grid with 1D bounds
+
+    Args:
+        nlat, nlon: Grid size
+        ntime: Number of times
+        calendar: CF calendar of the time axis
+        nvars: Number of data variables
+        seed: Random seed
+        time_start: Offset of the first time in days
+
+    Returns:
+        Encoded xarray.Dataset, use xarray.decode_cf() to get cftime values
+    """
+    rng = numpy.random.default_rng(seed)
+
+    lat_edges = numpy.linspace(-90, 90, nlat + 1)
+    lon_edges = numpy.linspace(0, 360, nlon + 1)
+
+    ds = xarray.Dataset(coords={
+        'time': _time(ntime, calendar, time_start),
+        'lat': ('lat', (lat_edges[:-1] + lat_edges[1:]) / 2,
+            {'units': 'degrees_north', 'axis': 'Y', 'bounds': 'lat_bnds'}),
+        'lon': ('lon', (lon_edges[:-1] + lon_edges[1:]) / 2,
+            {'units': 'degrees_east', 'axis': 'X', 'bounds': 'lon_bnds'}),
+        })
+    ds['lat_bnds'] = (['lat', 'bnds'], numpy.stack([lat_edges[:-1], lat_edges[1:]], axis=1))
+    ds['lon_bnds'] = (['lon', 'bnds'], numpy.stack([lon_edges[:-1], lon_edges[1:]], axis=1))
+
+    for i in range(nvars):
+        ds[f'var{i}'] = (['time', 'lat', 'lon'], _field(rng, (ntime, nlat, nlon)))
+
+    return ds
+
+
+def km_scale_grid(resolution_km, ntime=1, calendar='standard', seed=0):
+    """
+    Global regular grid with the given spacing at the equator
+    """
+    nlon = int(round(circumference / resolution_km))
+    return regular_grid(nlon // 2, nlon, ntime=ntime, calendar=calendar, seed=seed)
+
+
+def curvilinear_grid(ny, nx, ntime=1, calendar='standard', seed=0):
+    """
+    Distorted grid with 2D coordinates and 4-corner bounds, like an ocean
+    model's tripolar grid
+
+    Args:
+        ny, nx: Grid size
+        ntime: Number of times
+        calendar: CF calendar of the time axis
+        seed: Random seed
+
+    Returns:
+        Encoded xarray.Dataset
+    """
+    rng = numpy.random.default_rng(seed)
+
+    j, i = numpy.meshgrid(numpy.linspace(0, 1, ny + 1), numpy.linspace(0, 1, nx + 1), indexing='ij')
+    lon_edges = 360 * i + 10 * numpy.sin(numpy.pi * j) * numpy.sin(2 * numpy.pi * i)
+    lat_edges = -80 + 170 * j + 5 * numpy.sin(2 * numpy.pi * i) * j
+
+    # Corners counter-clockwise from the lower left of each cell
+    def corners(edges):
+        return numpy.stack([edges[:-1, :-1], edges[:-1, 1:], edges[1:, 1:], edges[1:, :-1]], axis=-1)
+
+    lon_corners = corners(lon_edges)
+    lat_corners = corners(lat_edges)
+
+    ds = xarray.Dataset(coords={
+        'time': _time(ntime, calendar),
+        'lat': (['y', 'x'], lat_corners.mean(axis=-1),
+            {'units': 'degrees_north', 'bounds': 'lat_vertices'}),
+        'lon': (['y', 'x'], lon_corners.mean(axis=-1),
+            {'units': 'degrees_east', 'bounds': 'lon_vertices'}),
+        })
+    ds['lat_vertices'] = (['y', 'x', 'vertices'], lat_corners)
+    ds['lon_vertices'] = (['y', 'x', 'vertices'], lon_corners)
+    ds['var0'] = (['time', 'y', 'x'], _field(rng, (ntime, ny, nx)))
+
+    return ds
+
+
+def write_collection(path, nfiles, nlat, nlon, calendar='standard', seed=0):
+    """
+    Write a multi-file collection with one time per file
+
+    Args:
+        path: Output directory
+        nfiles: Number of files
+        nlat, nlon: Grid size
+        calendar: CF calendar of the time axis
+        seed: Random seed
+
+    Returns:
+        list of file names, in time order
+    """
+    os.makedirs(path, exist_ok=True)
+
+    files = []
+    for n in range(nfiles):
+        ds = regular_grid(nlat, nlon, ntime=1, calendar=calendar, seed=seed + n, time_start=n)
+        f = os.path.join(path, f'sample_{n:06d}.nc')
+        ds.to_netcdf(f)
+        files.append(f)
+
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic multi-file collection')
+    parser.add_argument('--files', type=int, default=1000, help='Number of files')
+    parser.add_argument('--shape', type=int, nargs=2, default=(180, 360), metavar=('NLAT', 'NLON'), help='Grid size')
+    parser.add_argument('--calendar', default='standard', help='CF calendar')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('path', help='Output directory')
+    args = parser.parse_args()
+
+    write_collection(args.path, args.files, *args.shape, calendar=args.calendar, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,24 +17,68 @@
 # limitations under the License.
 
 from .widget import Widget
+from .panels import MultiWidget
+from .scheduler import Scheduler
+from .ugrid import mesh_coords
 
 import sys
 from matplotlib.backends.qt_compat import QtWidgets as QW
 
 
-def xncview(dataset):
+def xncview(dataset, profile=None, scheduler=None, panels=None, compare=None, offload=False,
+        slice_encoding='float'):
     """
     Starts a QT window to display the data
 
     Args:
         dataset: xarray.Dataset
+        profile: Path to write per-frame timings to as JSON lines on exit
+        scheduler: Dask scheduler for heavy computations, either a
+            :class:`xncview.scheduler.Scheduler` or a description like
+            'threads:4', 'processes', 'local:4' or 'tcp://host:8786'
+        panels: List of variables to show side by side, sharing dimension
+            controls
+        compare: Second xarray.Dataset on the same grid, to show alongside or
+            subtracted from dataset
+        offload: Read and colour playback frames in a worker process, so
+            they don't hold up the QT event loop
+        slice_encoding: How cached slices are stored, one of
+            :data:`xncview.encoding.encodings`
     """
+    if panels and compare is not None:
+        raise ValueError('Comparing datasets is not supported with multiple panels')
+
+    # Variables on UGRID meshes are plotted against the face or node positions
+    dataset = mesh_coords(dataset)
+    if compare is not None:
+        compare = mesh_coords(compare)
+
     QApp = QW.QApplication.instance()
     if QApp is None:
         QApp = QW.QApplication(sys.argv)
 
-    widget = Widget(dataset)
+    if panels:
+        widget = MultiWidget(dataset, panels, scheduler=scheduler, slice_encoding=slice_encoding)
+    else:
+        widget = Widget(dataset, scheduler=scheduler, compare=compare, offload=offload,
+                slice_encoding=slice_encoding)
     widget.resize(1200,800)
     widget.show()
 
-    return QApp.exec_()
+    if profile is not None:
+        widget.timer.record()
+
+    result = QApp.exec_()
+
+    if profile is not None:
+        widget.timer.write_trace(profile)
+
+    # Only shut down schedulers started here
+    if not isinstance(scheduler, Scheduler):
+        widget.scheduler.close()
+
+    if isinstance(widget, Widget) and widget.frames is not None:
+        widget.playback.stop()
+        widget.frames.close()
+
+    return result
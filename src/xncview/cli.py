@@ -17,8 +17,16 @@
 # limitations under the License.
 
 from . import xncview
+from . import render
+from . import serve
+from . import memory
+from . import ugrid
+from . import flipbook
+from .encoding import encodings
 
 import argparse
+import dask.utils
+import cProfile
 import sys
 import xarray
 import os
@@ -26,11 +34,42 @@ import pandas
 import textwrap
 
 
+def is_zarr(path):
+    """
+    Does path look like a zarr store?
+    """
+    if path.rstrip('/').endswith('.zarr'):
+        return True
+    return any(os.path.exists(os.path.join(path, f)) for f in ['.zmetadata', '.zgroup', 'zarr.json'])
+
+
+def _configure_zarr(threads):
+    """
+    Set the number of threads used to decompress and fetch zarr chunks
+    """
+    try:
+        from numcodecs import blosc
+    except ImportError:
+        return
+
+    # Use Blosc's own threads even when called from dask's worker threads
+    blosc.use_threads = True
+    blosc.set_nthreads(threads)
+
+    import zarr
+    if hasattr(zarr, 'config'):
+        zarr.config.set({'async.concurrency': threads, 'threading.max_workers': threads})
+
+
 class Preprocessor:
     description = """
     Visualise a climate and weather data file
 
     See `xncview --preprocessor FOO --help` for help with a specific pre-processor
+
+    Use `xncview render ...` to write frames or an animation without a display
+
+    Use `xncview serve ...` to browse map tiles over HTTP
     """
 
     def __init__(self, top_parser, argv):
@@ -38,6 +77,10 @@ class Preprocessor:
                 description=textwrap.dedent(self.description),
                 formatter_class=argparse.RawDescriptionHelpFormatter)
         parser.add_argument('input', nargs='*', help='Input files')
+        parser.add_argument('--zarr', action='store_true', help='Inputs are zarr stores (default detected from the paths)')
+        parser.add_argument('--compare', action='append', default=None, metavar='FILE',
+                help='Second dataset to compare against, showing A, B or A-B (repeat for multiple files)')
+        parser.add_argument('--zarr-threads', type=int, default=os.cpu_count(), help='Threads for zarr chunk decompression')
         parser = self._init_parser(parser)
 
         #: Command-line arguments
@@ -55,6 +98,9 @@ class Preprocessor:
 
         Default implementation sets up chunking
         """
+        if self.args.zarr or (len(self.args.input) > 0 and all(is_zarr(p) for p in self.args.input)):
+            return self._open_zarr()
+
         try:
             dataset = xarray.open_mfdataset(self.args.input, chunks={}, data_vars='minimal')
         except ValueError: # Decoding error?
@@ -65,6 +111,21 @@ class Preprocessor:
 
         return dataset
 
+    def _open_zarr(self):
+        """
+        Open the zarr stores provided by self.args.input
+
+        Consolidated metadata is used if present so opening doesn't need to
+        list the store, and the store's own chunks are kept for slicing
+        """
+        _configure_zarr(self.args.zarr_threads)
+
+        kwargs = {'engine': 'zarr', 'chunks': {}, 'data_vars': 'minimal'}
+        try:
+            return xarray.open_mfdataset(self.args.input, backend_kwargs={'consolidated': True}, **kwargs)
+        except (KeyError, ValueError): # No consolidated metadata
+            return xarray.open_mfdataset(self.args.input, backend_kwargs={'consolidated': False}, **kwargs)
+
     def _do_preprocess(self, dataset):
         """
         Run any preprocessing steps (extension point) 
@@ -76,7 +137,24 @@ class Preprocessor:
         Do the pre-processing
         """
         ds = self._open_dataset()
-        return self._do_preprocess(ds)
+        return ugrid.mesh_coords(self._do_preprocess(ds))
+
+    def compare_dataset(self):
+        """
+        Open and pre-process the --compare files the same way as the inputs
+
+        Returns:
+            xarray.Dataset, or None if no files were given
+        """
+        if not self.args.compare:
+            return None
+
+        inputs = self.args.input
+        self.args.input = self.args.compare
+        try:
+            return self()
+        finally:
+            self.args.input = inputs
 
 
 class PreprocessorOasis(Preprocessor):
@@ -158,20 +236,79 @@ preprocessors = {
     }
 
 
-def main():
+#: Subcommands, the default is to open the viewer
+commands = ['view', 'render', 'serve']
+
+
+def main(argv=None):
     """
     Preview a NetCDF file
     """
+    if argv is None:
+        argv = sys.argv[1:]
+    argv = list(argv)
+
+    command = 'view'
+    if len(argv) > 0 and argv[0] in commands:
+        command = argv.pop(0)
+
     parser = argparse.ArgumentParser(allow_abbrev=False, add_help=False)
     parser.add_argument('--preprocessor', '-P', choices=preprocessors, default='none', help='Input file pre-processor')
-
-    args, pp_args = parser.parse_known_args()
+    parser.add_argument('--profile', metavar='TRACE', default=None, help='Write per-frame stage timings to TRACE as JSON lines on exit')
+    parser.add_argument('--max-memory', type=dask.utils.parse_bytes, default=None, help='Memory limit for caches and computations, e.g. 4GB')
+    parser.add_argument('--scheduler', default='threads',
+            help="Dask scheduler for heavy computations: 'threads[:N]', 'processes[:N]', 'local[:N]' for a LocalCluster, or a scheduler address")
+    parser.add_argument('--panels', type=lambda s: s.split(','), default=None, metavar='VAR,VAR,...',
+            help='Show several variables side by side, sharing dimension controls')
+    parser.add_argument('--mesh-cache', metavar='DIR', default=None,
+            help='Directory to save unstructured mesh geometry in, so it is only read once')
+    parser.add_argument('--flipbook-cache', metavar='DIR', default=None,
+            help='Directory to keep rendered flipbooks in, so they can be reused by later sessions')
+    parser.add_argument('--offload', action='store_true',
+            help='Read and colour playback frames in a separate process, keeping the viewer responsive')
+    parser.add_argument('--slice-encoding', choices=encodings, default='float',
+            help='Store cached slices quantised to 8 or 16 bits over the colour range, or compressed')
+    parser.add_argument('--cprofile', metavar='STATS', default=None, help='Write cProfile statistics to STATS on exit')
+
+    args, pp_args = parser.parse_known_args(argv)
+
+    memory.budget.limit = args.max_memory
+    ugrid.cache_directory = args.mesh_cache
+    flipbook.cache_directory = args.flipbook_cache
+
+    if command == 'render':
+        render.add_arguments(parser)
+        pp_args = argv
+    elif command == 'serve':
+        serve.add_arguments(parser)
+        pp_args = argv
 
     # Hand over to the pre-processor
-    dataset = preprocessors[args.preprocessor](parser, pp_args)()
+    preprocessor = preprocessors[args.preprocessor](parser, pp_args)
+    dataset = preprocessor()
     print(dataset)
 
-    xncview(dataset)
+    if command == 'render':
+        render.render(dataset, preprocessor.args)
+        return
+
+    if command == 'serve':
+        serve.serve(dataset, preprocessor.args)
+        return
+
+    profiler = None
+    if args.cprofile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    compare = preprocessor.compare_dataset()
+
+    xncview(dataset, profile=args.profile, scheduler=args.scheduler, panels=args.panels,
+            compare=compare, offload=args.offload, slice_encoding=args.slice_encoding)
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
 
 
 if __name__ == '__main__':
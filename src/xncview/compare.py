@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Comparing two datasets on the same grid
+
+The grids are checked once when the comparison is set up, after which the
+difference of a variable is formed directly from the underlying arrays
+without any xarray alignment. The difference is lazy, so only the slice
+being displayed is ever computed.
+"""
+
+import numpy
+import xarray
+import dask
+import dask.array
+from matplotlib.backends.qt_compat import QtCore
+
+from .reduce import chunk_ranges
+
+
+#: Comparison modes
+modes = ['A', 'B', 'A-B']
+
+
+def _same_coordinate(a, b):
+    if a.dims != b.dims or a.shape != b.shape:
+        return False
+    if a.dtype.kind in 'fc' and b.dtype.kind in 'fc':
+        return numpy.allclose(a.values, b.values, equal_nan=True)
+    return numpy.array_equal(a.values, b.values)
+
+
+def check_alignment(a, b, name):
+    """
+    Check a variable is on the same grid in both datasets
+
+    Raises:
+        ValueError if the dimensions or coordinates differ
+    """
+    va = a[name]
+    vb = b[name]
+
+    if va.dims != vb.dims or va.shape != vb.shape:
+        raise ValueError(f'"{name}" has dimensions {dict(va.sizes)} in A but {dict(vb.sizes)} in B')
+
+    for c in va.coords:
+        if c in vb.coords and not _same_coordinate(va[c], vb[c]):
+            raise ValueError(f'Coordinate "{c}" of "{name}" differs between A and B')
+
+
+class Comparison:
+    """
+    Two datasets with a common grid
+    """
+
+    def __init__(self, a, b):
+        """
+        Args:
+            a, b: xarray.Dataset
+
+        Raises:
+            ValueError if no data variables are shared on the same grid
+        """
+        self.a = a
+        self.b = b
+
+        #: Variables that can be compared
+        self.common = []
+
+        #: Variables that couldn't be compared, with the reason
+        self.skipped = {}
+
+        for name in a.data_vars:
+            if name not in b.data_vars:
+                continue
+            try:
+                check_alignment(a, b, name)
+                self.common.append(name)
+            except ValueError as e:
+                self.skipped[name] = str(e)
+
+        if len(self.common) == 0:
+            raise ValueError('The datasets have no variables on the same grid'
+                    + ''.join(f'\n    {e}' for e in self.skipped.values()))
+
+    def variable(self, name, mode):
+        """
+        The variable to show in a comparison mode
+
+        Variables not in both datasets are always taken from A
+
+        Args:
+            name: Variable name
+            mode: One of :data:`modes`
+
+        Returns:
+            xarray.DataArray, named after the variable and mode so slices of
+            each mode are cached separately
+        """
+        if mode not in modes:
+            raise ValueError(f'Unknown comparison mode "{mode}"')
+
+        if mode == 'A' or name not in self.common:
+            return self.a[name]
+
+        if mode == 'B':
+            return self.b[name].rename(f'{name} (B)')
+
+        va = self.a[name]
+        data = dask.array.asarray(va.data) - dask.array.asarray(self.b[name].data)
+        return xarray.DataArray(data, dims=va.dims, coords=va.coords, attrs=va.attrs,
+                name=f'{name} (A-B)')
+
+
+def stream_bounds(variable, compute=None, batch=1):
+    """
+    Minimum and maximum of a variable, a batch of chunks at a time
+
+    Args:
+        variable: xarray.DataArray
+        compute: Function computing a dask array (default dask.compute)
+        batch: Chunks per step
+
+    Yields:
+        (fraction complete, [min, max] so far)
+    """
+    if compute is None:
+        compute = lambda obj: dask.compute(obj)[0]
+
+    if variable.ndim == 0:
+        value = float(compute(variable.data))
+        yield 1.0, numpy.array([value, value])
+        return
+
+    bounds = numpy.array([numpy.nan, numpy.nan])
+    dim = variable.dims[0]
+    size = variable.sizes[dim]
+    for start, stop in chunk_ranges(variable, dim, batch):
+        block = dask.array.asarray(variable.isel({dim: slice(start, stop)}).data)
+        lo, hi = compute(dask.array.stack([dask.array.nanmin(block), dask.array.nanmax(block)]))
+        bounds = numpy.array([numpy.fmin(bounds[0], lo), numpy.fmax(bounds[1], hi)])
+        yield stop / size, bounds
+
+
+class BoundsJob(QtCore.QObject):
+    """
+    Runs :func:`stream_bounds` in the background
+
+    Signals are emitted from the worker thread with the job as the first
+    argument, connect them to methods of a QObject so they are queued to
+    that object's thread. Results are in :attr:`bounds`.
+    """
+
+    #: Signal emitted when the bounds are known
+    finished = QtCore.Signal(object)
+
+    #: Signal emitted with an error message if the computation fails
+    failed = QtCore.Signal(object, str)
+
+    def __init__(self, key, variable, compute=None):
+        """
+        Args:
+            key: Identifier of the result
+            variable: xarray.DataArray
+            compute: Function computing a dask array
+        """
+        super().__init__()
+
+        self.key = key
+        self.variable = variable
+        self.compute = compute
+
+        #: [min, max] of the variable
+        self.bounds = None
+
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Stop after the current chunk
+        """
+        self._cancelled = True
+
+    def run(self):
+        try:
+            bounds = None
+            for _, bounds in stream_bounds(self.variable, self.compute):
+                if self._cancelled:
+                    return
+            self.bounds = bounds
+            self.finished.emit(self)
+        except Exception as e:
+            self.failed.emit(self, str(e))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Cell edges of coordinates without CF bounds
+
+Edges are put half way between neighbouring centres, with the outer edges
+extrapolated by half a cell. Longitudes are unwrapped first so cells that
+cross the date line aren't stretched the whole way around the globe, and
+latitudes are kept within the poles.
+
+Inferred edges only depend on the coordinate values, so they are cached
+and only worked out once per grid rather than every redraw.
+"""
+
+import numpy
+import dask.base
+
+from . import memory
+from .interpret_cf import is_degrees, lat_units, lon_units
+
+
+#: Inferred edges, by (coordinate token, period, limits)
+edges = memory.BudgetCache(memory.budget, priority=2)
+
+
+def _wrapped_difference(d, period):
+    """
+    Shift differences by whole periods into [-period/2, period/2)
+    """
+    if period is None:
+        return d
+    return (d + period / 2) % period - period / 2
+
+
+def unwrap(centres, period, axis=-1):
+    """
+    Remove jumps of a whole period between neighbouring centres along an
+    axis
+    """
+    centres = numpy.asarray(centres, dtype='f8')
+    if period is None or centres.shape[axis] < 2:
+        return centres
+    d = _wrapped_difference(numpy.diff(centres, axis=axis), period)
+    first = numpy.take(centres, [0], axis=axis)
+    return numpy.concatenate([first, first + numpy.cumsum(d, axis=axis)], axis=axis)
+
+
+def _pad(centres, axis):
+    """
+    Extend centres by one cell at each end along an axis, extrapolating
+    linearly
+    """
+    n = centres.shape[axis]
+    if n == 1:
+        first = numpy.take(centres, [0], axis=axis)
+        return numpy.concatenate([first - 1, centres, first + 1], axis=axis)
+    start = 2 * numpy.take(centres, [0], axis=axis) - numpy.take(centres, [1], axis=axis)
+    end = 2 * numpy.take(centres, [n - 1], axis=axis) - numpy.take(centres, [n - 2], axis=axis)
+    return numpy.concatenate([start, centres, end], axis=axis)
+
+
+def centre_edges(centres, period=None):
+    """
+    Cell edges of a 1D coordinate
+
+    Args:
+        centres: 1D cell centres
+        period: Period of the coordinate, e.g. 360 for longitude
+
+    Returns:
+        numpy.ndarray with one more value than centres
+    """
+    padded = _pad(unwrap(centres, period), 0)
+    return (padded[1:] + padded[:-1]) / 2
+
+
+def curvilinear_edges(centres, period=None):
+    """
+    Cell corners of a 2D curvilinear coordinate, as the mean of the four
+    surrounding centres
+
+    Args:
+        centres: 2D cell centres
+        period: Period of the coordinate, e.g. 360 for longitude
+
+    Returns:
+        numpy.ndarray with one more row and column than centres
+    """
+    centres = numpy.asarray(centres, dtype='f8')
+    if period is not None:
+        # Make the first column continuous, then each row from it
+        first = unwrap(centres[:, :1], period, axis=0)
+        centres = numpy.concatenate([first, centres[:, 1:]], axis=1)
+        centres = unwrap(centres, period, axis=1)
+
+    padded = _pad(_pad(centres, 0), 1)
+    return (padded[:-1, :-1] + padded[:-1, 1:] + padded[1:, :-1] + padded[1:, 1:]) / 4
+
+
+def infer_edges(coord, token=None):
+    """
+    Cell edges of a coordinate, cached
+
+    Args:
+        coord: 1D or 2D xarray.DataArray of cell centres
+        token: Identifier of the coordinate, e.g. from
+            :func:`xncview.memory.variables_token`, otherwise its values are
+            hashed
+
+    Returns:
+        numpy.ndarray with one more value along each dimension than coord
+    """
+    period = 360.0 if is_degrees(coord, 'longitude', lon_units) else None
+    limits = (-90.0, 90.0) if is_degrees(coord, 'latitude', lat_units) else None
+
+    if token is None:
+        token = dask.base.tokenize(numpy.asarray(coord.values))
+    key = (token, period, limits)
+    result = edges.get(key)
+    if result is not None:
+        return result
+
+    if coord.ndim == 1:
+        result = centre_edges(coord.values, period)
+    elif coord.ndim == 2:
+        result = curvilinear_edges(coord.values, period)
+    else:
+        raise ValueError(f'Can\'t infer edges of "{coord.name}" with {coord.ndim} dimensions')
+
+    if limits is not None:
+        result = numpy.clip(result, *limits)
+
+    edges.put(key, result)
+    return result
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Compact encodings of cached slices
+
+Full precision slices of high resolution grids soon fill the cache. Slices
+can instead be kept as
+
+ * 'uint16' or 'uint8': quantised over the colour range they were read
+   for, with the largest code kept for NaN. A slice is read again if the
+   colour range moves past values that were clipped, or narrows so far
+   that fewer than :data:`min_steps` steps would be left in it
+ * 'compress': losslessly compressed, with Blosc if numcodecs is available
+   or zlib otherwise
+
+Decoding is a single vectorised lookup or decompression.
+"""
+
+import zlib
+
+import numpy
+import xarray
+
+
+#: Ways of storing cached slices
+encodings = ['float', 'uint16', 'uint8', 'compress']
+
+#: Fewest quantisation steps a colour range may cover before a quantised
+#: slice is read again
+min_steps = 64
+
+
+def _compressor():
+    """
+    Blosc compressor from numcodecs, None if it isn't installed
+    """
+    try:
+        from numcodecs import Blosc
+    except ImportError:
+        return None
+    return Blosc(cname='lz4', clevel=5, shuffle=Blosc.SHUFFLE)
+
+
+class EncodedSlice:
+    """
+    A cached slice, keeping the DataArray metadata to rebuild it
+    """
+
+    def __init__(self, value):
+        self.dims = value.dims
+        self.coords = value.coords
+        self.attrs = value.attrs
+        self.name = value.name
+        self.shape = value.shape
+        self.dtype = value.dtype
+
+        #: Bytes the slice would use unencoded
+        self.raw_nbytes = value.nbytes
+
+    def usable(self, bounds):
+        """
+        Is the slice good enough for a colour range, or does it need to be
+        read again?
+        """
+        return True
+
+    def decode(self):
+        """
+        The slice as an xarray.DataArray
+        """
+        return xarray.DataArray(self._values(), dims=self.dims, coords=self.coords,
+                attrs=self.attrs, name=self.name)
+
+
+class RawSlice(EncodedSlice):
+    """
+    A slice at full precision
+    """
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+    @property
+    def nbytes(self):
+        return self.raw_nbytes
+
+    def decode(self):
+        return self.value
+
+
+class QuantisedSlice(EncodedSlice):
+    """
+    A slice quantised to unsigned integers over a range
+    """
+
+    def __init__(self, value, bounds, dtype):
+        """
+        Args:
+            value: xarray.DataArray
+            bounds: (low, high) range to quantise over, values outside are
+                clipped. None to use the range of the slice
+            dtype: Unsigned integer type of the codes
+        """
+        super().__init__(value)
+
+        values = numpy.asarray(value.values, dtype='f8')
+        if bounds is None or not numpy.all(numpy.isfinite(bounds)):
+            with numpy.errstate(invalid='ignore'):
+                bounds = (numpy.nanmin(values), numpy.nanmax(values)) if numpy.isfinite(values).any() else (0, 1)
+        low, high = float(bounds[0]), float(bounds[1])
+        if not high > low:
+            high = low + 1
+
+        #: Code of NaN, codes below it are steps between low and high
+        self.nan_code = numpy.iinfo(dtype).max
+
+        #: Range covered by the codes
+        self.bounds = (low, high)
+
+        self.scale = (self.nan_code - 1) / (high - low)
+
+        scaled = (values - low) * self.scale
+        with numpy.errstate(invalid='ignore'):
+            #: Were values outside the range clipped?
+            self.clipped = (bool((scaled < 0).any()), bool((scaled > self.nan_code - 1).any()))
+
+        numpy.clip(scaled, 0, self.nan_code - 1, out=scaled)
+        numpy.rint(scaled, out=scaled)
+        numpy.fmin(scaled, self.nan_code, out=scaled)
+
+        #: Quantised values
+        self.codes = scaled.astype(dtype)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def usable(self, bounds):
+        if bounds is None or not numpy.all(numpy.isfinite(bounds)):
+            return True
+        low, high = bounds
+        if self.clipped[0] and low < self.bounds[0]:
+            return False
+        if self.clipped[1] and high > self.bounds[1]:
+            return False
+        return (high - low) * self.scale >= min_steps
+
+    def _values(self):
+        table = self.bounds[0] + numpy.arange(self.nan_code + 1) / self.scale
+        table[self.nan_code] = numpy.nan
+        return table.astype(numpy.result_type(self.dtype, 'f4'))[self.codes]
+
+
+class CompressedSlice(EncodedSlice):
+    """
+    A losslessly compressed slice
+    """
+
+    def __init__(self, value):
+        super().__init__(value)
+
+        values = numpy.ascontiguousarray(value.values)
+        compressor = _compressor()
+        if compressor is not None:
+            self.data = compressor.encode(values)
+        else:
+            self.data = zlib.compress(values, 1)
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+    def _values(self):
+        out = numpy.empty(self.shape, dtype=self.dtype)
+        compressor = _compressor()
+        if compressor is not None:
+            compressor.decode(self.data, out=out)
+        else:
+            out.reshape(-1).view('u1')[:] = numpy.frombuffer(zlib.decompress(self.data), dtype='u1')
+        return out
+
+
+def encode(value, encoding='float', bounds=None):
+    """
+    Encode a slice for the cache
+
+    Args:
+        value: xarray.DataArray
+        encoding: One of :data:`encodings`
+        bounds: Colour range the slice is being read for, used by the
+            quantised encodings
+
+    Returns:
+        :class:`EncodedSlice`
+    """
+    if encoding == 'float' or value.dtype.kind not in 'fiu':
+        return RawSlice(value)
+    if encoding == 'uint16':
+        return QuantisedSlice(value, bounds, numpy.uint16)
+    if encoding == 'uint8':
+        return QuantisedSlice(value, bounds, numpy.uint8)
+    if encoding == 'compress':
+        return CompressedSlice(value)
+    raise ValueError(f'Unknown slice encoding "{encoding}"')
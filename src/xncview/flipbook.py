@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Flipbooks of pre-rendered frames
+
+A range of indices along one passive dimension is rendered once, in
+parallel by a pool of processes, into a memory-mapped file of RGBA frames
+at the current view and colour settings. Scrubbing through the range then
+only has to show a frame straight from the file, with no reading or
+plotting.
+
+The file is named after a token of the variable and settings, so if
+:data:`cache_directory` is kept between sessions a flipbook made earlier is
+reused as long as nothing has changed.
+"""
+
+import os
+import json
+import tempfile
+import multiprocessing
+
+import numpy
+import dask
+import dask.base
+import matplotlib.colors
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.qt_compat import QtWidgets as QW, QtCore, QtGui
+
+from .plot import select_slice, geographic_projection, set_projection_extent, plot_slice
+
+
+#: Directory to keep flipbooks in so they can be reused by later sessions,
+#: None for a temporary directory that is removed on exit
+cache_directory = None
+
+_session_directory = None
+
+
+def _directory():
+    global _session_directory
+
+    if cache_directory is not None:
+        os.makedirs(cache_directory, exist_ok=True)
+        return cache_directory
+
+    if _session_directory is None:
+        _session_directory = tempfile.TemporaryDirectory(prefix='xncview-flipbook-')
+    return _session_directory.name
+
+
+def _plot_args_key(plot_args):
+    """
+    Plot arguments in a form that tokenizes the same way in every session
+    """
+    key = {}
+    for name, value in plot_args.items():
+        if isinstance(value, matplotlib.colors.Normalize):
+            value = (type(value).__name__,
+                     {k: v for k, v in vars(value).items() if k != 'callbacks'})
+        key[name] = value
+    return sorted(key.items())
+
+
+def flipbook_token(variable, view, indices):
+    """
+    Token identifying the frames of a flipbook
+
+    Args:
+        variable: xarray.DataArray being shown
+        view: Mapping of view settings, see :func:`render_rgba`
+        indices: Indices along the flipbook dimension
+    """
+    settings = {k: v for k, v in view.items() if k != 'plot_args'}
+    return dask.base.tokenize(variable, sorted(settings.items(), key=lambda kv: kv[0]),
+            _plot_args_key(view['plot_args']), list(indices))
+
+
+def render_rgba(dataset, variable, x, y, indices, plot_args, projection, shape, dpi):
+    """
+    Render a frame the way the viewer would show it
+
+    Args:
+        dataset: xarray.Dataset containing the coordinates
+        variable: xarray.DataArray to plot
+        x, y: Plotting axes
+        indices: Mapping of passive dimension to index
+        plot_args: Colour arguments for the plot
+        projection: Name of the map projection, None if not a map
+        shape: (height, width) of the frame in pixels
+        dpi: Figure resolution
+
+    Returns:
+        numpy.ndarray of RGBA bytes with shape (height, width, 4)
+    """
+    height, width = shape
+    figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi, tight_layout=True)
+    figure.set_frameon(False)
+    canvas = FigureCanvasAgg(figure)
+
+    if projection is not None:
+        axis = figure.add_subplot(projection=geographic_projection(projection))
+        set_projection_extent(axis, projection)
+    else:
+        axis = figure.add_subplot()
+
+    plot_slice(axis, dataset, select_slice(variable, x, y, indices), x, y, **plot_args)
+    canvas.draw()
+    return numpy.asarray(canvas.buffer_rgba())
+
+
+class FlipbookFrame:
+    """
+    A frame of a flipbook, a view of the memory-mapped file
+    """
+
+    def __init__(self, rgba):
+        #: RGBA bytes with shape (height, width, 4)
+        self.rgba = rgba
+
+    def qimage(self):
+        """
+        The frame as a QImage, sharing memory with the file
+        """
+        height, width, _ = self.rgba.shape
+        return QtGui.QImage(self.rgba.data, width, height, width * 4, QtGui.QImage.Format_RGBA8888)
+
+
+class Flipbook:
+    """
+    Rendered frames in a memory-mapped file
+    """
+
+    def __init__(self, path, indices, shape):
+        """
+        Open a flipbook, reusing the frames at path if they were finished by
+        an earlier session
+
+        Args:
+            path: File of the frames
+            indices: Indices along the flipbook dimension
+            shape: (height, width) of the frames in pixels
+        """
+        self.path = path
+        self.indices = list(indices)
+        self.shape = tuple(shape)
+
+        #: Position of each index in the file
+        self.positions = {index: n for n, index in enumerate(self.indices)}
+
+        frames = (len(self.indices), *self.shape, 4)
+        complete = self._load_metadata() == self._metadata()
+
+        #: The frames, uint8 of shape (frame, height, width, RGBA)
+        self.frames = numpy.memmap(path, dtype='u1', mode='r' if complete else 'w+', shape=frames)
+
+        #: Which frames have been rendered
+        self.done = numpy.full(len(self.indices), complete)
+
+    @property
+    def complete(self):
+        return bool(self.done.all())
+
+    def _metadata(self):
+        return {'indices': self.indices, 'shape': list(self.shape), 'complete': True}
+
+    def _load_metadata(self):
+        try:
+            with open(self.path + '.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self):
+        """
+        Mark the file as finished so later sessions can reuse it
+        """
+        self.frames.flush()
+        with open(self.path + '.json', 'w') as f:
+            json.dump(self._metadata(), f)
+
+    def frame(self, index):
+        """
+        The frame at an index, None if it isn't in the flipbook or hasn't
+        been rendered yet
+        """
+        n = self.positions.get(index, None)
+        if n is None or not self.done[n]:
+            return None
+        return FlipbookFrame(self.frames[n])
+
+
+def open_flipbook(variable, view, indices):
+    """
+    Open the flipbook of a view, reusing an earlier one if possible
+
+    Args:
+        variable: xarray.DataArray being shown
+        view: Mapping of view settings, see :func:`render_rgba`, with 'dim'
+            naming the flipbook dimension
+        indices: Indices along the flipbook dimension
+
+    Returns:
+        :class:`Flipbook`
+    """
+    token = flipbook_token(variable, view, indices)
+    return Flipbook(os.path.join(_directory(), f'flipbook-{token}.rgba'), indices, view['shape'])
+
+
+# Data for the current worker process, set once by _init_worker so it
+# doesn't need to be sent with every frame
+_worker_state = None
+
+
+def _init_worker(dataset, variable, path, frames):
+    global _worker_state
+
+    # Parallelism comes from the process pool, don't start threads as well
+    dask.config.set(scheduler='synchronous')
+
+    _worker_state = (dataset, variable, numpy.memmap(path, dtype='u1', mode='r+', shape=frames))
+
+
+def _render_worker(args):
+    n, x, y, indices, plot_args, projection, shape, dpi = args
+    dataset, variable, frames = _worker_state
+
+    rgba = render_rgba(dataset, variable, x, y, indices, plot_args, projection, shape, dpi)
+
+    # Agg may round the figure size by a pixel
+    height = min(rgba.shape[0], frames.shape[1])
+    width = min(rgba.shape[1], frames.shape[2])
+    frames[n, :height, :width] = rgba[:height, :width]
+    return n
+
+
+class FlipbookJob(QtCore.QObject):
+    """
+    Renders the frames of a :class:`Flipbook` with a process pool
+
+    Signals are emitted from the worker thread with the job as the first
+    argument, connect them to methods of a QObject so they are queued to
+    that object's thread.
+    """
+
+    #: Signal emitted with the fraction of frames done
+    progress = QtCore.Signal(object, float)
+
+    #: Signal emitted when all frames are rendered
+    finished = QtCore.Signal(object)
+
+    #: Signal emitted with an error message if rendering fails
+    failed = QtCore.Signal(object, str)
+
+    def __init__(self, flipbook, dataset, variable, view, workers=None):
+        """
+        Args:
+            flipbook: :class:`Flipbook` to fill
+            dataset: xarray.Dataset containing the coordinates
+            variable: xarray.DataArray to plot
+            view: Mapping of view settings, see :func:`render_rgba`, with
+                'dim' naming the flipbook dimension
+            workers: Number of processes (default number of CPUs)
+        """
+        super().__init__()
+
+        self.flipbook = flipbook
+        self.dataset = dataset
+        self.variable = variable
+        self.view = view
+        self.workers = workers or os.cpu_count()
+
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Stop after the current frame
+        """
+        self._cancelled = True
+
+    def run(self):
+        flipbook = self.flipbook
+        view = self.view
+
+        tasks = [(n, view['x'], view['y'], {**view['indices'], view['dim']: index},
+                  view['plot_args'], view['projection'], view['shape'], view['dpi'])
+                 for n, index in enumerate(flipbook.indices) if not flipbook.done[n]]
+
+        try:
+            # Spawn rather than fork so workers don't inherit QT or dask
+            # thread state
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(min(self.workers, max(len(tasks), 1)), initializer=_init_worker,
+                    initargs=(self.dataset, self.variable, flipbook.path, flipbook.frames.shape)) as pool:
+                for n in pool.imap_unordered(_render_worker, tasks):
+                    if self._cancelled:
+                        pool.terminate()
+                        return
+                    flipbook.done[n] = True
+                    self.progress.emit(self, flipbook.done.mean())
+
+            flipbook.save()
+            self.finished.emit(self)
+        except Exception as e:
+            self.failed.emit(self, str(e))
+
+
+class FlipbookWidget(QW.QWidget):
+    """
+    Controls to make a flipbook along a passive dimension
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        main_layout = QW.QHBoxLayout(self)
+
+        self.dimension = QW.QComboBox()
+        self.button = QW.QPushButton('Flipbook')
+        self.button.setCheckable(True)
+
+        self.start = QW.QSpinBox()
+        self.start.setPrefix('start ')
+        self.stop = QW.QSpinBox()
+        self.stop.setPrefix('stop ')
+
+        self.progress = QW.QProgressBar()
+        self.progress.setRange(0, 100)
+        self.progress.setMaximumWidth(150)
+        self.progress.setVisible(False)
+
+        main_layout.addWidget(self.dimension)
+        main_layout.addWidget(self.button)
+        main_layout.addWidget(self.start)
+        main_layout.addWidget(self.stop)
+        main_layout.addWidget(self.progress)
+        main_layout.addStretch()
+
+        self.dimension.currentIndexChanged.connect(self._update_range)
+
+        #: Sizes of the dimensions that can be flipped through
+        self.sizes = {}
+
+    def setDimensions(self, sizes):
+        """
+        Set the dimensions that can be flipped through, dropping any current
+        flipbook
+
+        Args:
+            sizes: Mapping of dimension name to size
+        """
+        self.button.setChecked(False)
+
+        self.sizes = dict(sizes)
+        self.dimension.clear()
+        self.dimension.addItems(list(self.sizes))
+        self.setEnabled(len(self.sizes) > 0)
+
+    def selection(self):
+        """
+        The chosen dimension and index range
+
+        Returns:
+            (dimension, range of indices)
+        """
+        return self.dimension.currentText(), range(self.start.value(), self.stop.value())
+
+    def setProgress(self, fraction):
+        """
+        Show rendering progress, None to hide it
+        """
+        self.progress.setVisible(fraction is not None and fraction < 1)
+        if fraction is not None:
+            self.progress.setValue(int(fraction * 100))
+
+    def _update_range(self):
+        size = self.sizes.get(self.dimension.currentText(), 0)
+        self.start.setRange(0, max(size - 1, 0))
+        self.stop.setRange(1, max(size, 1))
+        self.start.setValue(0)
+        self.stop.setValue(size)
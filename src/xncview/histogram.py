@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Histograms of variable values, and colour mappings derived from them
+
+The histogram of a whole variable is accumulated a chunk at a time in the
+background. Once the counts are known the colour mappings based on them,
+histogram equalisation and percentile clipping, are fixed so cost nothing
+extra per frame.
+"""
+
+import numpy
+import dask.array
+import matplotlib.colors
+from matplotlib.backends.qt_compat import QtWidgets as QW, QtCore
+from matplotlib.backends.backend_qt5agg import FigureCanvas
+from matplotlib.figure import Figure
+
+from .reduce import chunk_ranges
+
+
+#: Default number of histogram bins
+default_bins = 256
+
+
+class Histogram:
+    """
+    Counts of values in fixed bins
+
+    Values outside of the bins are counted in the first or last bin, so
+    percentiles stay correct when the bins were chosen from a sample.
+    """
+
+    def __init__(self, edges):
+        """
+        Args:
+            edges: Bin edges, ascending
+        """
+        #: Bin edges
+        self.edges = numpy.asarray(edges, dtype='f8')
+
+        #: Count in each bin
+        self.counts = numpy.zeros(self.edges.size - 1, dtype='i8')
+
+        self._norm = None
+
+    @classmethod
+    def from_bounds(cls, bounds, bins=default_bins):
+        """
+        Histogram with evenly spaced bins between bounds
+        """
+        lo, hi = float(bounds[0]), float(bounds[1])
+        if not numpy.isfinite([lo, hi]).all():
+            raise ValueError('Histogram bounds must be finite')
+        if hi <= lo:
+            hi = lo + 1
+        return cls(numpy.linspace(lo, hi, bins + 1))
+
+    @property
+    def nbytes(self):
+        return self.edges.nbytes + self.counts.nbytes
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def count(self, values):
+        """
+        Lazy counts of values in the bins, without adding them
+
+        Args:
+            values: numpy or dask array
+
+        Returns:
+            Array of counts, a dask array if values was one
+        """
+        lo, hi = self.edges[0], self.edges[-1]
+        if isinstance(values, dask.array.Array):
+            values = values.ravel()
+            values = dask.array.clip(values[~dask.array.isnan(values)], lo, hi)
+            return dask.array.histogram(values, bins=self.edges)[0]
+
+        values = numpy.ravel(numpy.ma.filled(values, numpy.nan))
+        values = numpy.clip(values[~numpy.isnan(values)], lo, hi)
+        return numpy.histogram(values, bins=self.edges)[0]
+
+    def add(self, counts):
+        """
+        Add counts from :meth:`count`
+        """
+        self.counts = self.counts + numpy.asarray(counts)
+        self._norm = None
+
+    def cdf(self):
+        """
+        Cumulative fraction of values at each bin edge
+        """
+        total = max(self.total, 1)
+        return numpy.concatenate([[0], numpy.cumsum(self.counts)]) / total
+
+    def percentile(self, q):
+        """
+        Approximate value at percentile q, interpolated within a bin
+        """
+        cdf = self.cdf()
+        keep = numpy.concatenate([[True], numpy.diff(cdf) > 0])
+        return float(numpy.interp(q / 100, cdf[keep], self.edges[keep]))
+
+    def equalised_norm(self):
+        """
+        Colour normalisation giving each colour an equal share of values
+
+        The norm only depends on the counts, so is made once and reused
+        """
+        if self._norm is None:
+            self._norm = EqualisedNorm(self.edges, self.cdf())
+        return self._norm
+
+
+class EqualisedNorm(matplotlib.colors.Normalize):
+    """
+    Normalisation mapping values through a cumulative distribution
+    """
+
+    def __init__(self, edges, cdf):
+        super().__init__(vmin=edges[0], vmax=edges[-1], clip=True)
+
+        # Drop empty bins so the mapping can be inverted
+        keep = numpy.concatenate([[True], numpy.diff(cdf) > 0])
+        self.edges = edges[keep]
+        self.cdf = cdf[keep]
+        if self.edges.size < 2:
+            self.edges = numpy.array([edges[0], edges[-1]])
+            self.cdf = numpy.array([0.0, 1.0])
+
+    def __call__(self, value, clip=None):
+        value = numpy.ma.masked_invalid(numpy.ma.asarray(value, dtype='f8'))
+        result = numpy.interp(value.filled(self.vmin), self.edges, self.cdf)
+        return numpy.ma.array(result, mask=numpy.ma.getmaskarray(value))
+
+    def inverse(self, value):
+        return numpy.interp(value, self.cdf, self.edges)
+
+
+def variable_histogram(variable, histogram, compute=None, batch=1):
+    """
+    Accumulate the histogram of a variable, a batch of chunks at a time
+
+    Args:
+        variable: xarray.DataArray
+        histogram: :class:`Histogram` to add to
+        compute: Function computing a dask array (default dask.compute)
+        batch: Chunks per step
+
+    Yields:
+        Fraction complete after each step
+    """
+    if compute is None:
+        compute = lambda obj: dask.compute(obj)[0]
+
+    if variable.ndim == 0:
+        histogram.add(histogram.count(variable.values))
+        yield 1.0
+        return
+
+    dim = variable.dims[0]
+    size = variable.sizes[dim]
+    for start, stop in chunk_ranges(variable, dim, batch):
+        block = variable.isel({dim: slice(start, stop)}).data
+        counts = histogram.count(block)
+        if isinstance(counts, dask.array.Array):
+            counts = compute(counts)
+        histogram.add(counts)
+        yield stop / size
+
+
+class HistogramJob(QtCore.QObject):
+    """
+    Runs :func:`variable_histogram` in the background
+
+    Signals are emitted from the worker thread with the job as the first
+    argument, connect them to methods of a QObject so they are queued to
+    that object's thread.
+    """
+
+    #: Signal emitted with the fraction complete
+    progress = QtCore.Signal(object, float)
+
+    #: Signal emitted when the histogram is complete
+    finished = QtCore.Signal(object)
+
+    #: Signal emitted with an error message if the histogram fails
+    failed = QtCore.Signal(object, str)
+
+    def __init__(self, key, variable, histogram, compute=None):
+        """
+        Args:
+            key: Identifier of the result, for caching
+            variable: xarray.DataArray
+            histogram: Empty :class:`Histogram`
+            compute: Function computing a dask array
+        """
+        super().__init__()
+
+        self.key = key
+        self.variable = variable
+        self.histogram = histogram
+        self.compute = compute
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Stop after the current chunk
+        """
+        self._cancelled = True
+
+    def run(self):
+        try:
+            for fraction in variable_histogram(self.variable, self.histogram, self.compute):
+                if self._cancelled:
+                    return
+                self.progress.emit(self, fraction)
+            self.finished.emit(self)
+        except Exception as e:
+            self.failed.emit(self, str(e))
+
+
+class HistogramWidget(QW.QGroupBox):
+    """
+    Histograms of the current slice and the whole variable
+    """
+
+    def __init__(self):
+        super().__init__('Histogram')
+
+        main_layout = QW.QVBoxLayout(self)
+
+        figure = Figure(tight_layout=True)
+        figure.set_frameon(False)
+        self.canvas = FigureCanvas(figure)
+        self.canvas.setStyleSheet("background-color:transparent;")
+        self.canvas.setMinimumHeight(150)
+        self.axis = self.canvas.figure.subplots()
+
+        self.progress = QW.QProgressBar()
+        self.progress.setRange(0, 100)
+        self.progress.setVisible(False)
+
+        main_layout.addWidget(self.canvas)
+        main_layout.addWidget(self.progress)
+
+        #: Whole variable histogram, once it has been accumulated
+        self.variable = None
+
+    def redraw(self, values, edges):
+        """
+        Redraw the histograms
+
+        Args:
+            values: Values of the current slice
+            edges: Bin edges to use if the whole variable histogram isn't
+                available
+        """
+        if self.variable is not None:
+            edges = self.variable.edges
+
+        self.axis.clear()
+
+        if values is not None:
+            hist = Histogram(edges)
+            hist.add(hist.count(values))
+            self.axis.stairs(hist.counts / max(hist.total, 1), hist.edges,
+                    fill=True, alpha=0.5, label='slice')
+
+        if self.variable is not None:
+            self.axis.stairs(self.variable.counts / max(self.variable.total, 1),
+                    self.variable.edges, label='variable')
+
+        self.axis.set_yticks([])
+        if values is not None or self.variable is not None:
+            self.axis.legend(fontsize='small')
+        self.canvas.draw()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Drawing regular grids straight to a QImage
+
+When both plotting axes are evenly spaced 1D coordinates each cell is one
+pixel of an image, so there's no need for matplotlib. A frame is the slice
+scaled to colour indices, looked up in a 256 entry RGBA table and
+handed to a QImage without copying, all of which is vectorised numpy
+working in buffers that are reused between frames.
+
+There are no axis labels, coastlines or mouse readouts, this is for
+scrubbing through a variable as fast as possible.
+"""
+
+import numpy
+import matplotlib
+import matplotlib.cm
+import matplotlib.colors
+from matplotlib.backends.qt_compat import QtWidgets as QW, QtCore, QtGui
+
+
+#: Number of colours in the lookup table, the last entry is for missing
+#: values
+levels = 255
+
+#: Colour index of missing values
+bad_index = levels
+
+
+def colormap_lut(cmap=None):
+    """
+    RGBA lookup table of a colormap
+
+    Args:
+        cmap: matplotlib colormap or name (default the matplotlib default)
+
+    Returns:
+        numpy.ndarray of 256 uint32, each the R, G, B and A bytes of a colour.
+        The last entry is the colormap's 'bad' colour
+    """
+    if not isinstance(cmap, matplotlib.colors.Colormap):
+        cmap = matplotlib.colormaps[cmap or matplotlib.rcParams['image.cmap']]
+
+    rgba = numpy.empty((levels + 1, 4), dtype='u1')
+    rgba[:levels] = cmap(numpy.linspace(0, 1, levels), bytes=True)
+    rgba[bad_index] = cmap(numpy.nan, bytes=True)
+    return rgba.view('u4').ravel()
+
+
+def _regular(coord, rtol=1e-3):
+    """
+    Is a coordinate 1D and evenly spaced?
+    """
+    if coord.ndim != 1 or coord.size < 2:
+        return False
+    step = numpy.diff(coord.values.astype('f8'))
+    return bool(numpy.all(numpy.abs(step - step[0]) <= rtol * abs(step[0])) and step[0] != 0)
+
+
+def is_regular(dataset, x, y):
+    """
+    Can the plotting axes be drawn as an image, one pixel per cell?
+    """
+    xc = dataset[x]
+    yc = dataset[y]
+    return xc.dims != yc.dims and _regular(xc) and _regular(yc)
+
+
+class LutImage(matplotlib.cm.ScalarMappable):
+    """
+    A slice coloured through a lookup table
+
+    This is a ScalarMappable, so it can be passed to colorbar and has
+    set_array like the matplotlib artists
+    """
+
+    def __init__(self, dims, xdim, ydim, flip_x=False, flip_y=False, cmap=None, norm=None,
+            vmin=None, vmax=None):
+        """
+        Args:
+            dims: Dimensions of the slices, in the order of the arrays given
+                to :meth:`set_array`
+            xdim, ydim: Dimensions along the image columns and rows
+            flip_x: Are x values descending?
+            flip_y: Are y values descending?
+            cmap, norm, vmin, vmax: Colour scaling, as for pcolormesh
+        """
+        super().__init__(norm=norm, cmap=cmap)
+        if norm is None:
+            self.set_clim(vmin, vmax)
+
+        #: Arrangement of the slices in the image
+        self.layout = {'dims': tuple(dims), 'xdim': xdim, 'ydim': ydim,
+                'flip_x': flip_x, 'flip_y': flip_y}
+
+        self._axes = (list(dims).index(ydim), list(dims).index(xdim))
+
+        # Images are drawn from the top row, with y increasing upwards
+        self._flip = (slice(None, None, 1 if flip_y else -1), slice(None, None, -1 if flip_x else 1))
+
+        self._lut = colormap_lut(self.get_cmap())
+        self._scaled = None
+        self._indices = None
+
+        #: RGBA pixels, one uint32 each
+        self.pixels = None
+
+    @classmethod
+    def for_slice(cls, dataset, v, x, y, **kwargs):
+        """
+        Image of a slice on a regular grid
+
+        Args:
+            dataset: xarray.Dataset containing the coordinates
+            v: xarray.DataArray with only the plotting axes remaining
+            x, y: Plotting axes
+            **kwargs: Colour scaling, as for pcolormesh
+
+        Raises:
+            ValueError if the plotting axes aren't regular
+        """
+        if not is_regular(dataset, x, y):
+            raise ValueError(f'"{x}" and "{y}" are not a regular grid')
+
+        xc = dataset[x]
+        yc = dataset[y]
+        image = cls(v.dims, xc.dims[0], yc.dims[0],
+                flip_x=bool(xc[-1] < xc[0]), flip_y=bool(yc[-1] < yc[0]), **kwargs)
+        image.set_array(v.values)
+        return image
+
+    def set_array(self, A):
+        """
+        Set the values and recolour the image
+
+        Unlike matplotlib artists the values aren't copied, they're only
+        used to find colour limits if none were given
+        """
+        if not self.norm.scaled():
+            with numpy.errstate(invalid='ignore'):
+                self.norm.autoscale_None(numpy.ma.masked_invalid(A))
+        self.pixels = self.colour(A, self.pixels)
+
+    def set_pixels(self, pixels):
+        """
+        Show pixels that were coloured elsewhere, e.g. by :meth:`colour` in
+        another process
+        """
+        self.pixels = pixels
+
+    def settings(self):
+        """
+        Arguments to make a :class:`LutImage` that colours slices the same
+        way
+        """
+        return {**self.layout, 'cmap': self.cmap, 'norm': self.norm}
+
+    def colour(self, values, out=None):
+        """
+        Colour a slice
+
+        Args:
+            values: Slice with dimensions in the order of :attr:`layout`
+            out: Array of uint32 to write the pixels to, if it is the right
+                shape
+
+        Returns:
+            RGBA pixels, one uint32 each, in out if given
+        """
+        values = numpy.transpose(values, self._axes)[self._flip]
+        shape = values.shape
+
+        if self._scaled is None or self._scaled.shape != shape:
+            self._scaled = numpy.empty(shape, dtype='f4')
+            self._indices = numpy.empty(shape, dtype=numpy.intp)
+        if out is None or out.shape != shape:
+            out = numpy.empty(shape, dtype='u4')
+
+        scaled = self._scaled
+        if type(self.norm) is matplotlib.colors.Normalize:
+            # Linear scaling done in place rather than through the norm
+            vmin, vmax = self.norm.vmin, self.norm.vmax
+            if vmin is None or vmax is None or not vmax > vmin:
+                vmin, vmax = (vmin or 0.0), numpy.inf
+            scale = levels / (vmax - vmin)
+            numpy.copyto(scaled, numpy.ma.filled(values, numpy.nan), casting='unsafe')
+            scaled -= vmin
+            scaled *= scale
+        else:
+            numpy.copyto(scaled, numpy.ma.filled(self.norm(values), numpy.nan), casting='unsafe')
+            scaled *= levels
+
+        # fmin replaces NaN with the other argument, which is much faster
+        # than finding the NaNs
+        numpy.maximum(scaled, 0, out=scaled)
+        numpy.minimum(scaled, levels - 1, out=scaled)
+        numpy.fmin(scaled, bad_index, out=scaled)
+
+        # Taking with intp indices in clip mode, which doesn't raise on bad
+        # indices, is the fastest lookup
+        numpy.copyto(self._indices, scaled, casting='unsafe')
+        numpy.take(self._lut, self._indices, out=out, mode='clip')
+        return out
+
+    def qimage(self):
+        """
+        The pixels as a QImage, sharing memory with :attr:`pixels`, None if
+        there aren't any yet
+        """
+        if self.pixels is None:
+            return None
+        height, width = self.pixels.shape
+        return QtGui.QImage(self.pixels.data, width, height, width * 4, QtGui.QImage.Format_RGBA8888)
+
+
+class ImageView(QW.QWidget):
+    """
+    Shows a :class:`LutImage`, or anything else with a qimage() method,
+    scaled to the widget size
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        #: Image being shown
+        self.image = None
+
+        self.setSizePolicy(QW.QSizePolicy.Expanding, QW.QSizePolicy.Expanding)
+
+    def setImage(self, image):
+        """
+        Set the image to show, or None
+        """
+        self.image = image
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        qimage = self.image.qimage() if self.image is not None else None
+        if qimage is not None:
+            painter.drawImage(self.rect(), qimage)
+        painter.end()
@@ -63,9 +63,57 @@ def identify_lon(variable):
     return lon_dims
 
 
+def is_degrees(coord, standard_name, units):
+    """
+    Is the coordinate an angle in degrees? Only the units and standard name
+    are trusted, projected coordinates in metres can also have an 'axis'
+
+    Args:
+        coord: xarray.DataArray
+        standard_name: 'longitude' or 'latitude'
+        units: :data:`lon_units` or :data:`lat_units`
+    """
+    return coord.attrs.get('standard_name') == standard_name or coord.attrs.get('units') in units
+
+
+#: Attributes of a UGRID mesh topology that name other variables
+mesh_attributes = (
+        'node_coordinates',
+        'face_coordinates',
+        'edge_coordinates',
+        'face_node_connectivity',
+        'face_edge_connectivity',
+        'face_face_connectivity',
+        'edge_node_connectivity',
+        'edge_face_connectivity',
+        'boundary_node_connectivity',
+        )
+
+
+def identify_meshes(dataset):
+    """
+    Names of the UGRID mesh topology variables in a dataset
+    """
+    return [name for name, var in dataset.variables.items()
+            if var.attrs.get('cf_role', None) == 'mesh_topology']
+
+
+def mesh_variables(dataset, mesh):
+    """
+    Names of the variables making up a UGRID mesh, including the topology
+    variable itself
+    """
+    attrs = dataset.variables[mesh].attrs
+    names = set([mesh])
+    for a in mesh_attributes:
+        names.update(attrs.get(a, '').split())
+    return names
+
+
 def classify_vars(dataset):
     bounds = set()
     coords = set()
+    mesh = set()
 
     for name, var in dataset.variables.items():
         if 'bounds' in var.attrs:
@@ -74,6 +122,9 @@ def classify_vars(dataset):
         if 'coordinates' in var.attrs:
             coords.update(var.attrs['coordinates'].split())
 
-    data = set(dataset.variables.keys()) - bounds - coords
-    return {'bounds': bounds, 'coords': coords, 'data': data}
+    for name in identify_meshes(dataset):
+        mesh.update(mesh_variables(dataset, name))
+
+    data = set(dataset.variables.keys()) - bounds - coords - mesh
+    return {'bounds': bounds, 'coords': coords, 'mesh': mesh, 'data': data}
 
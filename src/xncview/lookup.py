@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Finding the grid cell nearest to a point
+
+Indices are built once per grid, after which a query doesn't depend on the
+grid size - 1D axes use a binary search of the cell edges, 2D curvilinear
+grids bucket the cell centres into a coarse regular grid and only search the
+buckets around the query point.
+
+Many points can be looked up at once with ``query_points``, which is
+vectorised over the points, and :func:`point_weights` turns the lookups into
+interpolation weights.
+"""
+
+import math
+import numpy
+
+from .interpret_cf import is_degrees, lon_units
+
+
+#: Interpolation methods
+methods = ['bilinear', 'nearest']
+
+
+def _edges(centres):
+    """
+    Cell edges from 1D centres, half way between each centre
+    """
+    centres = numpy.asarray(centres, dtype='f8')
+    if centres.size == 1:
+        return numpy.array([centres[0] - 0.5, centres[0] + 0.5])
+    mid = (centres[1:] + centres[:-1]) / 2
+    return numpy.concatenate([[2 * centres[0] - mid[0]], mid, [2 * centres[-1] - mid[-1]]])
+
+
+def _wrap(value, start, period):
+    """
+    Shift value by whole periods into [start, start + period)
+    """
+    if period is None:
+        return value
+    return start + (value - start) % period
+
+
+class AxisIndex:
+    """
+    Nearest cell lookup on a 1D axis using searchsorted
+    """
+
+    def __init__(self, centres, period=None):
+        """
+        Args:
+            centres: 1D cell centres, either ascending or descending
+            period: Period of the axis, e.g. 360 for longitude
+        """
+        edges = _edges(centres)
+
+        self._descending = edges[0] > edges[-1]
+        if self._descending:
+            edges = edges[::-1]
+
+        self.edges = edges
+        self.period = period
+
+    @property
+    def nbytes(self):
+        return self.edges.nbytes
+
+    def query(self, value):
+        """
+        Index of the cell containing value, None if outside the axis
+        """
+        value = _wrap(value, self.edges[0], self.period)
+
+        i = numpy.searchsorted(self.edges, value, side='right') - 1
+        if i < 0 or i >= self.edges.size - 1:
+            return None
+        if self._descending:
+            i = self.edges.size - 2 - i
+        return int(i)
+
+    def query_points(self, values):
+        """
+        Vectorised :meth:`query`
+
+        Returns:
+            (index array, mask of values inside the axis)
+        """
+        values = _wrap(numpy.asarray(values, dtype='f8'), self.edges[0], self.period)
+
+        i = numpy.searchsorted(self.edges, values, side='right') - 1
+        valid = (i >= 0) & (i < self.edges.size - 1)
+        i = numpy.clip(i, 0, self.edges.size - 2)
+        if self._descending:
+            i = self.edges.size - 2 - i
+        return i, valid
+
+
+class RectilinearIndex:
+    """
+    Nearest cell lookup on a grid with independent 1D axes
+    """
+
+    def __init__(self, xdim, x, ydim, y, xperiod=None):
+        """
+        Args:
+            xdim, ydim: Dimension names of the axes
+            x, y: 1D cell centres
+            xperiod: Period of the x axis, e.g. 360 for longitude
+        """
+        self.xdim = xdim
+        self.ydim = ydim
+        self.x = AxisIndex(x, xperiod)
+        self.y = AxisIndex(y)
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes
+
+    def query(self, px, py):
+        """
+        Indices of the cell containing (px, py)
+
+        Returns:
+            Mapping of dimension name to index, None if outside the grid
+        """
+        i = self.x.query(px)
+        j = self.y.query(py)
+        if i is None or j is None:
+            return None
+        return {self.xdim: i, self.ydim: j}
+
+    def query_points(self, px, py):
+        """
+        Vectorised :meth:`query`
+
+        Returns:
+            (mapping of dimension name to index arrays, mask of points inside
+            the grid)
+        """
+        i, vi = self.x.query_points(px)
+        j, vj = self.y.query_points(py)
+        return {self.xdim: i, self.ydim: j}, vi & vj
+
+
+class CurvilinearIndex:
+    """
+    Nearest cell lookup on a grid with 2D coordinates, or an unstructured grid
+
+    Cell centres are sorted into square buckets, a query searches outwards in
+    rings of buckets from the bucket containing the point, stopping once no
+    unsearched bucket could be closer than the best match.
+    """
+
+    def __init__(self, dims, x, y, xperiod=None, points_per_bucket=4):
+        """
+        Args:
+            dims: Dimension names of the coordinates
+            x, y: Cell centres, 2D or 1D for unstructured grids
+            xperiod: Period of the x coordinate, e.g. 360 for longitude
+            points_per_bucket: Average number of centres in each bucket
+        """
+        self.dims = dims
+        self.shape = numpy.shape(x)
+        self.period = xperiod
+
+        x = numpy.asarray(x, dtype='f8').ravel()
+        y = numpy.asarray(y, dtype='f8').ravel()
+
+        valid = numpy.flatnonzero(numpy.isfinite(x) & numpy.isfinite(y))
+        x = x[valid]
+        y = y[valid]
+
+        self.x0 = x.min() if x.size > 0 else 0.0
+        if self.period is not None:
+            x = _wrap(x, self.x0, self.period)
+
+        self.y0 = y.min() if y.size > 0 else 0.0
+        width = max(x.max() - self.x0, 1e-12) if x.size > 0 else 1.0
+        height = max(y.max() - self.y0, 1e-12) if y.size > 0 else 1.0
+
+        self.width = width
+        self.height = height
+
+        self.nb = max(1, int(math.sqrt(x.size / points_per_bucket)))
+        self.dx = width / self.nb
+        self.dy = height / self.nb
+
+        # Matches further away than a couple of cells are outside the grid
+        self.tolerance = 2 * math.sqrt(width * height / max(x.size, 1))
+
+        bucket = self._bucket(x, y)
+        order = numpy.argsort(bucket, kind='stable')
+
+        self.x = x[order]
+        self.y = y[order]
+        self.index = valid[order]
+        self.starts = numpy.searchsorted(bucket[order], numpy.arange(self.nb * self.nb + 1))
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes + self.index.nbytes + self.starts.nbytes
+
+    def _bucket_xy(self, x, y):
+        bx = numpy.clip(((x - self.x0) / self.dx).astype(int), 0, self.nb - 1)
+        by = numpy.clip(((y - self.y0) / self.dy).astype(int), 0, self.nb - 1)
+        return bx, by
+
+    def _bucket(self, x, y):
+        bx, by = self._bucket_xy(x, y)
+        return by * self.nb + bx
+
+    def _search(self, px, py, bx, by, r):
+        """
+        Best match in the ring of buckets r away from (bx, by)
+        """
+        best = (math.inf, None)
+        for j in range(by - r, by + r + 1):
+            if j < 0 or j >= self.nb:
+                continue
+            step = 1 if j in (by - r, by + r) else 2 * r
+            for i in range(bx - r, bx + r + 1, max(step, 1)):
+                if i < 0 or i >= self.nb:
+                    continue
+                b = j * self.nb + i
+                s, e = self.starts[b], self.starts[b + 1]
+                if s == e:
+                    continue
+                d = (self.x[s:e] - px)**2 + (self.y[s:e] - py)**2
+                k = numpy.argmin(d)
+                if d[k] < best[0]:
+                    best = (d[k], s + k)
+        return best
+
+    def _nearest(self, px, py):
+        """
+        Squared distance and sorted position of the centre nearest (px, py)
+        """
+        bx, by = self._bucket_xy(numpy.float64(px), numpy.float64(py))
+        bx, by = int(bx), int(by)
+
+        best = (math.inf, None)
+        for r in range(self.nb):
+            d, k = self._search(px, py, bx, by, r)
+            if d < best[0]:
+                best = (d, k)
+            if best[1] is not None and math.sqrt(best[0]) <= r * min(self.dx, self.dy):
+                break
+            # Points this far away would be rejected anyway. The start bucket
+            # may be up to tolerance from the point if it is off the grid
+            if (r - 1) * min(self.dx, self.dy) > 2 * self.tolerance:
+                break
+        return best
+
+    def query(self, px, py):
+        """
+        Indices of the cell with the centre nearest to (px, py)
+
+        Returns:
+            Mapping of dimension name to index, None if outside the grid
+        """
+        if self.x.size == 0:
+            return None
+
+        px = _wrap(px, self.x0, self.period)
+
+        # Don't search for points well away from the grid
+        if (py < self.y0 - self.tolerance or py > self.y0 + self.height + self.tolerance
+                or (self.period is None and (px < self.x0 - self.tolerance
+                    or px > self.x0 + self.width + self.tolerance))):
+            return None
+
+        best = self._nearest(px, py)
+
+        # Check across the seam of periodic grids
+        if self.period is not None:
+            if px - self.x0 < self.tolerance:
+                best = min(best, self._nearest(px + self.period, py), key=lambda b: b[0])
+            if self.x0 + self.period - px < self.tolerance:
+                best = min(best, self._nearest(px - self.period, py), key=lambda b: b[0])
+
+        if best[1] is None or math.sqrt(best[0]) > self.tolerance:
+            return None
+
+        return {d: int(i) for d, i in zip(self.dims, numpy.unravel_index(self.index[best[1]], self.shape))}
+
+    def _search_points(self, px, py, best_d, best_k):
+        """
+        Update the best matches of points with the buckets within
+        :attr:`tolerance` of them
+        """
+        bx, by = self._bucket_xy(px, py)
+        rx = math.ceil(self.tolerance / self.dx)
+        ry = math.ceil(self.tolerance / self.dy)
+
+        for oy in range(-ry, ry + 1):
+            for ox in range(-rx, rx + 1):
+                i = bx + ox
+                j = by + oy
+                inside = (i >= 0) & (i < self.nb) & (j >= 0) & (j < self.nb)
+                b = numpy.where(inside, j * self.nb + i, 0)
+                start = self.starts[b]
+                count = numpy.where(inside, self.starts[b + 1] - start, 0)
+
+                # Step through the bucket contents together for all points
+                for t in range(count.max(initial=0)):
+                    live = numpy.flatnonzero(count > t)
+                    k = start[live] + t
+                    d = (self.x[k] - px[live])**2 + (self.y[k] - py[live])**2
+                    better = d < best_d[live]
+                    best_d[live[better]] = d[better]
+                    best_k[live[better]] = k[better]
+
+    def query_points(self, px, py):
+        """
+        Vectorised :meth:`query`
+
+        Returns:
+            (mapping of dimension name to index arrays, mask of points inside
+            the grid)
+        """
+        px = numpy.asarray(px, dtype='f8').ravel()
+        py = numpy.asarray(py, dtype='f8').ravel()
+
+        best_d = numpy.full(px.shape, math.inf)
+        best_k = numpy.zeros(px.shape, dtype=int)
+
+        if self.x.size == 0:
+            return {d: best_k for d in self.dims}, numpy.zeros(px.shape, dtype=bool)
+
+        finite = numpy.isfinite(px) & numpy.isfinite(py)
+        px = numpy.where(finite, _wrap(px, self.x0, self.period), self.x0)
+        py = numpy.where(finite, py, self.y0)
+        self._search_points(px, py, best_d, best_k)
+
+        # Check across the seam of periodic grids
+        if self.period is not None:
+            for near, shift in [(px - self.x0 < self.tolerance, self.period),
+                                (self.x0 + self.period - px < self.tolerance, -self.period)]:
+                near = numpy.flatnonzero(near)
+                d = best_d[near]
+                k = best_k[near]
+                self._search_points(px[near] + shift, py[near], d, k)
+                best_d[near] = d
+                best_k[near] = k
+
+        valid = finite & (numpy.sqrt(best_d) <= self.tolerance)
+        cells = numpy.unravel_index(self.index[best_k], self.shape)
+        return dict(zip(self.dims, cells)), valid
+
+
+def build_index(dataset, x, y):
+    """
+    Build a nearest cell index for the plotting axes x and y
+
+    Args:
+        dataset: xarray.Dataset containing the coordinates
+        x, y: Plotting axes
+
+    Returns:
+        :class:`RectilinearIndex` or :class:`CurvilinearIndex`
+    """
+    x = dataset[x]
+    y = dataset[y]
+
+    period = 360.0 if is_degrees(x, 'longitude', lon_units) else None
+
+    if x.ndim == 1 and y.ndim == 1 and x.dims != y.dims:
+        return RectilinearIndex(x.dims[0], x.values, y.dims[0], y.values, xperiod=period)
+
+    if x.ndim != y.ndim or x.ndim > 2 or set(x.dims) != set(y.dims):
+        raise ValueError(f'"{x.name}" and "{y.name}" are not the coordinates of a 1D or 2D grid')
+
+    # Unstructured grids, with both coordinates on one dimension, are
+    # searched the same as curvilinear grids
+
+    y = y.transpose(*x.dims)
+    return CurvilinearIndex(x.dims, x.values, y.values, xperiod=period)
+
+
+def _fractional(centres, values, period=None):
+    """
+    Neighbouring cell indices and fractional position of values on a 1D axis
+
+    Returns:
+        (lower index, upper index, fraction of the way to upper, valid mask)
+    """
+    centres = numpy.asarray(centres, dtype='f8')
+    order = numpy.argsort(centres)
+    c = centres[order]
+
+    if period is not None:
+        values = _wrap(values, c[0], period)
+
+        # Interpolate across the seam only if the axis goes the whole way
+        # around, regional axes have a gap there
+        if c.size > 1 and c[0] + period - c[-1] <= numpy.diff(c).max() * 1.01:
+            c = numpy.append(c, c[0] + period)
+            order = numpy.append(order, order[0])
+
+    valid = (values >= c[0]) & (values <= c[-1])
+
+    if c.size == 1:
+        zero = numpy.zeros(values.shape, dtype=int)
+        return order[zero], order[zero], numpy.zeros(values.shape), valid
+
+    position = numpy.interp(values, c, numpy.arange(c.size))
+    position = numpy.where(numpy.isfinite(position), position, 0)
+    lower = numpy.clip(numpy.floor(position).astype(int), 0, c.size - 2)
+    return order[lower], order[lower + 1], position - lower, valid
+
+
+def point_weights(dataset, x, y, px, py, method='bilinear', index=None):
+    """
+    Interpolation weights of the grid at a set of points
+
+    Bilinear interpolation is available for grids with 1D coordinates,
+    curvilinear and unstructured grids always use the nearest cell.
+
+    Args:
+        dataset: xarray.Dataset containing the coordinates
+        x, y: Plotting axes
+        px, py: 1D arrays of point positions in the plotting axes
+        method: One of :data:`methods`
+        index: Grid index from :func:`build_index`, for curvilinear grids
+
+    Returns:
+        (method used, grid dimensions, grid shape, list of cell index arrays
+        for each grid dimension, weights, mask of points on the grid), the
+        cell index and weight arrays have shape (points, neighbours)
+    """
+    if method not in methods:
+        raise ValueError(f'Unknown interpolation method "{method}"')
+
+    xc = dataset[x]
+    yc = dataset[y]
+    geographic = is_degrees(xc, 'longitude', lon_units)
+
+    if xc.ndim == 1 and yc.ndim == 1 and xc.dims != yc.dims:
+        grid_dims = [xc.dims[0], yc.dims[0]]
+        shape = [xc.size, yc.size]
+
+        ix0, ix1, fx, vx = _fractional(xc.values, px, 360.0 if geographic else None)
+        iy0, iy1, fy, vy = _fractional(yc.values, py)
+        valid = vx & vy
+
+        if method == 'nearest':
+            ix = numpy.where(fx < 0.5, ix0, ix1)[:, None]
+            iy = numpy.where(fy < 0.5, iy0, iy1)[:, None]
+            weights = numpy.ones(ix.shape)
+        else:
+            ix = numpy.stack([ix0, ix1, ix0, ix1], axis=1)
+            iy = numpy.stack([iy0, iy0, iy1, iy1], axis=1)
+            weights = numpy.stack([(1 - fx) * (1 - fy), fx * (1 - fy),
+                                   (1 - fx) * fy, fx * fy], axis=1)
+        return method, grid_dims, shape, [ix, iy], weights, valid
+
+    if index is None:
+        index = build_index(dataset, x, y)
+    found, valid = index.query_points(px, py)
+    grid_dims = list(index.dims)
+    cells = [found[d][:, None] for d in grid_dims]
+    return 'nearest', grid_dims, list(index.shape), cells, numpy.ones(cells[0].shape), valid
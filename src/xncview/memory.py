@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Accounting of the memory used by caches and computations
+
+Every cache keeps its entries in a :class:`BudgetCache` and every
+computation goes through :meth:`MemoryBudget.compute`, so the total can be
+kept under the limit set by ``xncview --max-memory``.
+"""
+
+import time
+import math
+import weakref
+import threading
+import contextlib
+
+import numpy
+import dask
+import dask.array
+import dask.base
+import dask.utils
+import dask.system
+
+
+class MemoryBudgetError(MemoryError):
+    """
+    A computation needs more memory than the budget allows
+    """
+    pass
+
+
+def nbytes(value):
+    """
+    Memory used by a cached value
+    """
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    return getattr(value, 'nbytes', 0)
+
+
+def is_lazy(obj):
+    """
+    Is obj, or any member of a tuple or list, a dask collection?
+    """
+    if isinstance(obj, (tuple, list)):
+        return any(is_lazy(o) for o in obj)
+    return dask.is_dask_collection(obj)
+
+
+def largest_chunk(obj):
+    """
+    Size in bytes of the largest dask chunk of an array, 0 if obj is not a
+    dask array
+    """
+    if isinstance(obj, (tuple, list)):
+        return max([largest_chunk(o) for o in obj], default=0)
+
+    data = getattr(obj, 'data', obj)
+    if not isinstance(data, dask.array.Array):
+        return 0
+    return int(numpy.prod([max(c) if len(c) > 0 else 0 for c in data.chunks])) * data.dtype.itemsize
+
+
+class MemoryBudget:
+    """
+    Tracks memory held by caches and in-flight computations against a limit
+
+    Cache entries are evicted lowest value first to make room for new
+    computations - the value of an entry is its cache's priority, then how
+    recently it was used.
+    """
+
+    def __init__(self, limit=None):
+        """
+        Args:
+            limit: Maximum bytes, None for no limit
+        """
+        #: Maximum bytes, None for no limit
+        self.limit = limit
+
+        #: Bytes reserved by running computations, by name
+        self.inflight = {}
+
+        self._caches = weakref.WeakSet()
+        self._lock = threading.RLock()
+
+    def register(self, cache):
+        """
+        Add a cache to the budget
+        """
+        with self._lock:
+            self._caches.add(cache)
+
+    @property
+    def cached(self):
+        """
+        Bytes held by caches
+        """
+        return sum(c.nbytes for c in list(self._caches))
+
+    @property
+    def usage(self):
+        """
+        Total bytes accounted for
+        """
+        return self.cached + sum(self.inflight.values())
+
+    def available(self):
+        """
+        Bytes left before the limit is reached
+        """
+        if self.limit is None:
+            return math.inf
+        return self.limit - self.usage
+
+    def evict(self, nbytes):
+        """
+        Evict cache entries, lowest value first, until nbytes have been freed
+
+        Returns:
+            Bytes freed
+        """
+        with self._lock:
+            entries = []
+            for cache in list(self._caches):
+                entries.extend((value, cache, key) for key, value in cache.eviction_values())
+            entries.sort(key=lambda e: e[0])
+
+            freed = 0
+            for value, cache, key in entries:
+                if freed >= nbytes:
+                    break
+                freed += cache.discard(key)
+            return freed
+
+    def make_room(self, nbytes):
+        """
+        Evict entries so that nbytes more will fit under the limit
+
+        Returns:
+            True if there is now room
+        """
+        with self._lock:
+            short = nbytes - self.available()
+            if short > 0:
+                self.evict(short)
+            return nbytes <= self.available()
+
+    @contextlib.contextmanager
+    def reserve(self, nbytes, name='compute'):
+        """
+        Hold nbytes for the duration of a computation
+
+        Raises:
+            MemoryBudgetError if there's no room even after evicting caches
+        """
+        with self._lock:
+            if not self.make_room(nbytes):
+                raise MemoryBudgetError(f'{name} needs {dask.utils.format_bytes(nbytes)}, '
+                        f'only {dask.utils.format_bytes(max(0, self.available()))} of the '
+                        f'{dask.utils.format_bytes(self.limit)} limit is free')
+            self.inflight[name] = self.inflight.get(name, 0) + nbytes
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight[name] -= nbytes
+                if self.inflight[name] == 0:
+                    del self.inflight[name]
+
+    def compute(self, obj, source=None, name='compute', scheduler=None):
+        """
+        Compute a dask-backed object within the budget
+
+        Each local dask thread holds about one chunk of the source, so the
+        number of threads is cut down until the chunks being worked on and the
+        result fit. Computations on other processes only need room for the
+        result.
+
+        Args:
+            obj: Object to compute, tuples of objects are computed together
+                so shared chunks are only read once
+            source: Array obj was derived from, used to estimate the chunk
+                size (default obj)
+            name: Name of the computation in :attr:`inflight`
+            scheduler: :class:`xncview.scheduler.Scheduler` to run on
+                (default dask's threaded scheduler)
+
+        Returns:
+            The computed object
+
+        Raises:
+            MemoryBudgetError if even a single thread wouldn't fit
+        """
+        if not is_lazy(obj):
+            return obj
+
+        if source is None:
+            source = obj
+
+        result = nbytes(obj)
+
+        if scheduler is not None and not scheduler.in_process:
+            with self.reserve(result, name):
+                return scheduler.compute(obj)
+
+        chunk = largest_chunk(source)
+        workers = dask.config.get('num_workers', None) or dask.system.CPU_COUNT
+        if scheduler is not None and scheduler.workers is not None:
+            workers = scheduler.workers
+
+        if self.limit is not None and chunk > 0:
+            self.make_room(result + chunk)
+            workers = max(1, min(workers, int((self.available() - result) // chunk)))
+
+        with self.reserve(result + chunk * workers, name):
+            if scheduler is None:
+                return dask.compute(obj, num_workers=workers)[0]
+            return scheduler.compute(obj, num_workers=workers)
+
+    def summary(self):
+        """
+        Current usage for display
+        """
+        usage = dask.utils.format_bytes(self.usage)
+        if self.limit is None:
+            return f'Memory {usage}'
+        return f'Memory {usage} / {dask.utils.format_bytes(self.limit)}'
+
+
+class BudgetCache:
+    """
+    Cache whose entries are accounted for by a :class:`MemoryBudget`
+
+    Entries that won't fit in the budget are silently not stored.
+    """
+
+    def __init__(self, budget, priority=0):
+        """
+        Args:
+            budget: :class:`MemoryBudget` to register with
+            priority: Higher priority caches are evicted later
+        """
+        self.priority = priority
+        self._entries = {}
+        self._lock = threading.RLock()
+
+        budget.register(self)
+        self._budget = budget
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value, size, _ = self._entries[key]
+            self._entries[key] = (value, size, time.monotonic())
+            return value
+
+    def put(self, key, value):
+        """
+        Store a value if it fits in the budget
+
+        Returns:
+            True if the value was stored
+        """
+        size = nbytes(value)
+        self.discard(key)
+        if not self._budget.make_room(size):
+            return False
+        with self._lock:
+            self._entries[key] = (value, size, time.monotonic())
+        return True
+
+    def discard(self, key):
+        """
+        Remove an entry
+
+        Returns:
+            Bytes freed
+        """
+        with self._lock:
+            if key not in self._entries:
+                return 0
+            return self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def values(self):
+        """
+        The stored values
+        """
+        with self._lock:
+            return [value for value, _, _ in self._entries.values()]
+
+    def eviction_values(self):
+        """
+        Eviction value of each entry, as (key, value) pairs
+        """
+        with self._lock:
+            return [(key, (self.priority, last)) for key, (_, _, last) in self._entries.items()]
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(size for _, size, _ in self._entries.values())
+
+
+#: Budget shared by everything in the process
+budget = MemoryBudget()
+
+
+# Variable tokens, by (id(dataset), names) -> (variables, token). Entries go
+# when their dataset does
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+
+def variables_token(dataset, names):
+    """
+    Identifier of the contents of some of a dataset's variables, for keying
+    caches of things worked out from them
+
+    Arrays in memory are hashed in full, so the token is kept for as long as
+    the dataset has the same variables rather than worked out every frame
+
+    Args:
+        dataset: xarray.Dataset
+        names: Names of the variables, or of dimensions without a coordinate
+    """
+    names = tuple(names)
+    variables = tuple(dataset.variables.get(n) for n in names)
+
+    key = (id(dataset), names)
+    with _tokens_lock:
+        found = _tokens.get(key)
+    if found is not None and all(a is b for a, b in zip(found[0], variables)):
+        return found[1]
+
+    # Dimensions without a coordinate are just their size
+    token = dask.base.tokenize(*(dataset.sizes[n] if v is None else v.data
+        for n, v in zip(names, variables)))
+    with _tokens_lock:
+        if not any(k[0] == id(dataset) for k in _tokens):
+            weakref.finalize(dataset, _forget_tokens, id(dataset))
+        _tokens[key] = (variables, token)
+    return token
+
+
+def _forget_tokens(dataset_id):
+    with _tokens_lock:
+        for key in [k for k in _tokens if k[0] == dataset_id]:
+            del _tokens[key]
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Reading and colouring playback frames in a separate process
+
+Reading netCDF and colouring frames hold the GIL, so even in background
+threads they make the QT event loop stutter. A :class:`FrameProcess` does
+them in a worker process instead, which writes each frame into one slot of
+a :class:`FrameRing` of shared memory buffers. Only small control messages
+go through the pipe to the worker, the frames themselves are never pickled
+and the GUI gets a numpy view of the slot it can display directly.
+
+Slots are reused in turn, so the ring needs more slots than there are frames
+in flight plus the one being shown.
+"""
+
+import weakref
+import threading
+import multiprocessing
+import multiprocessing.shared_memory
+from multiprocessing import resource_tracker
+
+import numpy
+import dask
+
+from .plot import select_slice
+
+
+class Pixels:
+    """
+    A frame already coloured by the worker, as RGBA pixels
+    """
+
+    def __init__(self, pixels):
+        #: Pixels, one uint32 each
+        self.pixels = pixels
+
+
+class FrameRing:
+    """
+    A fixed number of equally sized frame buffers in shared memory
+    """
+
+    def __init__(self, slots, slot_bytes, name=None):
+        """
+        Args:
+            slots: Number of buffers
+            slot_bytes: Size of each buffer
+            name: Shared memory to attach to, if None new shared memory is
+                created
+        """
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+
+        if name is None:
+            self.memory = multiprocessing.shared_memory.SharedMemory(create=True,
+                    size=max(slots * slot_bytes, 1))
+        else:
+            self.memory = multiprocessing.shared_memory.SharedMemory(name=name)
+            # Only the creator should unlink the memory
+            resource_tracker.unregister(self.memory._name, 'shared_memory')
+
+        self._next = 0
+        self._unlinked = False
+
+        # Views handed out, the memory can't be closed while any are alive
+        self._views = []
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def next_slot(self):
+        """
+        The slot to use for the next frame
+        """
+        slot = self._next
+        self._next = (self._next + 1) % self.slots
+        return slot
+
+    def view(self, slot, shape, dtype):
+        """
+        numpy view of a slot
+        """
+        dtype = numpy.dtype(dtype)
+        if int(numpy.prod(shape)) * dtype.itemsize > self.slot_bytes:
+            raise ValueError(f'A {shape} {dtype} frame doesn\'t fit in the ring')
+        view = numpy.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=slot * self.slot_bytes)
+        self._views = [v for v in self._views if v() is not None] + [weakref.ref(view)]
+        return view
+
+    @property
+    def in_use(self):
+        """
+        Are any views of the ring still alive? Views taken of them keep them
+        alive as their base
+        """
+        return any(v() is not None for v in self._views)
+
+    def close(self, unlink=False):
+        """
+        Release the shared memory
+
+        Returns:
+            True if it was closed, False if views of the ring are still in
+            use, in which case it should be closed again once they are gone
+        """
+        if unlink and not self._unlinked:
+            self.memory.unlink()
+            self._unlinked = True
+
+        # numpy views don't stop the memory being unmapped, which would leave
+        # frames on screen pointing at unmapped memory
+        if self.in_use:
+            return False
+        self.memory.close()
+        return True
+
+
+def _worker(dataset, connection):
+    """
+    Worker process main loop, answering messages from :class:`FrameProcess`
+    """
+    from .image import LutImage
+
+    # Frames are read one at a time, don't start threads for each
+    dask.config.set(scheduler='synchronous')
+
+    ring = None
+    image = None
+
+    while True:
+        message = connection.recv()
+        kind = message[0]
+
+        try:
+            if kind == 'stop':
+                break
+
+            elif kind == 'ring':
+                if ring is not None:
+                    ring.close()
+                ring = FrameRing(*message[1:])
+
+            elif kind == 'colour':
+                image = LutImage(**message[1]) if message[1] is not None else None
+
+            elif kind == 'read':
+                _, slot, varname, x, y, indices, shape, dtype = message
+                values = select_slice(dataset[varname], x, y, indices).values
+                out = ring.view(slot, shape, dtype)
+                if image is not None:
+                    image.colour(values, out)
+                else:
+                    numpy.copyto(out, values, casting='unsafe')
+                # Don't hold on to the ring, so it can be closed when replaced
+                del out
+
+            connection.send(None)
+
+        except Exception as e:
+            connection.send(f'{type(e).__name__}: {e}')
+
+    if ring is not None:
+        ring.close()
+    connection.close()
+
+
+class FrameProcess:
+    """
+    A worker process reading frames of a dataset into shared memory
+    """
+
+    def __init__(self, dataset, slots=6):
+        """
+        Args:
+            dataset: xarray.Dataset, sent to the worker once when it starts
+            slots: Number of frames in the ring
+        """
+        self.dataset = dataset
+        self.slots = slots
+
+        #: Ring of frame buffers, replaced when a bigger frame is needed
+        self.ring = None
+
+        # Replaced rings with frames that may still be on screen, closed once
+        # those frames have been replaced
+        self._retired = []
+
+        self._process = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+        self._shape = None
+        self._dtype = None
+        self._coloured = False
+
+    def start(self):
+        """
+        Start the worker process, if it isn't running
+        """
+        if self._process is not None:
+            return
+
+        # Spawn rather than fork so the worker doesn't inherit QT or dask
+        # thread state
+        context = multiprocessing.get_context('spawn')
+        self._connection, child = context.Pipe()
+        self._process = context.Process(target=_worker, args=(self.dataset, child), daemon=True)
+        self._process.start()
+        child.close()
+
+    def _call(self, *message):
+        self._connection.send(message)
+        error = self._connection.recv()
+        if error is not None:
+            raise RuntimeError(f'Frame worker failed: {error}')
+
+    def configure(self, shape, dtype, colour=None):
+        """
+        Set up the ring for frames of a given shape
+
+        Args:
+            shape: Shape of the slices
+            dtype: Type to read slices as, ignored if colouring
+            colour: :meth:`xncview.image.LutImage.settings` to colour frames
+                with in the worker, if None the values are returned
+        """
+        if colour is not None:
+            layout = colour['dims']
+            shape = (shape[layout.index(colour['ydim'])], shape[layout.index(colour['xdim'])])
+            dtype = 'u4'
+        dtype = numpy.dtype(dtype)
+        nbytes = int(numpy.prod(shape)) * dtype.itemsize
+
+        with self._lock:
+            self.start()
+
+            if self.ring is None or self.ring.slot_bytes < nbytes:
+                if self.ring is not None:
+                    self._retire(self.ring)
+                self.ring = FrameRing(self.slots, nbytes)
+                self._call('ring', self.ring.slots, self.ring.slot_bytes, self.ring.name)
+
+            self._call('colour', colour)
+
+            self._shape = tuple(shape)
+            self._dtype = dtype
+            self._coloured = colour is not None
+
+    def _retire(self, ring):
+        """
+        Stop using a ring, closing it if none of its frames are in use
+        """
+        if not ring.close(unlink=True):
+            self._retired.append(ring)
+
+    def _close_retired(self):
+        """
+        Close replaced rings whose frames are no longer in use
+        """
+        self._retired = [ring for ring in self._retired if not ring.close()]
+
+    def read(self, varname, x, y, indices):
+        """
+        Read a frame in the worker
+
+        Args:
+            varname: Name of the variable in the dataset
+            x, y: Plotting axes
+            indices: Mapping of passive dimension to index
+
+        Returns:
+            numpy.ndarray view of the frame in the ring, or :class:`Pixels`
+            if the frames are being coloured. It is valid until the slot is
+            reused.
+        """
+        with self._lock:
+            self._close_retired()
+            slot = self.ring.next_slot()
+            self._call('read', slot, varname, x, y, dict(indices), self._shape, self._dtype.str)
+            frame = self.ring.view(slot, self._shape, self._dtype)
+
+        if self._coloured:
+            return Pixels(frame)
+        return frame
+
+    def close(self):
+        """
+        Stop the worker and release the ring
+        """
+        with self._lock:
+            if self._process is not None:
+                try:
+                    self._connection.send(('stop',))
+                except (BrokenPipeError, OSError):
+                    pass
+                self._process.join(5)
+                if self._process.is_alive():
+                    self._process.terminate()
+                self._connection.close()
+                self._process = None
+
+            if self.ring is not None:
+                self._retire(self.ring)
+                self.ring = None
+            self._close_retired()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Several variables side by side, sharing dimension controls
+
+Every panel's slice for a step is read through one :class:`SliceReader`
+call, so the step costs a single dask compute however many panels there
+are.
+"""
+
+import math
+
+from matplotlib.backends.qt_compat import QtWidgets as QW
+from matplotlib.backends.backend_qt5agg import FigureCanvas
+from matplotlib.figure import Figure
+import xarray
+import cartopy.mpl.geoaxes
+
+from . import memory
+from .interpret_cf import classify_vars
+from .profiling import FrameTimer
+from .reader import SliceReader
+from .render import bounds_sample, sample_bounds
+from .scheduler import Scheduler
+from .widget import DimensionWidget, ColorBarWidget
+from .plot import (_get_variable_dims, default_axes, passive_dims, is_geographic,
+        geographic_projection, projections, default_projection, set_projection_extent, plot_slice)
+
+
+class Panel(QW.QGroupBox):
+    """
+    A single variable of a :class:`MultiWidget`
+    """
+
+    def __init__(self, variables, variable):
+        """
+        Args:
+            variables: Names of the variables that can be selected
+            variable: Initial variable
+        """
+        super().__init__()
+
+        main_layout = QW.QVBoxLayout(self)
+
+        self.varlist = QW.QComboBox()
+        self.varlist.addItems(variables)
+        self.varlist.setCurrentText(variable)
+
+        figure_layout = QW.QHBoxLayout()
+
+        figure = Figure(tight_layout=True)
+        figure.set_frameon(False)
+        self.canvas = FigureCanvas(figure)
+        self.canvas.setStyleSheet("background-color:transparent;")
+        self.axis = self.canvas.figure.subplots()
+
+        self.colorbar = ColorBarWidget()
+
+        figure_layout.addWidget(self.canvas)
+        figure_layout.addWidget(self.colorbar)
+
+        main_layout.addWidget(self.varlist)
+        main_layout.addLayout(figure_layout)
+
+        #: Current plot artist
+        self.plot = None
+
+    def setGeographic(self, geographic, projection=default_projection):
+        """
+        Switch between map and standard axes
+
+        Args:
+            geographic: Use map axes
+            projection: Name of the map projection, one of
+                :data:`xncview.plot.projections`
+        """
+        projection = geographic_projection(projection)
+        if geographic and getattr(self.axis, 'projection', None) == projection:
+            return
+        if not geographic and not isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes):
+            return
+
+        self.axis.remove()
+        if geographic:
+            self.axis = self.canvas.figure.subplots(subplot_kw={
+                'projection': projection})
+        else:
+            self.axis = self.canvas.figure.subplots()
+
+
+class MultiWidget(QW.QWidget):
+    """
+    QT Widget showing several variables with shared plotting axes and
+    passive dimension controls
+    """
+
+    def __init__(self, dataset, variables, budget=None, scheduler=None, slice_encoding='float'):
+        """
+        Args:
+            dataset: xarray.Dataset
+            variables: Names of the variables to show, one panel each
+            budget: :class:`xncview.memory.MemoryBudget` for caches and
+                computations (default the process-wide budget)
+            scheduler: :class:`xncview.scheduler.Scheduler` or scheduler
+                description for heavy computations (default threads)
+            slice_encoding: How cached slices are stored, one of
+                :data:`xncview.encoding.encodings`
+        """
+        super().__init__()
+
+        if len(variables) == 0:
+            raise ValueError('No variables to show')
+
+        main_layout = QW.QVBoxLayout(self)
+
+        #: Dataset being inspected
+        self.dataset = dataset
+
+        #: Memory accounting
+        self.budget = budget if budget is not None else memory.budget
+
+        #: Scheduler for heavy computations, slice reads stay in-process
+        if scheduler is None or isinstance(scheduler, str):
+            scheduler = Scheduler(scheduler or 'threads')
+        self.scheduler = scheduler
+
+        #: Reads of the displayed slices, shared by all panels
+        self.reader = SliceReader(self.budget, encoding=slice_encoding)
+
+        #: Frame timings
+        self.timer = FrameTimer()
+
+        self.xdim = QW.QComboBox()
+        self.ydim = QW.QComboBox()
+        header = QW.QGroupBox()
+        header_layout = QW.QHBoxLayout(header)
+        header_layout.addWidget(self.xdim)
+        header_layout.addWidget(self.ydim)
+
+        # Map projection, only shown if a panel is geographic
+        self.projection = QW.QComboBox()
+        self.projection.addItems(list(projections))
+        self.projection.setCurrentText(default_projection)
+        self.projection.setVisible(False)
+        header_layout.addWidget(self.projection)
+        main_layout.addWidget(header)
+
+        choices = sorted(v for v in classify_vars(dataset)['data'] if dataset[v].ndim >= 2)
+
+        #: Panels, one for each variable
+        self.panels = []
+        panel_group = QW.QWidget()
+        panel_layout = QW.QGridLayout(panel_group)
+        columns = math.ceil(math.sqrt(len(variables)))
+        for i, v in enumerate(variables):
+            panel = Panel(choices, v)
+            panel.varlist.currentIndexChanged.connect(lambda _, p=panel: self.change_variable(p))
+            panel.colorbar.valueChanged.connect(self.redraw)
+            panel_layout.addWidget(panel, i // columns, i % columns)
+            self.panels.append(panel)
+        main_layout.addWidget(panel_group)
+
+        #: Values for non-axis dimensions, shared by all panels
+        self.dims = {}
+        dims_group = QW.QGroupBox()
+        dims_layout = QW.QVBoxLayout(dims_group)
+        for name in list(dataset.coords) + [d for d in dataset.dims if d not in dataset.coords]:
+            da = dataset[name] if name in dataset.coords else xarray.DataArray(range(dataset.sizes[name]))
+            self.dims[name] = DimensionWidget(da)
+            self.dims[name].modebox.setVisible(False)
+            self.dims[name].valueChanged.connect(self.redraw)
+            dims_layout.addWidget(self.dims[name])
+        main_layout.addWidget(dims_group)
+
+        self.status = QW.QStatusBar()
+        self.readout = QW.QLabel()
+        self.status.addWidget(self.readout)
+        main_layout.addWidget(self.status)
+
+        # Plotting axes come from the first panel
+        dims = sorted(_get_variable_dims(self.variable(self.panels[0])))
+        x, y = default_axes(self.variable(self.panels[0]))
+        self.xdim.addItems(dims)
+        self.ydim.addItems(dims)
+        self.xdim.setCurrentText(x)
+        self.ydim.setCurrentText(y)
+        self.xdim.activated.connect(self.change_axes)
+        self.ydim.activated.connect(self.change_axes)
+        self.projection.currentIndexChanged.connect(self.change_axes)
+
+        for panel in self.panels:
+            self._update_bounds(panel)
+        self.change_axes()
+
+    def variable(self, panel):
+        """
+        The variable shown by a panel
+        """
+        return self.dataset[panel.varlist.currentText()]
+
+    def _update_bounds(self, panel):
+        variable = self.variable(panel)
+        sample = bounds_sample(variable)
+        try:
+            panel.colorbar.setBounds(sample_bounds(variable, lambda obj: self.budget.compute(
+                obj, source=sample, name='bounds', scheduler=self.scheduler)))
+        except memory.MemoryBudgetError as e:
+            print(e)
+            self.status.showMessage(f'Colour bounds not updated: {e}')
+
+    def change_variable(self, panel):
+        """
+        The variable of a panel has changed
+        """
+        self._update_bounds(panel)
+        self.change_axes()
+
+    def _shown(self, panel, x, y):
+        """
+        Can the panel's variable be plotted on the axes?
+        """
+        dims = _get_variable_dims(self.variable(panel))
+        return x != y and x in dims and y in dims
+
+    def change_axes(self):
+        """
+        The selected plotting axes have changed
+        """
+        x = self.xdim.currentText()
+        y = self.ydim.currentText()
+
+        passive = set()
+        geographic = False
+        for panel in self.panels:
+            if self._shown(panel, x, y):
+                variable = self.variable(panel)
+                passive.update(passive_dims(variable, x, y))
+                panel.setGeographic(is_geographic(variable, x, y), self.projection.currentText())
+                geographic |= is_geographic(variable, x, y)
+        self.projection.setVisible(geographic)
+
+        for d, w in self.dims.items():
+            w.setVisible(d in passive)
+
+        self.redraw()
+
+    def redraw(self):
+        x = self.xdim.currentText()
+        y = self.ydim.currentText()
+
+        with self.timer.frame(variables=[p.varlist.currentText() for p in self.panels]):
+            shown = [p for p in self.panels if self._shown(p, x, y)]
+
+            requests = []
+            for panel in shown:
+                variable = self.variable(panel)
+                indices = {d: self.dims[d].value() for d in passive_dims(variable, x, y)}
+                requests.append((variable, x, y, indices))
+
+            values = []
+            computes = self.reader.computes
+            try:
+                with self.timer.stage('read'):
+                    values = self.reader.read(requests, timer=self.timer,
+                            bounds=[p.colorbar.color_range() for p in shown])
+            except memory.MemoryBudgetError as e:
+                print(e)
+                self.status.showMessage(str(e))
+                shown = []
+
+            for panel in self.panels:
+                panel.axis.clear()
+                panel.plot = None
+                if isinstance(panel.axis, cartopy.mpl.geoaxes.GeoAxes):
+                    set_projection_extent(panel.axis, self.projection.currentText())
+
+            with self.timer.stage('plot'):
+                for panel, v in zip(shown, values):
+                    try:
+                        panel.plot = plot_slice(panel.axis, self.dataset, v, x, y,
+                                **panel.colorbar.get_plot_args())
+                    except (TypeError, ValueError) as e:
+                        print(e)
+
+            with self.timer.stage('draw'):
+                for panel in self.panels:
+                    panel.canvas.draw()
+                    panel.colorbar.redraw(panel.plot)
+
+        self.readout.setText(f'{len(shown)} panels read with {self.reader.computes - computes} computes')
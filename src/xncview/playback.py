@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Animated playback along a passive dimension
+
+Frames go through a three stage pipeline - while frame N is being displayed
+in the QT thread frame N+1 is being prepared and frame N+2 is being read, each
+stage in its own thread.
+"""
+
+import time
+import collections
+import concurrent.futures
+
+from matplotlib.backends.qt_compat import QtWidgets as QW, QtCore
+
+
+class FramePipeline:
+    """
+    Reads and prepares frames in background threads
+
+    Each stage has a single thread, so reading one frame overlaps with
+    preparing the previous one
+    """
+
+    def __init__(self, read, prepare):
+        """
+        Args:
+            read: Function index -> raw frame, run in the read thread
+            prepare: Function raw frame -> display frame, run in the prepare thread
+        """
+        self._read = read
+        self._prepare = prepare
+
+        self._read_pool = concurrent.futures.ThreadPoolExecutor(1)
+        self._prepare_pool = concurrent.futures.ThreadPoolExecutor(1)
+
+        #: Frames in flight, key -> (read future, prepare future)
+        self.pending = collections.OrderedDict()
+
+    def request(self, key, index):
+        """
+        Start reading a frame, key is used to refer to the request later
+        """
+        if key in self.pending:
+            return
+
+        read = self._read_pool.submit(self._read, index)
+        prepare = self._prepare_pool.submit(lambda: self._prepare(read.result()))
+        self.pending[key] = (read, prepare)
+
+    def ready(self, key):
+        """
+        Has the frame finished preparing?
+        """
+        return key in self.pending and self.pending[key][1].done()
+
+    def pop(self, key):
+        """
+        Get a finished frame, removing it from the pipeline
+        """
+        read, prepare = self.pending.pop(key)
+        return prepare.result()
+
+    def discard(self, keys):
+        """
+        Cancel frames that are no longer wanted
+        """
+        for key in list(keys):
+            read, prepare = self.pending.pop(key)
+            prepare.cancel()
+            read.cancel()
+
+    def shutdown(self):
+        """
+        Cancel all pending frames and stop the threads
+        """
+        self.discard(self.pending.keys())
+        self._read_pool.shutdown(wait=False)
+        self._prepare_pool.shutdown(wait=False)
+
+
+class PlaybackWidget(QW.QWidget):
+    """
+    Controls to play through a passive dimension
+
+    Frame k of a playback is due at ``k / fps`` seconds after starting. If the
+    pipeline can't keep up the newest ready frame is shown and the frames in
+    between are counted as dropped, new reads always start from the frame
+    that is currently due.
+    """
+
+    #: Signal emitted with (dimension, index, frame) when a frame should be shown
+    frameReady = QtCore.Signal(str, int, object)
+
+    #: Frames in flight at once - displaying N, preparing N+1, reading N+2
+    depth = 3
+
+    def __init__(self, reader, prepare, position):
+        """
+        Construct the widget
+
+        Args:
+            reader: Function dimension -> read function, called in the QT
+                thread when playback starts. The returned function is called
+                with an index in the read thread.
+            prepare: Function raw frame -> display frame, called in the
+                prepare thread
+            position: Function dimension -> current index
+        """
+        super().__init__()
+
+        self._reader = reader
+        self._prepare = prepare
+        self._position = position
+
+        main_layout = QW.QHBoxLayout(self)
+
+        self.dimension = QW.QComboBox()
+        self.button = QW.QPushButton('Play')
+        self.button.setCheckable(True)
+
+        self.fps = QW.QDoubleSpinBox()
+        self.fps.setRange(0.1, 120)
+        self.fps.setValue(10)
+        self.fps.setSuffix(' fps')
+
+        self.step = QW.QSpinBox()
+        self.step.setRange(1, 1000000)
+        self.step.setPrefix('step ')
+
+        self.loop = QW.QCheckBox('Loop')
+        self.loop.setChecked(True)
+
+        self.status = QW.QLabel()
+
+        main_layout.addWidget(self.dimension)
+        main_layout.addWidget(self.button)
+        main_layout.addWidget(self.fps)
+        main_layout.addWidget(self.step)
+        main_layout.addWidget(self.loop)
+        main_layout.addWidget(self.status)
+        main_layout.addStretch()
+
+        self.button.toggled.connect(self._toggled)
+
+        #: Sizes of the dimensions that can be played
+        self.sizes = {}
+
+        #: Number of frames skipped in the current playback
+        self.dropped = 0
+
+        self._pipeline = None
+        self._timer = QtCore.QTimer()
+        self._timer.timeout.connect(self._tick)
+
+        # Display times of recent frames, for the achieved frame rate
+        self._shown = collections.deque(maxlen=30)
+
+    def setDimensions(self, sizes):
+        """
+        Set the dimensions that can be played
+
+        Args:
+            sizes: Mapping of dimension name to size
+        """
+        self.stop()
+
+        self.sizes = dict(sizes)
+        self.dimension.clear()
+        self.dimension.addItems(list(self.sizes))
+        self.setEnabled(len(self.sizes) > 0)
+
+    def isPlaying(self):
+        return self._pipeline is not None
+
+    def play(self):
+        """
+        Start playback of the selected dimension from its current index
+        """
+        self.stop()
+
+        dim = self.dimension.currentText()
+        if dim not in self.sizes:
+            return
+
+        self._dim = dim
+        self._size = self.sizes[dim]
+        self._start = self._position(dim)
+        self._step = self.step.value()
+        self._loop = self.loop.isChecked()
+        self._interval = 1.0 / self.fps.value()
+
+        self._pipeline = FramePipeline(self._reader(dim), self._prepare)
+        self._last = 0
+        self.dropped = 0
+        self._shown.clear()
+
+        self._fill(1)
+        self._start_time = time.perf_counter()
+
+        # Poll several times per frame so ready frames aren't held back
+        self._timer.start(max(1, int(self._interval * 250)))
+
+        self.button.blockSignals(True)
+        self.button.setChecked(True)
+        self.button.setText('Stop')
+        self.button.blockSignals(False)
+
+    def stop(self):
+        """
+        Stop playback
+        """
+        self._timer.stop()
+
+        if self._pipeline is not None:
+            self._pipeline.shutdown()
+            self._pipeline = None
+
+        self.button.blockSignals(True)
+        self.button.setChecked(False)
+        self.button.setText('Play')
+        self.button.blockSignals(False)
+
+    def achievedFps(self):
+        """
+        Frame rate over the recently displayed frames
+        """
+        if len(self._shown) < 2 or self._shown[-1] == self._shown[0]:
+            return 0.0
+        return (len(self._shown) - 1) / (self._shown[-1] - self._shown[0])
+
+    def _toggled(self, checked):
+        if checked:
+            self.play()
+        else:
+            self.stop()
+
+    def _index(self, k):
+        """
+        Dimension index of the k'th frame of the playback, None past the end
+        """
+        index = self._start + k * self._step
+        if index >= self._size:
+            if not self._loop:
+                return None
+            index = index % self._size
+        return index
+
+    def _fill(self, first):
+        """
+        Request frames starting from first until the pipeline is full
+        """
+        k = first
+        while len(self._pipeline.pending) < self.depth:
+            index = self._index(k)
+            if index is None:
+                break
+            self._pipeline.request(k, index)
+            k += 1
+
+    def _tick(self):
+        due = int((time.perf_counter() - self._start_time) / self._interval) + 1
+
+        if due > self._last:
+            ready = [k for k in self._pipeline.pending if k <= due and self._pipeline.ready(k)]
+
+            if len(ready) > 0:
+                k = max(ready)
+                try:
+                    frame = self._pipeline.pop(k)
+                except Exception as e:
+                    print(e)
+                    self.stop()
+                    self.status.setText(f'Playback stopped: {e}')
+                    return
+
+                # Skip over anything older than the frame being shown
+                stale = [s for s in self._pipeline.pending if s < k]
+                self._pipeline.discard(stale)
+                self.dropped += k - self._last - 1
+                self._last = k
+
+                self._shown.append(time.perf_counter())
+                self.frameReady.emit(self._dim, self._index(k), frame)
+
+                self.status.setText(f'{self.achievedFps():.1f} fps, {self.dropped} dropped')
+
+        if self._index(self._last + 1) is None:
+            self.stop()
+            return
+
+        self._fill(max(self._last + 1, due))
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Plotting logic shared between the QT widget and headless renderers
+
+Nothing in here depends on QT, so it can be used on nodes without a display
+"""
+
+import numpy
+import cartopy.crs
+import cartopy.mpl.geoaxes
+from .interpret_cf import *
+from . import memory
+from .profiling import stage
+from .ugrid import load_mesh, plot_mesh
+from .seam import seam_grid, plot_seam_grid
+from .edges import infer_edges
+
+
+def _get_variable_dims(variable):
+    """
+    Get the available dimensions for the current variable
+    """
+    all_dims = set(variable.coords.keys()).union(variable.dims)
+
+    cleaned = set(all_dims)
+    for d in all_dims:
+        if variable[d].size == 1:
+            cleaned.remove(d)
+        if variable[d].ndim > 2:
+            cleaned.remove(d)
+
+    return cleaned
+
+
+def _bounds_token(dataset, *dims):
+    """
+    Identifier of the coordinates and bounds of dims, see
+    :func:`xncview.memory.variables_token`
+    """
+    names = []
+    for d in dims:
+        names.append(d)
+        bound = dataset[d].attrs.get('bounds', None)
+        if bound is not None:
+            names.append(bound)
+    return memory.variables_token(dataset, names)
+
+
+def _get_bounds(dataset, dim):
+    """
+    Get bounds of a dim, inferring them from the cell centres if the dim has
+    no bounds attribute
+    """
+    name = dim
+    dim = dataset[dim]
+    bound = dim.attrs.get('bounds',None)
+
+    if bound is None:
+        return infer_edges(dim, token=memory.variables_token(dataset, [name]))
+
+    # Switch to DataArray
+    bound = dataset[bound]
+
+    # Get the bound dimension
+    bound_d = set(bound.dims) - set(dim.dims)
+    if len(bound_d) != 1:
+        raise Exception(f'Bad bounds for dimension "{dim.name}"')
+    bound_d = bound_d.pop()
+
+    if dim.ndim == 1 and bound.sizes[bound_d] != 2:
+        raise Exception(f'Bad bounds for dimension "{dim.name}"')
+    elif dim.ndim == 2 and bound.sizes[bound_d] != 4:
+        raise Exception(f'Bad bounds for dimension "{dim.name}"')
+
+    if dim.ndim == 1:
+        return numpy.concatenate([bound.isel({bound_d:0}), bound.isel({bound_d:1})[-1:]])
+
+    if dim.ndim == 2:
+        A = numpy.concatenate([bound.isel({bound_d:0}),
+                               bound.isel({bound_d:3})[-1:, :]], axis=0)
+        B = numpy.concatenate([bound.isel({bound_d:1})[:,-1:],
+                               bound.isel({bound_d:2})[-1:,-1:]], axis=0)
+        return numpy.concatenate([A,B], axis=1)
+
+    raise Exception(f'Dimensions higher than two not implemented')
+
+
+def _mesh_dims(dataset, x, y):
+    """
+    Dimensions of the plotting axes as (rows, columns) of a pcolormesh, None
+    if they aren't a 1D or 2D grid
+    """
+    xc = dataset[x]
+    yc = dataset[y]
+    if xc.ndim == 1 and yc.ndim == 1 and xc.dims != yc.dims:
+        return yc.dims[0], xc.dims[0]
+    if xc.ndim == 2 and set(xc.dims) == set(yc.dims):
+        return xc.dims
+    return None
+
+
+def default_axes(variable):
+    """
+    Pick the default plotting axes for a variable, preferring longitude and
+    latitude if they can be identified
+
+    Returns:
+        (x, y) dimension names
+    """
+    dims = sorted(_get_variable_dims(variable))
+
+    x = dims[0]
+    lon = [d for d in identify_lon(variable) if d in dims]
+    if len(lon) > 0:
+        x = lon[0]
+
+    y = dims[1]
+    lat = [d for d in identify_lat(variable) if d in dims]
+    if len(lat) > 0:
+        y = lat[0]
+
+    return x, y
+
+
+def passive_dims(variable, x, y):
+    """
+    Dimensions of the variable that are not covered by the plotting axes
+    """
+    return [d for d in variable.dims
+            if d not in [x, y] and d not in variable[x].dims and d not in variable[y].dims]
+
+
+def select_slice(variable, x, y, indices):
+    """
+    Flatten the passive dimensions of a variable
+
+    Args:
+        variable: xarray.DataArray
+        x, y: Plotting axes
+        indices: Mapping of dimension name to index, missing passive
+            dimensions use the first index
+
+    Returns:
+        xarray.DataArray with only the plotting axes remaining
+    """
+    return variable.isel({d: indices.get(d, 0) for d in passive_dims(variable, x, y)})
+
+
+def is_geographic(variable, x, y):
+    """
+    Should the plot be drawn on a map?
+    """
+    return x in identify_lon(variable) and y in identify_lat(variable)
+
+
+#: Map projections that can be chosen, by name
+projections = {
+    'PlateCarree': lambda: cartopy.crs.PlateCarree(central_longitude=180.0),
+    'Robinson': lambda: cartopy.crs.Robinson(central_longitude=180.0),
+    'Mollweide': lambda: cartopy.crs.Mollweide(central_longitude=180.0),
+    'EqualEarth': lambda: cartopy.crs.EqualEarth(central_longitude=180.0),
+    'NorthPolarStereo': lambda: cartopy.crs.NorthPolarStereo(),
+    'SouthPolarStereo': lambda: cartopy.crs.SouthPolarStereo(),
+    }
+
+#: Longitude and latitude extent of regional projections, the others show
+#: the whole grid
+projection_extents = {
+    'NorthPolarStereo': (-180, 180, 40, 90),
+    'SouthPolarStereo': (-180, 180, -90, -40),
+    }
+
+#: Projection map plots use unless another is chosen
+default_projection = 'PlateCarree'
+
+
+def geographic_projection(name=default_projection):
+    """
+    Projection used for map plots
+
+    Args:
+        name: One of :data:`projections`
+    """
+    if name not in projections:
+        raise ValueError(f'Unknown projection "{name}"')
+    return projections[name]()
+
+
+def set_projection_extent(axis, name):
+    """
+    Limit a map to the extent of a regional projection, leaving global
+    projections alone
+    """
+    extent = projection_extents.get(name, None)
+    if extent is not None:
+        axis.set_extent(extent, crs=cartopy.crs.PlateCarree())
+
+
+#: Colour scaling modes
+color_modes = ['linear', 'equalise', 'clip']
+
+#: Percentiles kept by the 'clip' colour mode
+clip_percentiles = (2, 98)
+
+
+def color_args(bounds, mode='linear', histogram=None):
+    """
+    Get the colour scaling plot arguments, linear scaling uses vmin and vmax
+    from the colour bar bounds with values crossing zero getting symmetric
+    bounds
+
+    Args:
+        bounds: Colour bar bounds
+        mode: One of :data:`color_modes`, modes other than linear need a
+            histogram and fall back to linear without one
+        histogram: :class:`xncview.histogram.Histogram` of the variable
+
+    Returns:
+        Keyword arguments for pcolormesh, empty if the bounds aren't finite
+    """
+    if histogram is not None and mode == 'equalise':
+        return {'norm': histogram.equalised_norm()}
+    if histogram is not None and mode == 'clip':
+        bounds = [histogram.percentile(q) for q in clip_percentiles]
+
+    if not numpy.all(numpy.isfinite(bounds)):
+        # Bounds not known yet, let matplotlib scale to the data
+        return {}
+
+    kwargs = {}
+    if bounds[0] < 0 < bounds[1]:
+        kwargs['vmax'] = numpy.abs(bounds).max()
+        kwargs['vmin'] = -kwargs['vmax']
+    else:
+        kwargs['vmin'] = bounds[0]
+        kwargs['vmax'] = bounds[1]
+    return kwargs
+
+
+def plot_slice(axis, dataset, v, x, y, timer=None, coastlines=True, **kwargs):
+    """
+    Plot a 2D slice of a variable onto axis
+
+    On maps the cell edges are transformed to the map projection once per
+    grid, see :mod:`xncview.seam`, rather than cartopy doing it every plot
+
+    Args:
+        axis: matplotlib.axes.Axes or cartopy GeoAxes
+        dataset: xarray.Dataset containing the coordinates
+        v: xarray.DataArray with only the plotting axes remaining
+        x, y: Plotting axes
+        timer: Optional :class:`xncview.profiling.FrameTimer` to time the
+            plotting stages with
+        coastlines: Draw coastlines on map plots
+        **kwargs: Passed to pcolormesh
+
+    Returns:
+        The pcolormesh artist, or the mesh artist if the plotting axes are
+        positions on a UGRID mesh
+    """
+    geographic = isinstance(axis, cartopy.mpl.geoaxes.GeoAxes)
+    with stage(timer, 'mesh'):
+        mesh = load_mesh(dataset, x, y, projection=axis.projection if geographic else None)
+    if mesh is not None:
+        return plot_mesh(axis, mesh, v, timer=timer, coastlines=coastlines, **kwargs)
+
+    if geographic:
+        if coastlines:
+            with stage(timer, 'coastlines'):
+                axis.coastlines(alpha=0.2)
+
+        grid = None
+        with stage(timer, 'bounds'):
+            xb = _get_bounds(dataset, x)
+            yb = _get_bounds(dataset, y)
+
+        dims = _mesh_dims(dataset, x, y)
+        if dims is not None:
+            try:
+                with stage(timer, 'seams'):
+                    grid = seam_grid(xb, yb, dims, axis.projection,
+                            token=_bounds_token(dataset, x, y))
+            except ValueError as e:
+                # Leave it to cartopy
+                print(e)
+
+        with stage(timer, 'pcolormesh'):
+            if grid is not None:
+                return plot_seam_grid(axis, grid, v, **kwargs)
+            return axis.pcolormesh(xb, yb, v, transform=cartopy.crs.PlateCarree(), **kwargs)
+
+    with stage(timer, 'bounds'):
+        x = _get_bounds(dataset, x)
+        y = _get_bounds(dataset, y)
+
+    with stage(timer, 'pcolormesh'):
+        return axis.pcolormesh(x, y, v, **kwargs)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Timing of the stages that go into drawing a frame
+"""
+
+import json
+import time
+import contextlib
+import collections
+
+import dask
+
+
+def dask_tasks(obj):
+    """
+    Number of tasks in the dask graph of obj, 0 if it isn't a dask collection.
+    Tasks shared by the members of a tuple or list are only counted once
+    """
+    if isinstance(obj, (tuple, list)):
+        keys = set()
+        for o in obj:
+            if dask.is_dask_collection(o):
+                keys.update(o.__dask_graph__().keys())
+        return len(keys)
+
+    if not dask.is_dask_collection(obj):
+        return 0
+    return len(obj.__dask_graph__())
+
+
+def stage(timer, name):
+    """
+    Time a stage if timer is not None
+    """
+    if timer is None:
+        return contextlib.nullcontext()
+    return timer.stage(name)
+
+
+class FrameTimer:
+    """
+    Collects the time spent in each stage of drawing a frame
+
+        with timer.frame(variable='a'):
+            with timer.stage('read'):
+                ...
+    """
+
+    def __init__(self, history=20):
+        """
+        Args:
+            history: Number of frames in the rolling average
+        """
+        #: Recent frames
+        self.history = collections.deque(maxlen=history)
+
+        #: All frames since :meth:`record` was called, None if not recording
+        self.trace = None
+
+        #: Frame currently being timed
+        self.current = None
+
+        self._count = 0
+
+    def record(self):
+        """
+        Start keeping every frame for :meth:`write_trace`
+        """
+        self.trace = []
+
+    @contextlib.contextmanager
+    def frame(self, **info):
+        """
+        Time a frame, info is added to the frame's record
+        """
+        self.current = {'frame': self._count, 'time': time.time(), **info,
+                'stages': {}, 'tasks': 0}
+        start = time.perf_counter()
+        try:
+            yield self.current
+        finally:
+            self.current['total'] = time.perf_counter() - start
+
+            self.history.append(self.current)
+            if self.trace is not None:
+                self.trace.append(self.current)
+
+            self.current = None
+            self._count += 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a stage of the current frame, repeated stages are summed
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.current is not None:
+                stages = self.current['stages']
+                stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+    def add_tasks(self, obj):
+        """
+        Count the dask tasks needed to compute obj in the current frame
+        """
+        if self.current is not None:
+            self.current['tasks'] += dask_tasks(obj)
+
+    def last(self):
+        """
+        Stage times of the last frame in seconds
+        """
+        if len(self.history) == 0:
+            return {}
+        return dict(self.history[-1]['stages'], total=self.history[-1]['total'])
+
+    def average(self):
+        """
+        Mean stage times over the recent frames in seconds
+        """
+        totals = collections.defaultdict(float)
+        counts = collections.defaultdict(int)
+        for f in self.history:
+            for name, t in dict(f['stages'], total=f['total']).items():
+                totals[name] += t
+                counts[name] += 1
+        return {name: totals[name] / counts[name] for name in totals}
+
+    def summary(self):
+        """
+        One line description of the last frame and the rolling average
+        """
+        if len(self.history) == 0:
+            return ''
+
+        last = self.last()
+        average = self.average()
+        parts = [f'{name} {last[name]*1000:.1f} ms (avg {average[name]*1000:.1f})' for name in last]
+        parts.append(f"{self.history[-1]['tasks']} tasks")
+        return ' | '.join(parts)
+
+    def write_trace(self, path):
+        """
+        Write the recorded frames as JSON lines
+        """
+        with open(path, 'w') as f:
+            for record in self.trace or []:
+                f.write(json.dumps(record, default=str) + '\n')
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Aggregating rasteriser for grids with more cells than the screen has pixels
+
+Rather than drawing a polygon per cell, cell centres are binned into a
+canvas sized raster. Which pixel each cell falls in only depends on the
+grid and the view, so it is worked out once as a :class:`PixelMapping`,
+after which each frame is a vectorised aggregation of the values.
+
+Cells larger than a pixel leave gaps, so this is only worth using when the
+grid is finer than the screen - pcolormesh is better otherwise. Unstructured
+grids without a mesh can't be drawn by pcolormesh, so when they are coarser
+than the screen each pixel is instead filled from its nearest cell, see
+:func:`nearest_mapping`.
+"""
+
+import numpy
+import cartopy.crs
+import cartopy.mpl.geoaxes
+
+from .profiling import stage
+
+
+#: Ways of combining the cells in a pixel
+aggregations = ['mean', 'max', 'min', 'first']
+
+
+class PixelMapping:
+    """
+    Which raster pixel each grid cell falls in
+    """
+
+    def __init__(self, px, py, extent, shape, dims):
+        """
+        Args:
+            px, py: Flattened cell centre positions in the raster coordinates
+            extent: (x0, x1, y0, y1) of the raster
+            shape: (height, width) of the raster in pixels
+            dims: Dimensions of the grid, in the order px and py were
+                flattened
+        """
+        self.extent = tuple(float(e) for e in extent)
+        self.shape = tuple(int(s) for s in shape)
+        self.dims = tuple(dims)
+
+        x0, x1, y0, y1 = self.extent
+        height, width = self.shape
+
+        px = numpy.asarray(px, dtype='f8')
+        py = numpy.asarray(py, dtype='f8')
+
+        with numpy.errstate(invalid='ignore'):
+            i = numpy.floor((px - x0) / max(x1 - x0, 1e-300) * width)
+            j = numpy.floor((py - y0) / max(y1 - y0, 1e-300) * height)
+
+            # Cells on the far edge belong to the last pixel
+            i = numpy.where(px == x1, width - 1, i)
+            j = numpy.where(py == y1, height - 1, j)
+
+            valid = numpy.isfinite(i) & numpy.isfinite(j) & (i >= 0) & (i < width) & (j >= 0) & (j < height)
+
+        cells = numpy.flatnonzero(valid)
+        pixel = j[valid].astype('i8') * width + i[valid].astype('i8')
+
+        order = numpy.argsort(pixel, kind='stable')
+
+        #: Cells that are in the raster, sorted by pixel
+        self.cells = cells[order]
+
+        #: Pixels that contain at least one cell, and where their cells start
+        #: in :attr:`cells`
+        self.pixels, self.starts = numpy.unique(pixel[order], return_index=True)
+
+        #: Number of cells in the grid
+        self.size = px.size
+
+    @classmethod
+    def from_pixels(cls, pixels, cells, extent, shape, dims, size):
+        """
+        Mapping with a single cell for each pixel
+
+        Args:
+            pixels: Flat raster index of the pixels that have a cell
+            cells: Flat grid index of the cell for each pixel
+            extent: (x0, x1, y0, y1) of the raster
+            shape: (height, width) of the raster in pixels
+            dims: Dimensions of the grid
+            size: Number of cells in the grid
+        """
+        mapping = cls.__new__(cls)
+        mapping.extent = tuple(float(e) for e in extent)
+        mapping.shape = tuple(int(s) for s in shape)
+        mapping.dims = tuple(dims)
+
+        order = numpy.argsort(pixels, kind='stable')
+        mapping.pixels = numpy.asarray(pixels, dtype='i8')[order]
+        mapping.cells = numpy.asarray(cells, dtype='i8')[order]
+        mapping.starts = numpy.arange(mapping.pixels.size)
+        mapping.size = int(size)
+        return mapping
+
+    @property
+    def nbytes(self):
+        return self.cells.nbytes + self.pixels.nbytes + self.starts.nbytes
+
+    def rasterise(self, values, how='mean'):
+        """
+        Aggregate cell values into the raster
+
+        Args:
+            values: Cell values, with dimensions in the order of :attr:`dims`
+            how: One of :data:`aggregations`
+
+        Returns:
+            numpy.ndarray of shape :attr:`shape`, NaN where there are no
+            cells
+        """
+        values = numpy.ma.filled(numpy.ma.asarray(values, dtype='f8'), numpy.nan).ravel()
+        if values.size != self.size:
+            raise ValueError(f'Expected {self.size} values, got {values.size}')
+
+        v = values[self.cells]
+        raster = numpy.full(self.shape[0] * self.shape[1], numpy.nan)
+        if v.size == 0:
+            return raster.reshape(self.shape)
+
+        if how == 'first':
+            result = v[self.starts]
+        elif how == 'max':
+            result = numpy.fmax.reduceat(v, self.starts)
+        elif how == 'min':
+            result = numpy.fmin.reduceat(v, self.starts)
+        elif how == 'mean':
+            finite = numpy.isfinite(v)
+            total = numpy.add.reduceat(numpy.where(finite, v, 0), self.starts)
+            count = numpy.add.reduceat(finite.astype('i8'), self.starts)
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                result = numpy.where(count > 0, total / count, numpy.nan)
+        else:
+            raise ValueError(f'Unknown aggregation "{how}"')
+
+        raster[self.pixels] = result
+        return raster.reshape(self.shape)
+
+
+def grid_centres(dataset, x, y):
+    """
+    Flattened cell centres of the plotting axes
+
+    Returns:
+        (x, y, dims) with x and y flattened in the order of dims
+    """
+    xc = dataset[x]
+    yc = dataset[y]
+
+    if xc.ndim == 1 and yc.ndim == 1 and xc.dims != yc.dims:
+        X, Y = numpy.meshgrid(xc.values, yc.values)
+        return X.ravel(), Y.ravel(), (yc.dims[0], xc.dims[0])
+
+    if set(xc.dims) != set(yc.dims):
+        raise ValueError(f'"{x}" and "{y}" are not on the same grid')
+
+    yc = yc.transpose(*xc.dims)
+    return xc.values.ravel(), yc.values.ravel(), xc.dims
+
+
+def build_mapping(dataset, x, y, shape, projection=None):
+    """
+    Map the cells of a grid onto a raster covering the whole grid
+
+    Args:
+        dataset: xarray.Dataset containing the coordinates
+        x, y: Plotting axes
+        shape: (height, width) of the raster in pixels
+        projection: cartopy projection of a map, the coordinates are taken
+            to be longitude and latitude
+
+    Returns:
+        :class:`PixelMapping`
+    """
+    px, py, dims = grid_centres(dataset, x, y)
+    px = numpy.asarray(px, dtype='f8')
+    py = numpy.asarray(py, dtype='f8')
+
+    if projection is not None:
+        points = projection.transform_points(cartopy.crs.PlateCarree(), px, py)
+        px, py = points[:, 0], points[:, 1]
+
+    finite = numpy.isfinite(px) & numpy.isfinite(py)
+    if not finite.any():
+        raise ValueError('The grid has no valid cell centres')
+
+    extent = (px[finite].min(), px[finite].max(), py[finite].min(), py[finite].max())
+    return PixelMapping(px, py, extent, shape, dims)
+
+
+def nearest_mapping(dataset, x, y, shape, index, projection=None):
+    """
+    Map each pixel of a raster covering the whole grid to its nearest cell
+
+    Used for grids with fewer cells than pixels that pcolormesh can't draw,
+    where binning the centres would leave gaps between the cells. Pixels
+    further than the index tolerance from any cell are left empty.
+
+    Args:
+        dataset: xarray.Dataset containing the coordinates
+        x, y: Plotting axes
+        shape: (height, width) of the raster in pixels
+        index: :class:`xncview.lookup.CurvilinearIndex` of the grid
+        projection: cartopy projection of a map, the coordinates are taken
+            to be longitude and latitude
+
+    Returns:
+        :class:`PixelMapping`
+    """
+    centres = build_mapping(dataset, x, y, shape, projection=projection)
+
+    x0, x1, y0, y1 = centres.extent
+    height, width = centres.shape
+    px = x0 + (numpy.arange(width) + 0.5) * (x1 - x0) / width
+    py = y0 + (numpy.arange(height) + 0.5) * (y1 - y0) / height
+    px, py = [a.ravel() for a in numpy.meshgrid(px, py)]
+
+    if projection is not None:
+        points = cartopy.crs.PlateCarree().transform_points(projection, px, py)
+        px, py = points[:, 0], points[:, 1]
+
+    # Both the index and the centres are in the order of the x coordinate's
+    # dimensions
+    found, valid = index.query_points(px, py)
+    pixels = numpy.flatnonzero(valid)
+    cells = numpy.ravel_multi_index([found[d][valid] for d in index.dims], index.shape)
+
+    return PixelMapping.from_pixels(pixels, cells, centres.extent, centres.shape,
+            centres.dims, centres.size)
+
+
+def plot_raster(axis, mapping, v, how='mean', timer=None, coastlines=True, **kwargs):
+    """
+    Plot a 2D slice of a variable onto axis as an aggregated raster
+
+    Args:
+        axis: matplotlib.axes.Axes or cartopy GeoAxes
+        mapping: :class:`PixelMapping` for the grid and axis
+        v: xarray.DataArray with only the grid dimensions remaining
+        how: One of :data:`aggregations`
+        timer: Optional :class:`xncview.profiling.FrameTimer`
+        coastlines: Draw coastlines on map plots
+        **kwargs: Passed to imshow
+
+    Returns:
+        The imshow artist
+    """
+    plot_args = {}
+    if isinstance(axis, cartopy.mpl.geoaxes.GeoAxes):
+        plot_args['transform'] = axis.projection
+        if coastlines:
+            with stage(timer, 'coastlines'):
+                axis.coastlines(alpha=0.2)
+
+    with stage(timer, 'rasterise'):
+        raster = mapping.rasterise(v.transpose(*mapping.dims).values, how)
+
+    with stage(timer, 'imshow'):
+        return axis.imshow(numpy.ma.masked_invalid(raster), extent=mapping.extent, origin='lower',
+                interpolation='nearest', aspect='auto', **plot_args, **kwargs)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reading the slices being displayed
+
+All slice reads for a step go through a :class:`SliceReader`, which serves
+what it can from the cache and computes the rest together in a single dask
+compute. dask merges identical tasks in the combined graph, so a chunk
+needed by several panels is only read once.
+
+Slices can be cached in a compact form, see :mod:`xncview.encoding`.
+"""
+
+from . import memory
+from .encoding import encode
+from .plot import select_slice
+
+
+class SliceReader:
+    """
+    Batched and cached reads of 2D slices
+    """
+
+    def __init__(self, budget, cache=None, encoding='float'):
+        """
+        Args:
+            budget: :class:`xncview.memory.MemoryBudget` for the reads
+            cache: :class:`xncview.memory.BudgetCache` of slices (default a
+                new cache)
+            encoding: How slices are stored in the cache, one of
+                :data:`xncview.encoding.encodings`
+        """
+        self.budget = budget
+
+        #: How slices are stored in the cache
+        self.encoding = encoding
+
+        #: Slices that have already been read, by (variable, x, y, indices)
+        self.cache = cache if cache is not None else memory.BudgetCache(budget)
+
+        #: Number of computes done
+        self.computes = 0
+
+    @staticmethod
+    def key(variable, x, y, indices):
+        """
+        Cache key of a slice
+        """
+        return (variable.name, x, y, tuple(sorted(indices.items())))
+
+    def compression_ratio(self):
+        """
+        Unencoded size of the cached slices over the memory they use, None
+        if nothing is cached
+        """
+        entries = self.cache.values()
+        used = sum(e.nbytes for e in entries)
+        if used == 0:
+            return None
+        return sum(e.raw_nbytes for e in entries) / used
+
+    def read(self, requests, timer=None, bounds=None):
+        """
+        Read a group of slices
+
+        Args:
+            requests: List of (variable, x, y, indices), see
+                :func:`xncview.plot.select_slice`
+            timer: Optional :class:`xncview.profiling.FrameTimer` to count
+                the dask tasks with
+            bounds: Optional list of the (low, high) colour range of each
+                request, quantised slices are read again if they can't
+                show it
+
+        Returns:
+            List of xarray.DataArray, one for each request
+        """
+        keys = [self.key(*r) for r in requests]
+        if bounds is None:
+            bounds = [None] * len(requests)
+        ranges = dict(zip(keys, bounds))
+
+        results = {}
+        missing = {}
+        for key, request in zip(keys, requests):
+            if key in results or key in missing:
+                continue
+            entry = self.cache.get(key)
+            if entry is not None and entry.usable(ranges[key]):
+                results[key] = entry.decode()
+            else:
+                missing[key] = select_slice(*request)
+
+        if len(missing) > 0:
+            lazy = tuple(missing.values())
+            if timer is not None:
+                timer.add_tasks(lazy)
+            values = self.budget.compute(lazy, name='read')
+            self.computes += 1
+
+            for key, value in zip(missing, values):
+                results[key] = value
+                self.cache.put(key, encode(value, self.encoding, ranges[key]))
+
+        return [results[k] for k in keys]
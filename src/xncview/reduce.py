@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reductions over passive dimensions
+
+Reductions are streamed - the first reduced dimension is worked through a
+batch of chunks at a time, and a partial result is available after each
+batch so the plot can refine while the reduction runs.
+"""
+
+import math
+
+import numpy
+import xarray
+import dask
+import dask.system
+from matplotlib.backends.qt_compat import QtCore
+
+
+#: Available reduction operations
+operations = ['mean', 'min', 'max', 'std']
+
+
+class Accumulator:
+    """
+    Combines partial statistics of blocks along a dimension
+    """
+
+    #: Statistics needed by each operation
+    needs = {
+        'mean': ['sum', 'count'],
+        'std': ['count', 'mean', 'm2'],
+        'min': ['min'],
+        'max': ['max'],
+        }
+
+    def __init__(self, op):
+        if op not in self.needs:
+            raise ValueError(f'Unknown reduction "{op}"')
+        self.op = op
+        self.totals = None
+
+    def statistics(self, block, dim):
+        """
+        Lazy statistics of a block, reduced along dim
+
+        Returns:
+            xarray.Dataset
+        """
+        stats = {}
+        for s in self.needs[self.op]:
+            if s == 'sum':
+                stats[s] = block.sum(dim, dtype='f8')
+            elif s == 'count':
+                stats[s] = block.count(dim)
+            elif s == 'mean':
+                stats[s] = block.mean(dim, dtype='f8')
+            elif s == 'm2':
+                # Squared deviations from the block mean, which are merged
+                # between blocks without the cancellation of a sum of squares
+                stats[s] = ((block.astype('f8') - block.mean(dim, dtype='f8'))**2).sum(dim)
+            elif s == 'min':
+                stats[s] = block.min(dim)
+            elif s == 'max':
+                stats[s] = block.max(dim)
+        return xarray.Dataset(stats)
+
+    def add(self, stats):
+        """
+        Add computed statistics from :meth:`statistics`
+        """
+        values = {k: numpy.asarray(v.values) for k, v in stats.data_vars.items()}
+
+        if self.totals is None:
+            self.totals = values
+            return
+
+        if 'm2' in values:
+            self._merge_moments(values)
+
+        for k, v in values.items():
+            if k in ['mean', 'm2']:
+                continue
+            elif k == 'min':
+                self.totals[k] = numpy.fmin(self.totals[k], v)
+            elif k == 'max':
+                self.totals[k] = numpy.fmax(self.totals[k], v)
+            else:
+                self.totals[k] = self.totals[k] + v
+
+    def _merge_moments(self, values):
+        """
+        Merge the mean and squared deviations of a block into the totals, with
+        Chan et al.'s parallel update. Counts are added by :meth:`add`
+        """
+        t = self.totals
+        na, nb = t['count'], values['count']
+        n = na + nb
+
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            delta = values['mean'] - t['mean']
+            fraction = numpy.where(n > 0, nb / n, 0)
+            mean = numpy.where(na > 0, t['mean'] + delta * fraction, values['mean'])
+            m2 = numpy.where(na == 0, values['m2'],
+                    numpy.where(nb == 0, t['m2'], t['m2'] + values['m2'] + delta**2 * na * fraction))
+
+        t['mean'] = mean
+        t['m2'] = m2
+
+    def result(self):
+        """
+        Reduction of the blocks added so far
+        """
+        t = self.totals
+        if self.op in ['min', 'max']:
+            return t[self.op]
+
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            count = numpy.where(t['count'] > 0, t['count'], numpy.nan)
+            if self.op == 'mean':
+                return t['sum'] / count
+            return numpy.sqrt(numpy.maximum(t['m2'] / count, 0))
+
+
+def chunk_ranges(variable, dim, batch=1):
+    """
+    Index ranges along dim covering batch chunks at a time
+    """
+    size = variable.sizes[dim]
+
+    if variable.chunks is None:
+        # No chunks, just split so there's some progress to show
+        step = max(1, math.ceil(size / 10))
+        return [(i, min(i + step, size)) for i in range(0, size, step)]
+
+    bounds = numpy.cumsum((0,) + tuple(variable.chunksizes[dim]))
+    return [(bounds[i], bounds[min(i + batch, len(bounds) - 1)]) for i in range(0, len(bounds) - 1, batch)]
+
+
+def stream_reduce(variable, reductions, compute=None, batch=None):
+    """
+    Reduce a variable over one or more dimensions, yielding partial results
+
+    The first dimension in reductions is streamed through. Any others are
+    reduced within each block first, e.g. ``{'time': 'mean', 'depth': 'max'}``
+    gives the time mean of the depth maximum.
+
+    Args:
+        variable: xarray.DataArray
+        reductions: Mapping of dimension name to operation
+        compute: Function computing an xarray.Dataset (default dask.compute)
+        batch: Chunks per step (default number of CPUs)
+
+    Yields:
+        (fraction complete, xarray.DataArray of the partial result)
+    """
+    if compute is None:
+        compute = lambda obj: dask.compute(obj)[0]
+    if batch is None:
+        batch = dask.system.CPU_COUNT
+
+    dims = list(reductions)
+    stream = dims[0]
+
+    def inner(block):
+        for d in dims[1:]:
+            block = getattr(block, reductions[d])(d)
+        return block
+
+    template = inner(variable.isel({stream: 0}, drop=True))
+    accumulator = Accumulator(reductions[stream])
+    size = variable.sizes[stream]
+
+    for start, stop in chunk_ranges(variable, stream, batch):
+        block = inner(variable.isel({stream: slice(start, stop)}))
+        accumulator.add(compute(accumulator.statistics(block, stream)))
+
+        result = xarray.DataArray(accumulator.result(), dims=template.dims, coords=template.coords,
+                name=variable.name)
+        yield stop / size, result
+
+
+def reduce_dims(variable, reductions, compute=None, batch=None):
+    """
+    Reduce a variable over one or more dimensions, see :func:`stream_reduce`
+    """
+    result = None
+    for _, result in stream_reduce(variable, reductions, compute, batch):
+        pass
+    return result
+
+
+class ReductionJob(QtCore.QObject):
+    """
+    Runs :func:`stream_reduce` in the background
+
+    Signals are emitted from the worker thread with the job as the first
+    argument, connect them to methods of a QObject so they are queued to
+    that object's thread. Results are in :attr:`latest`.
+    """
+
+    #: Signal emitted with the fraction complete
+    progress = QtCore.Signal(object, float)
+
+    #: Signal emitted when a partial result is available
+    partial = QtCore.Signal(object)
+
+    #: Signal emitted when the final result is available
+    finished = QtCore.Signal(object)
+
+    #: Signal emitted with an error message if the reduction fails
+    failed = QtCore.Signal(object, str)
+
+    def __init__(self, key, variable, reductions, compute=None):
+        """
+        Args:
+            key: Identifier of the result, for caching
+            variable: xarray.DataArray
+            reductions: Mapping of dimension name to operation
+            compute: Function computing an xarray.Dataset
+        """
+        super().__init__()
+
+        self.key = key
+        self.variable = variable
+        self.reductions = reductions
+        self.compute = compute
+
+        #: Most recent result
+        self.latest = None
+
+        #: Has the final result been reached
+        self.done = False
+
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Stop after the current batch
+        """
+        self._cancelled = True
+
+    def run(self):
+        try:
+            for fraction, result in stream_reduce(self.variable, self.reductions, self.compute):
+                if self._cancelled:
+                    return
+                self.latest = result
+                self.progress.emit(self, fraction)
+                if fraction < 1:
+                    self.partial.emit(self)
+            self.done = True
+            self.finished.emit(self)
+        except Exception as e:
+            self.failed.emit(self, str(e))
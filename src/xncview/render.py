@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Headless rendering of frames and animations, for use without a display
+
+    xncview render --variable temp --dim time --output temp.gif input.nc
+"""
+
+import os
+import time
+import tempfile
+import multiprocessing
+
+import dask
+import dask.array
+import dask.utils
+import matplotlib.animation
+import matplotlib.image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from .plot import (default_axes, passive_dims, select_slice, is_geographic,
+        geographic_projection, color_args, plot_slice)
+
+
+#: Animation writers for output file extensions
+animation_writers = {
+    '.gif': 'pillow',
+    '.mp4': 'ffmpeg',
+    }
+
+
+def add_arguments(parser):
+    """
+    Add the render options to an argument parser
+    """
+    group = parser.add_argument_group('render')
+    group.add_argument('--variable', '-v', required=True, help='Variable to render')
+    group.add_argument('--dim', '-d', help='Dimension to step through (default first passive dimension)')
+    group.add_argument('--start', type=int, default=0, help='First index along --dim')
+    group.add_argument('--stop', type=int, default=None, help='Stop index along --dim (default dimension size)')
+    group.add_argument('--step', type=int, default=1, help='Index step along --dim')
+    group.add_argument('--xdim', '-x', default=None, help='Horizontal plot axis')
+    group.add_argument('--ydim', '-y', default=None, help='Vertical plot axis')
+    group.add_argument('--bounds', type=float, nargs=2, default=None, metavar=('MIN', 'MAX'), help='Colour bar bounds (default range of the first frame)')
+    group.add_argument('--output', '-o', default='{variable}_{index:05d}.png',
+            help='Output file, either a .png pattern formatted with {variable} and {index}, or a .gif/.mp4 animation')
+    group.add_argument('--fps', type=float, default=10, help='Animation frame rate')
+    group.add_argument('--dpi', type=float, default=100, help='Output resolution')
+    group.add_argument('--size', type=float, nargs=2, default=(12, 8), metavar=('WIDTH', 'HEIGHT'), help='Figure size in inches')
+    group.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of render processes')
+    group.add_argument('--worker-memory', type=dask.utils.parse_bytes, default=None,
+            help='Memory limit per render process, e.g. 2GB')
+    group.add_argument('--worker-frames', type=int, default=50,
+            help='Frames rendered by each process before it is replaced, to stop memory creeping up')
+    return parser
+
+
+def render_frame(dataset, varname, x, y, indices, bounds, filename, figsize=(12, 8), dpi=100):
+    """
+    Render a single frame to a file
+
+    Args:
+        dataset: xarray.Dataset
+        varname: Name of the variable to plot
+        x, y: Plotting axes
+        indices: Mapping of passive dimension to index
+        bounds: Colour bar bounds
+        filename: Output file
+        figsize: Figure size in inches
+        dpi: Output resolution
+    """
+    variable = dataset[varname]
+
+    figure = Figure(figsize=figsize, tight_layout=True)
+    FigureCanvasAgg(figure)
+
+    if is_geographic(variable, x, y):
+        axis = figure.add_subplot(projection=geographic_projection())
+    else:
+        axis = figure.add_subplot()
+
+    v = select_slice(variable, x, y, indices)
+    plot = plot_slice(axis, dataset, v, x, y, **color_args(bounds))
+    figure.colorbar(plot, ax=axis)
+
+    title = ', '.join(f'{d} = {v[d].values}' for d in passive_dims(variable, x, y) if d in v.coords)
+    axis.set_title(f'{varname} {title}'.strip())
+
+    figure.savefig(filename, dpi=dpi)
+    return filename
+
+
+# Dataset for the current worker process, set once by _init_worker so it
+# doesn't need to be sent with every frame
+_worker_dataset = None
+
+
+def _init_worker(dataset, memory_limit):
+    global _worker_dataset
+
+    if memory_limit is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    # Parallelism comes from the process pool, don't start threads as well
+    dask.config.set(scheduler='synchronous')
+
+    _worker_dataset = dataset
+
+
+def _render_worker(args):
+    return render_frame(_worker_dataset, *args)
+
+
+def bounds_sample(variable):
+    """
+    The part of a variable colour bar bounds are taken from, its first time
+    """
+    if 'time' in variable.dims:
+        return variable.isel(time=0)
+    return variable
+
+
+def sample_bounds(variable, compute=None):
+    """
+    Colour bar bounds from the first time of a variable
+
+    Args:
+        variable: xarray.DataArray
+        compute: Function computing a dask array (default dask's compute)
+    """
+    sample = bounds_sample(variable)
+    bounds = dask.array.stack([sample.min(), sample.max()])
+    if compute is None:
+        return bounds.compute()
+    return compute(bounds)
+
+
+def render_frames(dataset, varname, dim, index_range, filename_pattern, x=None, y=None,
+        bounds=None, figsize=(12, 8), dpi=100, workers=None, worker_memory=None, worker_frames=50):
+    """
+    Render frames along a dimension in parallel
+
+    Args:
+        dataset: xarray.Dataset
+        varname: Name of the variable to plot
+        dim: Dimension to step through, None if the variable only has the
+            plotting axes
+        index_range: Indices along dim to render, a single index if dim is
+            None
+        filename_pattern: Output file pattern, formatted with variable and index
+        x, y: Plotting axes (default from :func:`default_axes`)
+        bounds: Colour bar bounds (default from :func:`sample_bounds`)
+        workers: Number of processes (default number of CPUs)
+        worker_memory: Address space limit of each process in bytes
+        worker_frames: Frames per process before it gets replaced
+
+    Returns:
+        list of rendered filenames
+    """
+    variable = dataset[varname]
+
+    if x is None or y is None:
+        default_x, default_y = default_axes(variable)
+        x = x or default_x
+        y = y or default_y
+
+    if bounds is None:
+        bounds = sample_bounds(variable)
+
+    tasks = [(varname, x, y, {dim: i} if dim is not None else {}, bounds,
+              filename_pattern.format(variable=varname, index=i), figsize, dpi)
+             for i in index_range]
+
+    # Spawn rather than fork so workers don't inherit QT or dask thread state
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker,
+            initargs=(dataset, worker_memory), maxtasksperchild=worker_frames) as pool:
+        return list(pool.imap(_render_worker, tasks))
+
+
+def write_animation(frames, output, fps=10, dpi=100):
+    """
+    Assemble rendered frames into an animation using a matplotlib writer
+
+    Args:
+        frames: list of image filenames
+        output: Output file, the writer is chosen by extension
+        fps: Frame rate
+        dpi: Resolution the frames were rendered at
+    """
+    writer_name = animation_writers[os.path.splitext(output)[1].lower()]
+    writer = matplotlib.animation.writers[writer_name](fps=fps)
+
+    first = matplotlib.image.imread(frames[0])
+    height, width = first.shape[:2]
+
+    figure = Figure(figsize=(width/dpi, height/dpi), dpi=dpi)
+    FigureCanvasAgg(figure)
+    image = figure.figimage(first)
+
+    with writer.saving(figure, output, dpi):
+        for f in frames:
+            image.set_data(matplotlib.image.imread(f))
+            writer.grab_frame()
+
+
+def render(dataset, args):
+    """
+    Run the render subcommand
+
+    Args:
+        dataset: xarray.Dataset from the preprocessor
+        args: argparse.Namespace with the options from :func:`add_arguments`
+    """
+    variable = dataset[args.variable]
+
+    x, y = args.xdim, args.ydim
+    if x is None or y is None:
+        default_x, default_y = default_axes(variable)
+        x = x or default_x
+        y = y or default_y
+
+    dim = args.dim
+    if dim is None:
+        passive = passive_dims(variable, x, y)
+        dim = passive[0] if len(passive) > 0 else None
+
+    if dim is None:
+        # Nothing to step through, just render the one frame
+        index_range = range(1)
+    else:
+        stop = args.stop
+        if stop is None:
+            stop = variable.sizes[dim]
+        index_range = range(args.start, stop, args.step)
+        if len(index_range) == 0:
+            raise SystemExit(f'No frames to render: --start {args.start}, --stop {stop} '
+                    f'and --step {args.step} select no indices of "{dim}"')
+
+    animation = os.path.splitext(args.output)[1].lower() in animation_writers
+
+    start_time = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pattern = args.output
+        if animation:
+            pattern = os.path.join(tmpdir, '{index:08d}.png')
+
+        frames = render_frames(dataset, args.variable, dim, index_range, pattern,
+                x=x, y=y, bounds=args.bounds, figsize=args.size, dpi=args.dpi,
+                workers=args.workers, worker_memory=args.worker_memory,
+                worker_frames=args.worker_frames)
+
+        if animation:
+            write_animation(frames, args.output, fps=args.fps, dpi=args.dpi)
+
+    elapsed = time.perf_counter() - start_time
+    print(f'Rendered {len(frames)} frames in {elapsed:.1f}s ({len(frames)/elapsed:.2f} frames/s)')
+
+    return frames
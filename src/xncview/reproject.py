@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Drawing grids in other map projections
+
+Transforming every cell of a grid to a new projection each frame is slow, so
+instead each pixel of a raster in the target projection is traced back to
+the grid once, giving a sparse matrix of interpolation weights from grid
+cells to pixels. The matrix only depends on the grid, projection and view
+size, so it is cached, and each frame is a single sparse matrix-vector
+product.
+
+The matrix has the same number of cells in every row, so it is stored as
+dense (pixels, neighbours) arrays of cell indices and weights, and the
+product is a gather and a weighted sum.
+"""
+
+import numpy
+import cartopy.crs
+
+from .lookup import point_weights
+from .raster import grid_centres
+
+
+class ReprojectionWeights:
+    """
+    Weights from the cells of a grid to the pixels of a raster in a map
+    projection
+
+    Has the same interface as :class:`xncview.raster.PixelMapping`, so it can
+    be drawn with :func:`xncview.raster.plot_raster`
+    """
+
+    def __init__(self, dataset, x, y, projection, extent, shape, method='bilinear', index=None):
+        """
+        Args:
+            dataset: xarray.Dataset containing the coordinates
+            x, y: Longitude and latitude plotting axes
+            projection: cartopy projection of the raster
+            extent: (x0, x1, y0, y1) of the raster in projection coordinates
+            shape: (height, width) of the raster in pixels
+            method: Interpolation method, see :data:`xncview.lookup.methods`
+            index: Grid index from :func:`xncview.lookup.build_index`, for
+                curvilinear grids
+        """
+        self.extent = tuple(float(e) for e in extent)
+        self.shape = tuple(int(s) for s in shape)
+
+        x0, x1, y0, y1 = self.extent
+        height, width = self.shape
+
+        # Pixel centres, traced back to longitude and latitude
+        px = x0 + (numpy.arange(width) + 0.5) * (x1 - x0) / width
+        py = y0 + (numpy.arange(height) + 0.5) * (y1 - y0) / height
+        px, py = numpy.meshgrid(px, py)
+        points = cartopy.crs.PlateCarree().transform_points(projection, px.ravel(), py.ravel())
+
+        method, dims, grid_shape, cells, weights, valid = point_weights(
+                dataset, x, y, points[:, 0], points[:, 1], method, index)
+
+        #: Interpolation method used
+        self.method = method
+
+        #: Dimensions of the grid, in the order values are flattened
+        self.dims = tuple(dims)
+
+        #: Number of cells in the grid
+        self.size = int(numpy.prod(grid_shape))
+
+        #: Pixels that are on the grid
+        self.pixels = numpy.flatnonzero(valid)
+
+        #: Flattened grid cells and weights of each pixel in :attr:`pixels`,
+        #: the rows of the sparse matrix
+        self.cells = numpy.ravel_multi_index([c[valid] for c in cells], grid_shape)
+        self.weights = weights[valid]
+
+    @property
+    def nbytes(self):
+        return self.pixels.nbytes + self.cells.nbytes + self.weights.nbytes
+
+    def rasterise(self, values, how=None):
+        """
+        Interpolate cell values onto the raster
+
+        Missing values are left out of the interpolation
+
+        Args:
+            values: Cell values, with dimensions in the order of :attr:`dims`
+            how: Unused, for compatibility with
+                :meth:`xncview.raster.PixelMapping.rasterise`
+
+        Returns:
+            numpy.ndarray of shape :attr:`shape`, NaN off the grid
+        """
+        values = numpy.ma.filled(numpy.ma.asarray(values, dtype='f8'), numpy.nan).ravel()
+        if values.size != self.size:
+            raise ValueError(f'Expected {self.size} values, got {values.size}')
+
+        raster = numpy.full(self.shape[0] * self.shape[1], numpy.nan)
+
+        data = values[self.cells]
+        if data.shape[1] == 1:
+            raster[self.pixels] = data[:, 0]
+        else:
+            finite = numpy.isfinite(data)
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                total = numpy.where(finite, self.weights, 0).sum(axis=-1)
+                result = numpy.where(finite, data * self.weights, 0).sum(axis=-1) / total
+            raster[self.pixels] = numpy.where(total > 0, result, numpy.nan)
+
+        return raster.reshape(self.shape)
+
+
+def grid_extent(dataset, x, y, projection, view=None):
+    """
+    Extent of a grid in a map projection
+
+    Args:
+        dataset: xarray.Dataset containing the coordinates
+        x, y: Longitude and latitude plotting axes
+        projection: cartopy projection
+        view: Optional (x0, x1, y0, y1) to limit the extent to
+
+    Returns:
+        (x0, x1, y0, y1) in projection coordinates
+    """
+    lon, lat, _ = grid_centres(dataset, x, y)
+    points = projection.transform_points(cartopy.crs.PlateCarree(),
+            numpy.asarray(lon, dtype='f8'), numpy.asarray(lat, dtype='f8'))
+    px, py = points[:, 0], points[:, 1]
+
+    finite = numpy.isfinite(px) & numpy.isfinite(py)
+    if not finite.any():
+        raise ValueError('The grid is not visible in the projection')
+    extent = [px[finite].min(), px[finite].max(), py[finite].min(), py[finite].max()]
+
+    limits = list(projection.x_limits) + list(projection.y_limits)
+    if view is not None:
+        limits = view
+    return (max(extent[0], limits[0]), min(extent[1], limits[1]),
+            max(extent[2], limits[2]), min(extent[3], limits[3]))
+
+
+def fit_shape(extent, shape):
+    """
+    Largest raster shape within shape with the aspect ratio of extent
+    """
+    x0, x1, y0, y1 = extent
+    height, width = shape
+    aspect = (x1 - x0) / max(y1 - y0, 1e-300)
+    if width / height > aspect:
+        width = height * aspect
+    else:
+        height = width / aspect
+    return max(int(height), 1), max(int(width), 1)
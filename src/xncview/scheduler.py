@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Selection of the dask scheduler used for heavy computations
+
+Schedulers are given as a string:
+
+    threads[:N]     Threads in the viewer process (default)
+    processes[:N]   A local process pool
+    local[:N]       A dask.distributed LocalCluster with N worker processes
+    ADDRESS         An existing dask.distributed scheduler, e.g. tcp://host:8786
+
+Heavy computations, like the colour bounds of a whole variable, are sent to
+the selected scheduler. Reads of the single slice being displayed always
+stay in the viewer process, as shipping them to a cluster costs more than
+it saves.
+"""
+
+import dask
+
+
+#: Schedulers that run on the local machine through dask.compute
+local_schedulers = ['threads', 'processes']
+
+
+class Scheduler:
+    """
+    A dask scheduler for heavy computations
+    """
+
+    def __init__(self, spec='threads'):
+        """
+        Args:
+            spec: Scheduler description, see the module documentation
+        """
+        #: Original description
+        self.spec = spec
+
+        #: Number of workers, None for the dask default
+        self.workers = None
+
+        #: dask.distributed client, if using a cluster
+        self.client = None
+
+        self._cluster = None
+
+        if '://' in spec:
+            self.kind = 'distributed'
+            self.address = spec
+        else:
+            self.kind, _, workers = spec.partition(':')
+            if workers != '':
+                self.workers = int(workers)
+
+        if self.kind == 'local':
+            from dask.distributed import LocalCluster
+            self._cluster = LocalCluster(n_workers=self.workers, dashboard_address=None)
+            self.address = self._cluster.scheduler_address
+        elif self.kind not in local_schedulers + ['distributed']:
+            raise ValueError(f'Unknown scheduler "{spec}"')
+
+        if self._cluster is not None or self.kind == 'distributed':
+            from dask.distributed import Client
+            self.client = Client(self.address, set_as_default=False)
+
+    @property
+    def in_process(self):
+        """
+        Does the scheduler use memory in the viewer process?
+        """
+        return self.kind == 'threads'
+
+    def compute(self, obj, num_workers=None):
+        """
+        Compute a dask collection on this scheduler
+
+        Args:
+            obj: Dask collection
+            num_workers: Limit on local workers, e.g. from the memory budget
+
+        Returns:
+            The computed object
+        """
+        if self.client is not None:
+            return self.client.gather(self.client.compute(obj))
+
+        workers = self.workers
+        if num_workers is not None:
+            workers = num_workers if workers is None else min(workers, num_workers)
+
+        kwargs = {'scheduler': self.kind}
+        if workers is not None:
+            kwargs['num_workers'] = workers
+        return dask.compute(obj, **kwargs)[0]
+
+    def close(self):
+        """
+        Shut down any client and cluster that were started
+        """
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        if self._cluster is not None:
+            self._cluster.close()
+            self._cluster = None
+
+    def __repr__(self):
+        return f'Scheduler({self.spec!r})'
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Grid cells crossing the edge of a map
+
+cartopy splits cells that wrap around the edge of the map every time a grid
+is plotted. Instead the cell edges are transformed and checked for wrapping
+cells once per grid and projection, giving a :class:`SeamGrid` that is
+cached:
+
+ * Grids with 1D longitudes on cylindrical projections are rolled so the
+   longitudes increase across the map, with any cell on the seam split in
+   two
+ * Other grids have the wrapping cells masked out of the mesh, and drawn as
+   polygons on both sides of the map instead
+
+Each frame then only reorders the values before setting the colours.
+"""
+
+import numpy
+import dask.base
+import matplotlib.collections
+import cartopy.crs
+
+from . import memory
+
+
+#: Grids prepared for a projection, by (edge token, projection)
+grids = memory.BudgetCache(memory.budget, priority=2)
+
+#: Projections where x only depends on longitude and y on latitude
+cylindrical = (cartopy.crs.PlateCarree, cartopy.crs.Mercator)
+
+
+def _centre_longitude(projection):
+    """
+    Longitude at the centre of the map
+    """
+    lon, _ = cartopy.crs.PlateCarree().transform_point(
+            sum(projection.x_limits) / 2, sum(projection.y_limits) / 2, projection)
+    return lon
+
+
+def wraps(projection):
+    """
+    Does the projection wrap around in longitude at the left and right edges
+    of the map?
+    """
+    lon0 = _centre_longitude(projection)
+    x = projection.transform_points(cartopy.crs.PlateCarree(),
+            numpy.array([lon0 - 179.999, lon0 + 179.999]), numpy.zeros(2))[:, 0]
+    return x[1] - x[0] > 0.99 * (projection.x_limits[1] - projection.x_limits[0])
+
+
+class SeamGrid:
+    """
+    Cell edges of a grid in a map projection, with the cells crossing the
+    edge of the map already dealt with
+    """
+
+    def __init__(self, lon, lat, dims, projection):
+        """
+        Args:
+            lon, lat: Cell edges, both 1D or both 2D as from
+                :func:`xncview.plot._get_bounds`
+            dims: Dimensions of the values as (rows, columns) of the mesh
+            projection: cartopy projection of the map
+
+        Raises:
+            ValueError if the grid overlaps itself
+        """
+        self.dims = tuple(dims)
+        self.projection = projection
+
+        #: Mesh corners in projection coordinates, (rows + 1, columns + 1, 2)
+        self.coordinates = None
+
+        #: Value column of each mesh column, -1 for gaps
+        self.columns = None
+
+        #: Mask of mesh cells that aren't drawn by the mesh, broadcast
+        #: against the mesh values
+        self.hidden = None
+
+        #: Polygons of the wrapped cells on both sides of the map
+        self.polygons = None
+
+        #: Flattened value index of each polygon
+        self.polygon_cells = None
+
+        lon = numpy.asarray(lon, dtype='f8')
+        lat = numpy.asarray(lat, dtype='f8')
+
+        if lon.ndim == 1 and isinstance(projection, cylindrical):
+            self._roll(lon, lat)
+        else:
+            if lon.ndim == 1:
+                lon, lat = numpy.meshgrid(lon, lat)
+            self._split(lon, lat)
+
+    @property
+    def nbytes(self):
+        arrays = [self.coordinates, self.columns, self.hidden, self.polygons, self.polygon_cells]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def _roll(self, lon, lat):
+        """
+        Roll 1D longitudes to increase across the map, splitting the cell on
+        the seam
+        """
+        xmin, xmax = self.projection.x_limits
+        period = xmax - xmin
+        eps = period * 1e-9
+
+        order = numpy.arange(lon.size - 1)
+        if lon[-1] < lon[0]:
+            lon = lon[::-1]
+            order = order[::-1]
+
+        px = self.projection.transform_points(cartopy.crs.PlateCarree(), lon, numpy.zeros(lon.size))[:, 0]
+        if wraps(self.projection):
+            # Continuous x, starting on the map
+            step = (numpy.diff(px) + period / 2) % period - period / 2
+            px = px[0] + numpy.concatenate([[0], numpy.cumsum(step)])
+            px = px - period * numpy.floor((px[0] - xmin) / period)
+
+        left = px[:-1]
+        right = px[1:]
+        inside = right <= xmax + eps
+        beyond = left >= xmax - eps
+        seam = ~inside & ~beyond
+
+        # Cells past the right edge move to the left, the cell on the seam
+        # goes on both sides
+        left = numpy.concatenate([left[inside], left[beyond] - period, left[seam],
+            numpy.full(seam.sum(), xmin)])
+        right = numpy.concatenate([right[inside], right[beyond] - period,
+            numpy.full(seam.sum(), xmax), right[seam] - period])
+        columns = numpy.concatenate([order[inside], order[beyond], order[seam], order[seam]])
+
+        s = numpy.argsort(left, kind='stable')
+        left, right, columns = left[s], right[s], columns[s]
+
+        if (left[1:] < right[:-1] - eps).any():
+            raise ValueError('Grid longitudes overlap')
+
+        # Fill gaps between regional grids' cells with empty columns
+        gap = numpy.flatnonzero(left[1:] > right[:-1] + eps)
+        left = numpy.insert(left, gap + 1, right[gap])
+        columns = numpy.insert(columns, gap + 1, -1)
+        x = numpy.append(left, right[-1])
+
+        py = self.projection.transform_points(cartopy.crs.PlateCarree(),
+                numpy.zeros(lat.size), lat)[:, 1]
+        y = numpy.clip(numpy.nan_to_num(py), *self.projection.y_limits)
+
+        X, Y = numpy.meshgrid(x, y)
+        self.coordinates = numpy.stack([X, Y], axis=-1)
+        self.columns = columns
+        self.hidden = columns < 0
+
+    def _split(self, lon, lat):
+        """
+        Hide cells of a 2D mesh that wrap around the map, drawing them as
+        polygons instead
+        """
+        points = self.projection.transform_points(cartopy.crs.PlateCarree(), lon.ravel(), lat.ravel())
+        px = points[:, 0].reshape(lon.shape)
+        py = points[:, 1].reshape(lon.shape)
+
+        def corners(a):
+            return numpy.stack([a[:-1, :-1], a[:-1, 1:], a[1:, 1:], a[1:, :-1]], axis=-1)
+
+        invalid = ~(numpy.isfinite(corners(px)) & numpy.isfinite(corners(py))).all(axis=-1)
+
+        wrapped = numpy.zeros(invalid.shape, dtype=bool)
+        if wraps(self.projection):
+            # Longitudes relative to the centre of the map, joined up within
+            # each cell, a cell wraps if it goes past the seam. Checking in
+            # longitude rather than x keeps cells at the poles, where every
+            # longitude meets, from looking like they wrap.
+            lon0 = _centre_longitude(self.projection)
+            rel = corners((lon - lon0 + 180) % 360 - 180)
+            rel = rel[..., :1] + (rel - rel[..., :1] + 180) % 360 - 180
+
+            eps = 1e-9
+            with numpy.errstate(invalid='ignore'):
+                lo = rel.min(axis=-1)
+                hi = rel.max(axis=-1)
+                on_map = ((lo >= -180 - eps) & (hi <= 180 + eps)) | (hi + 360 <= 180 + eps)
+            wrapped = ~on_map & ~invalid
+
+            # Corners of wrapped cells are joined up on one side, copy them
+            # to the other side
+            wr = rel[wrapped]
+            wlat = corners(lat)[wrapped]
+            shift = numpy.where(wr.mean(axis=-1) > 0, -360, 360)[:, numpy.newaxis]
+
+            self.polygons = numpy.concatenate([self._unwrapped(wr, wlat, lon0),
+                self._unwrapped(wr + shift, wlat, lon0)])
+            self.polygon_cells = numpy.tile(numpy.flatnonzero(wrapped), 2)
+
+        finite = numpy.isfinite(px) & numpy.isfinite(py)
+        self.coordinates = numpy.stack([numpy.where(finite, px, 0), numpy.where(finite, py, 0)], axis=-1)
+        self.hidden = invalid | wrapped
+
+    def _unwrapped(self, rel, lat, lon0):
+        """
+        Project points with longitudes relative to the centre of the map that
+        may be past the seam, as polygon vertices hanging off the map
+
+        Wrapping projections have x proportional to relative longitude at a
+        fixed latitude, so x is scaled up from a point 90 degrees east
+        """
+        points = self.projection.transform_points(cartopy.crs.PlateCarree(),
+                numpy.full(lat.size, lon0 + 90.0), lat.ravel())
+        x = points[:, 0].reshape(lat.shape) * rel / 90
+        y = points[:, 1].reshape(lat.shape)
+        return numpy.stack([x, y], axis=-1)
+
+    def mesh_values(self, values):
+        """
+        Values for the mesh, from values with dimensions :attr:`dims`
+        """
+        values = numpy.ma.masked_invalid(values)
+        if self.columns is not None:
+            values = values[:, numpy.maximum(self.columns, 0)]
+        return numpy.ma.array(values, mask=numpy.ma.getmaskarray(values) | self.hidden)
+
+    def polygon_values(self, values):
+        """
+        Values for the wrapped polygons, from values with dimensions
+        :attr:`dims`
+        """
+        return numpy.ma.masked_invalid(values).ravel()[self.polygon_cells]
+
+
+def seam_grid(lon, lat, dims, projection, token=None):
+    """
+    The cached :class:`SeamGrid` of cell edges in a projection
+
+    Args:
+        lon, lat: Cell edges, both 1D or both 2D
+        dims: Dimensions of the values as (rows, columns) of the mesh
+        projection: cartopy projection of the map
+        token: Identifier of the edges, e.g. from
+            :func:`xncview.memory.variables_token`, otherwise they are hashed
+    """
+    if token is None:
+        token = dask.base.tokenize(numpy.asarray(lon), numpy.asarray(lat))
+    key = (token, tuple(dims), projection)
+    grid = grids.get(key)
+    if grid is None:
+        grid = SeamGrid(lon, lat, dims, projection)
+        grids.put(key, grid)
+    return grid
+
+
+class SeamMesh(matplotlib.collections.QuadMesh):
+    """
+    QuadMesh of a :class:`SeamGrid`, with its wrapped cells drawn by
+    :attr:`wrapped`
+
+    :meth:`set_array` takes values in the order of the slice that was
+    plotted, and updates both collections.
+    """
+
+    def __init__(self, grid, v, **kwargs):
+        """
+        Args:
+            grid: :class:`SeamGrid`
+            v: xarray.DataArray with dimensions :attr:`SeamGrid.dims`, in any
+                order
+            **kwargs: Colour arguments, as for pcolormesh
+        """
+        vmin = kwargs.pop('vmin', None)
+        vmax = kwargs.pop('vmax', None)
+        kwargs.setdefault('edgecolors', 'none')
+        kwargs.setdefault('antialiased', False)
+
+        super().__init__(grid.coordinates, **kwargs)
+
+        self.grid = grid
+        self._order = [v.dims.index(d) for d in grid.dims]
+
+        #: Collection drawing the wrapped cells, if there are any
+        self.wrapped = None
+        if grid.polygons is not None and len(grid.polygons) > 0:
+            self.wrapped = matplotlib.collections.PolyCollection(grid.polygons, norm=self.norm,
+                    cmap=self.get_cmap(), edgecolors='face', linewidths=0, antialiaseds=False)
+
+        self.set_array(v.values)
+        self.set_clim(vmin, vmax)
+
+    def set_array(self, A):
+        if getattr(self, 'grid', None) is None:
+            return super().set_array(A)
+
+        A = numpy.ma.transpose(numpy.ma.asarray(A), self._order)
+        super().set_array(self.grid.mesh_values(A))
+        if self.wrapped is not None:
+            self.wrapped.set_array(self.grid.polygon_values(A))
+
+
+def plot_seam_grid(axis, grid, v, **kwargs):
+    """
+    Plot a slice on a map through a :class:`SeamGrid`
+
+    Returns:
+        The :class:`SeamMesh` artist
+    """
+    mesh = SeamMesh(grid, v, **kwargs)
+    axis.add_collection(mesh)
+    if mesh.wrapped is not None:
+        # Wrapped cells hang off the edges of the map, don't include them in
+        # the limits
+        axis.add_collection(mesh.wrapped, autolim=False)
+    axis.autoscale_view()
+    return mesh
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cross-sections along a path drawn on the map
+
+The interpolation weights of a path are worked out once, as arrays of grid
+indices and weights for every sample point along the path. Sectioning a
+variable is then a single pointwise read of the grid points the path
+touches, so only the chunks the path crosses are loaded, followed by a
+weighted sum.
+"""
+
+import time
+
+import numpy
+import xarray
+from matplotlib.backends.qt_compat import QtWidgets as QW
+from matplotlib.backends.backend_qt5agg import FigureCanvas
+from matplotlib.figure import Figure
+
+from .interpret_cf import is_degrees, lon_units
+from .lookup import methods, point_weights
+
+#: Earth radius in km, for distances along geographic paths
+earth_radius = 6371.0
+
+
+def path_samples(vertices, samples=200, geographic=False):
+    """
+    Points evenly spaced along a path
+
+    Args:
+        vertices: Sequence of (x, y) path vertices
+        samples: Number of points
+        geographic: Are the vertices longitude and latitude? If so distances
+            are great circle distances in km
+
+    Returns:
+        (x, y, distance along the path) arrays
+    """
+    vertices = numpy.asarray(vertices, dtype='f8')
+    if vertices.ndim != 2 or vertices.shape[0] < 2:
+        raise ValueError('A path needs at least two vertices')
+
+    length = numpy.hypot(*numpy.diff(vertices, axis=0).T)
+    along = numpy.concatenate([[0], numpy.cumsum(length)])
+
+    t = numpy.linspace(0, along[-1], samples)
+    px = numpy.interp(t, along, vertices[:, 0])
+    py = numpy.interp(t, along, vertices[:, 1])
+
+    if not geographic:
+        return px, py, t
+
+    lon = numpy.radians(px)
+    lat = numpy.radians(py)
+    a = (numpy.sin(numpy.diff(lat) / 2)**2
+         + numpy.cos(lat[1:]) * numpy.cos(lat[:-1]) * numpy.sin(numpy.diff(lon) / 2)**2)
+    step = 2 * earth_radius * numpy.arcsin(numpy.sqrt(numpy.clip(a, 0, 1)))
+    return px, py, numpy.concatenate([[0], numpy.cumsum(step)])
+
+
+class SectionWeights:
+    """
+    Interpolation weights for sampling a grid along a path
+
+    Bilinear interpolation is available for grids with 1D coordinates,
+    curvilinear grids always use the nearest cell.
+    """
+
+    def __init__(self, dataset, x, y, vertices, method='bilinear', samples=200, index=None):
+        """
+        Args:
+            dataset: xarray.Dataset containing the coordinates
+            x, y: Plotting axes the vertices are in
+            vertices: Sequence of (x, y) path vertices
+            method: One of :data:`methods`
+            samples: Number of points along the path
+            index: Grid index from :func:`xncview.lookup.build_index`, for
+                curvilinear grids
+        """
+        geographic = is_degrees(dataset[x], 'longitude', lon_units)
+
+        px, py, self.distance = path_samples(vertices, samples, geographic)
+
+        #: Units of :attr:`distance`, the coordinate units if the axes aren't
+        #: in degrees
+        self.units = 'km' if geographic else dataset[x].attrs.get('units', '')
+
+        method, grid_dims, shape, cells, weights, valid = point_weights(
+                dataset, x, y, px, py, method, index)
+
+        if not valid.any():
+            raise ValueError('The path does not cross the grid')
+
+        #: Interpolation method used
+        self.method = method
+
+        #: Grid dimensions that are sampled
+        self.grid_dims = grid_dims
+
+        #: Is each sample point on the grid
+        self.valid = valid
+
+        #: Weights of the grid points around each sample, shape (samples, k)
+        self.weights = numpy.where(valid[:, None], weights, 0)
+
+        # Only read each grid point once
+        flat = numpy.ravel_multi_index(cells, shape)
+        unique, self.inverse = numpy.unique(numpy.where(valid[:, None], flat, flat[valid][0, 0]),
+                return_inverse=True)
+        self.inverse = self.inverse.reshape(flat.shape)
+
+        #: Grid points to read, by dimension
+        self.points = dict(zip(grid_dims, numpy.unravel_index(unique, shape)))
+
+    @property
+    def nbytes(self):
+        return (self.distance.nbytes + self.valid.nbytes + self.weights.nbytes + self.inverse.nbytes
+                + sum(p.nbytes for p in self.points.values()))
+
+    def select(self, variable):
+        """
+        Lazy pointwise selection of the grid points along the path
+
+        Returns:
+            xarray.DataArray with the grid dimensions replaced by 'point'
+        """
+        return variable.isel({d: xarray.DataArray(p, dims='point') for d, p in self.points.items()})
+
+    def apply(self, variable, compute=None):
+        """
+        Sample a variable along the path
+
+        Args:
+            variable: xarray.DataArray containing the grid dimensions
+            compute: Function computing an xarray.DataArray
+
+        Returns:
+            xarray.DataArray with the grid dimensions replaced by 'distance'
+        """
+        if compute is None:
+            compute = lambda v: v.compute()
+
+        values = compute(self.select(variable))
+        values = values.transpose(..., 'point')
+        others = values.dims[:-1]
+
+        data = numpy.asarray(values.values, dtype='f8')[..., self.inverse]
+        finite = numpy.isfinite(data)
+
+        # Missing values, e.g. land, are left out of the interpolation
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            total = numpy.where(finite, self.weights, 0).sum(axis=-1)
+            result = numpy.where(finite, data * self.weights, 0).sum(axis=-1) / total
+        result = numpy.where(self.valid & (total > 0), result, numpy.nan)
+
+        coords = {d: variable.coords[d] for d in others if d in variable.coords}
+        coords['distance'] = xarray.DataArray(self.distance, dims='distance',
+                attrs={'units': self.units})
+        return xarray.DataArray(result, dims=others + ('distance',), coords=coords,
+                name=variable.name, attrs=variable.attrs)
+
+
+class SectionWidget(QW.QGroupBox):
+    """
+    Plot of a variable along a path, against a vertical dimension if there
+    is one
+    """
+
+    def __init__(self, compute):
+        """
+        Args:
+            compute: Function computing an xarray.DataArray within the memory
+                budget
+        """
+        super().__init__('Section')
+
+        self._compute = compute
+
+        main_layout = QW.QVBoxLayout(self)
+
+        figure = Figure(tight_layout=True)
+        figure.set_frameon(False)
+        self.canvas = FigureCanvas(figure)
+        self.canvas.setStyleSheet("background-color:transparent;")
+        self.canvas.setMinimumHeight(200)
+        self.axis = self.canvas.figure.subplots()
+
+        controls = QW.QHBoxLayout()
+        self.method = QW.QComboBox()
+        self.method.addItems(methods)
+        self.info = QW.QLabel()
+        controls.addWidget(QW.QLabel('Interpolation'))
+        controls.addWidget(self.method)
+        controls.addWidget(self.info)
+        controls.addStretch()
+
+        main_layout.addWidget(self.canvas)
+        main_layout.addLayout(controls)
+
+        #: Path vertices, in plotting axis coordinates
+        self.vertices = []
+
+        #: Weights for the current path
+        self.weights = None
+
+        self._grid = None
+
+        self.method.currentIndexChanged.connect(self._change_method)
+
+    def setPath(self, dataset, x, y, vertices, index=None):
+        """
+        Set the path to section along, computing its weights
+
+        Args:
+            dataset: xarray.Dataset containing the coordinates
+            x, y: Plotting axes the vertices are in
+            vertices: Sequence of (x, y) path vertices
+            index: Grid index for curvilinear grids
+        """
+        self.vertices = list(vertices)
+        self._grid = (dataset, x, y, index)
+        self._rebuild()
+
+    def _rebuild(self):
+        if self._grid is None:
+            return
+        dataset, x, y, index = self._grid
+        self.weights = SectionWeights(dataset, x, y, self.vertices,
+                method=self.method.currentText(), index=index)
+
+    def _change_method(self):
+        try:
+            self._rebuild()
+        except ValueError as e:
+            print(e)
+            self.weights = None
+            self.axis.clear()
+            self.canvas.draw()
+            self.info.setText(f'No section: {e}')
+
+    def clearPath(self):
+        """
+        Remove the path
+        """
+        self.vertices = []
+        self.weights = None
+        self._grid = None
+        self.setVisible(False)
+
+    def redraw(self, variable, indices, vertical=None):
+        """
+        Plot the section of a variable
+
+        Args:
+            variable: xarray.DataArray
+            indices: Mapping of passive dimension to index, the vertical
+                dimension is ignored
+            vertical: Dimension to plot against distance, None for a line plot
+        """
+        if self.weights is None:
+            return
+
+        start = time.perf_counter()
+        section = self.weights.apply(
+                variable.isel({d: i for d, i in indices.items() if d != vertical}),
+                self._compute)
+        elapsed = time.perf_counter() - start
+
+        self.axis.clear()
+        distance = section['distance']
+        if vertical is None:
+            self.axis.plot(distance, section.values)
+        else:
+            section = section.transpose(vertical, 'distance')
+            levels = section[vertical] if vertical in section.coords else numpy.arange(section.shape[0])
+            self.axis.pcolormesh(distance, levels, numpy.ma.masked_invalid(section.values),
+                    shading='nearest')
+            self.axis.set_ylabel(vertical)
+            if vertical in section.coords and section[vertical].attrs.get('positive') == 'down':
+                self.axis.invert_yaxis()
+        self.axis.set_xlabel(f'distance ({self.weights.units})' if self.weights.units else 'distance')
+        self.axis.set_title(variable.name, fontsize='small')
+        self.canvas.draw()
+
+        self.info.setText(f'{len(next(iter(self.weights.points.values())))} grid points read in {elapsed*1000:.1f} ms')
@@ -0,0 +1,560 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+HTTP tile server, for browsing a dataset without a display
+
+    xncview serve --port 8000 input.nc
+
+Tiles are PNG images following the slippy map convention, at
+
+    /tiles/{variable}/{z}/{x}/{y}.png?time=3&depth=0
+
+with passive dimensions selected by index in the query string. Geographic
+variables are tiled in web mercator, others over the extent of their
+plotting axes. ``/variables`` lists the variables and their passive
+dimensions as JSON.
+
+The server only listens on localhost, use an SSH tunnel to reach it from
+another machine.
+"""
+
+import io
+import os
+import json
+import tempfile
+import threading
+import collections
+import multiprocessing
+import urllib.parse
+import http.server
+
+import numpy
+import dask.utils
+import cartopy.crs
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from . import render
+from . import memory
+from .plot import (_get_bounds, _bounds_token, default_axes, passive_dims, is_geographic, color_args,
+        plot_slice)
+from .ugrid import mesh_of
+
+
+#: Address the server listens on
+host = '127.0.0.1'
+
+#: Projection of geographic tiles
+web_mercator = cartopy.crs.Mercator.GOOGLE
+
+#: Bounding boxes of the grid cells in tile coordinates, by (bounds token,
+#: x, y, geographic)
+cell_boxes = memory.BudgetCache(memory.budget, priority=2)
+
+
+def add_arguments(parser):
+    """
+    Add the serve options to an argument parser
+    """
+    group = parser.add_argument_group('serve')
+    group.add_argument('--port', type=int, default=8000, help='Port to listen on (localhost only)')
+    group.add_argument('--xdim', '-x', default=None, help='Horizontal plot axis')
+    group.add_argument('--ydim', '-y', default=None, help='Vertical plot axis')
+    group.add_argument('--tile-size', type=int, default=256, help='Tile width and height in pixels')
+    group.add_argument('--workers', type=int, default=os.cpu_count(),
+            help='Number of render processes, 0 to render in the server process')
+    group.add_argument('--worker-memory', type=dask.utils.parse_bytes, default=None,
+            help='Memory limit per render process, e.g. 2GB')
+    group.add_argument('--tile-cache', type=dask.utils.parse_bytes, default='256MB',
+            help='Memory for recently served tiles')
+    group.add_argument('--tile-dir', default=None,
+            help='Directory for the on-disk tile cache, only reuse it for the same dataset (default a temporary directory)')
+    return parser
+
+
+class TileRangeError(ValueError):
+    """
+    A tile outside the map, served as not found
+    """
+
+
+def tile_extent(z, tx, ty, extent):
+    """
+    Extent of a slippy map tile
+
+    Args:
+        z, tx, ty: Tile zoom and position, ty counts down from the top
+        extent: (x0, x1, y0, y1) covered by the zoom 0 tile
+
+    Returns:
+        (x0, x1, y0, y1) of the tile
+
+    Raises:
+        TileRangeError if the tile isn't on the map
+    """
+    if z < 0:
+        raise TileRangeError(f'Tile {z}/{tx}/{ty} is out of range')
+    n = 2**z
+    if not (0 <= tx < n and 0 <= ty < n):
+        raise TileRangeError(f'Tile {z}/{tx}/{ty} is out of range')
+
+    x0, x1, y0, y1 = extent
+    width = (x1 - x0) / n
+    height = (y1 - y0) / n
+    return (x0 + tx * width, x0 + (tx + 1) * width,
+            y1 - (ty + 1) * height, y1 - ty * height)
+
+
+def data_extent(dataset, x, y):
+    """
+    Zoom 0 tile extent of the plotting axes, web mercator if geographic
+    """
+    if is_geographic(dataset, x, y):
+        return web_mercator.x_limits + web_mercator.y_limits
+
+    xb = numpy.asarray(_get_bounds(dataset, x))
+    yb = numpy.asarray(_get_bounds(dataset, y))
+    return (float(numpy.nanmin(xb)), float(numpy.nanmax(xb)),
+            float(numpy.nanmin(yb)), float(numpy.nanmax(yb)))
+
+
+def _cell_boxes(dataset, x, y, geographic):
+    """
+    Bounding box of each cell in tile coordinates, worked out once per grid
+    rather than for every tile
+
+    Returns:
+        (grid dimensions, xmin, xmax, ymin, ymax) with each box array in the
+        order of the grid dimensions, None if the grid can't be subset
+    """
+    xc = dataset[x]
+    yc = dataset[y]
+    if mesh_of(dataset, x, y) is not None:
+        return None
+
+    key = (_bounds_token(dataset, x, y), x, y, geographic)
+    boxes = cell_boxes.get(key)
+    if boxes is not None:
+        return boxes
+
+    xb = numpy.asarray(_get_bounds(dataset, x), dtype='f8')
+    yb = numpy.asarray(_get_bounds(dataset, y), dtype='f8')
+    if xc.ndim == 1 and yc.ndim == 1 and xc.dims != yc.dims:
+        dims = (yc.dims[0], xc.dims[0])
+        X, Y = numpy.meshgrid(xb, yb)
+    elif xc.ndim == 2 and xc.dims == yc.dims:
+        dims = xc.dims
+        X, Y = xb, yb
+    else:
+        return None
+
+    if geographic:
+        points = web_mercator.transform_points(cartopy.crs.PlateCarree(), X, numpy.clip(Y, -85, 85))
+        X, Y = points[..., 0], points[..., 1]
+
+    # Bounding box of each cell from its corners
+    corners = lambda a: [a[:-1, :-1], a[:-1, 1:], a[1:, :-1], a[1:, 1:]]
+    with numpy.errstate(invalid='ignore'):
+        boxes = (dims, numpy.fmin.reduce(corners(X)), numpy.fmax.reduce(corners(X)),
+                 numpy.fmin.reduce(corners(Y)), numpy.fmax.reduce(corners(Y)))
+    cell_boxes.put(key, boxes)
+    return boxes
+
+
+def tile_cells(dataset, x, y, extent, geographic=False):
+    """
+    Index ranges of the grid with cells overlapping a tile, plus a cell either
+    side so inferred edges inside the tile are the same as for the full grid
+
+    Args:
+        dataset: xarray.Dataset containing the coordinates
+        x, y: Plotting axes
+        extent: (x0, x1, y0, y1) of the tile
+        geographic: Is the tile in web mercator, with x and y longitude and
+            latitude
+
+    Returns:
+        Mapping of grid dimension to slice, None if the grid can't be subset
+    """
+    boxes = _cell_boxes(dataset, x, y, geographic)
+    if boxes is None:
+        return None
+    dims, xmin, xmax, ymin, ymax = boxes
+
+    x0, x1, y0, y1 = extent
+    with numpy.errstate(invalid='ignore'):
+        overlap = (xmin < x1) & (xmax > x0) & (ymin < y1) & (ymax > y0)
+
+    region = {}
+    for axis, d in enumerate(dims):
+        inside = numpy.flatnonzero(overlap.any(axis=1 - axis))
+        if inside.size == 0:
+            region[d] = slice(0, 0)
+        else:
+            region[d] = slice(max(int(inside[0]) - 1, 0), min(int(inside[-1]) + 2, overlap.shape[axis]))
+    return region
+
+
+def render_tile(dataset, varname, x, y, indices, bounds, z, tx, ty, size=256):
+    """
+    Render a single tile
+
+    Args:
+        dataset: xarray.Dataset
+        varname: Name of the variable to plot
+        x, y: Plotting axes
+        indices: Mapping of passive dimension to index
+        bounds: Colour bar bounds
+        z, tx, ty: Tile zoom and position
+        size: Tile width and height in pixels
+
+    Returns:
+        PNG image as bytes
+    """
+    variable = dataset[varname]
+    x0, x1, y0, y1 = tile_extent(z, tx, ty, data_extent(dataset, x, y))
+    geographic = is_geographic(variable, x, y)
+
+    # Only read and draw the cells on the tile
+    region = tile_cells(dataset, x, y, (x0, x1, y0, y1), geographic)
+    if region is not None:
+        dataset = dataset.isel(region)
+        variable = dataset[varname]
+
+    figure = Figure(figsize=(size / 100, size / 100), dpi=100)
+    FigureCanvasAgg(figure)
+
+    if geographic:
+        axis = figure.add_axes([0, 0, 1, 1], projection=web_mercator)
+    else:
+        axis = figure.add_axes([0, 0, 1, 1])
+    axis.set_axis_off()
+
+    if variable.size > 0:
+        v = variable.isel({d: indices.get(d, 0) for d in passive_dims(variable, x, y)})
+        # Tiles are overlaid on a base map, so leave out coastlines
+        plot_slice(axis, dataset, v, x, y, coastlines=False, **color_args(bounds))
+
+    axis.set_xlim(x0, x1)
+    axis.set_ylim(y0, y1)
+
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png', dpi=100, transparent=True)
+    return buf.getvalue()
+
+
+def _tile_worker(args):
+    return render_tile(render._worker_dataset, *args)
+
+
+class TileCache:
+    """
+    Least recently used cache of tiles in memory, backed by a directory
+    """
+
+    def __init__(self, limit=256 * 2**20, directory=None):
+        """
+        Args:
+            limit: Memory for tiles in bytes
+            directory: Directory for tiles on disk, None to only use memory
+        """
+        self.limit = limit
+        self.directory = directory
+        self._tiles = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        #: Number of tiles served from memory and disk
+        self.hits = collections.Counter()
+
+    @property
+    def nbytes(self):
+        return self._size
+
+    def _path(self, key):
+        return os.path.join(self.directory, *[urllib.parse.quote(str(k), safe='') for k in key]) + '.png'
+
+    def get(self, key):
+        """
+        A cached tile, or None
+        """
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                self.hits['memory'] += 1
+                return self._tiles[key]
+
+        if self.directory is None:
+            return None
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        self.hits['disk'] += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """
+        Add a tile to the cache
+        """
+        self._remember(key, data)
+
+        if self.directory is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Write then rename, so other threads never see partial tiles
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._tiles:
+                self._size -= len(self._tiles.pop(key))
+            if len(data) > self.limit:
+                return
+            self._tiles[key] = data
+            self._size += len(data)
+            while self._size > self.limit:
+                _, old = self._tiles.popitem(last=False)
+                self._size -= len(old)
+
+
+class TileServer:
+    """
+    Renders and caches the tiles of a dataset
+    """
+
+    def __init__(self, dataset, x=None, y=None, size=256, workers=None, worker_memory=None,
+            cache=None):
+        """
+        Args:
+            dataset: xarray.Dataset
+            x, y: Plotting axes (default from :func:`default_axes` for each
+                variable)
+            size: Tile width and height in pixels
+            workers: Number of render processes (default number of CPUs), 0
+                to render in this process
+            worker_memory: Address space limit of each process in bytes
+            cache: :class:`TileCache` (default in memory only)
+        """
+        self.dataset = dataset
+        self.x = x
+        self.y = y
+        self.size = size
+        self.cache = cache if cache is not None else TileCache()
+
+        self._bounds = {}
+        self._lock = threading.Lock()
+
+        self._pool = None
+        if workers != 0:
+            # Spawn rather than fork so workers don't inherit the server's threads
+            context = multiprocessing.get_context('spawn')
+            self._pool = context.Pool(workers, initializer=render._init_worker,
+                    initargs=(dataset, worker_memory))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def axes(self, varname):
+        """
+        Plotting axes of a variable
+        """
+        x, y = self.x, self.y
+        if x is None or y is None:
+            default_x, default_y = default_axes(self.dataset[varname])
+            x = x or default_x
+            y = y or default_y
+        return x, y
+
+    def variables(self):
+        """
+        Description of the variables that can be tiled
+
+        Returns:
+            Mapping of variable name to its passive dimension sizes
+        """
+        result = {}
+        for name, variable in self.dataset.data_vars.items():
+            if variable.ndim < 2:
+                continue
+            try:
+                x, y = self.axes(name)
+            except IndexError:
+                continue
+            result[name] = {d: variable.sizes[d] for d in passive_dims(variable, x, y)}
+        return result
+
+    def bounds(self, varname):
+        """
+        Colour bar bounds of a variable, worked out once
+        """
+        with self._lock:
+            if varname not in self._bounds:
+                self._bounds[varname] = render.sample_bounds(self.dataset[varname])
+            return self._bounds[varname]
+
+    def tile(self, varname, indices, z, tx, ty):
+        """
+        Get a tile, rendering it if it isn't cached
+
+        Args:
+            varname: Variable name
+            indices: Mapping of passive dimension to index
+            z, tx, ty: Tile zoom and position
+
+        Returns:
+            PNG image as bytes
+
+        Raises:
+            KeyError if the variable doesn't exist
+            ValueError if the indices or tile are out of range
+        """
+        variable = self.dataset[varname]
+        x, y = self.axes(varname)
+
+        passive = passive_dims(variable, x, y)
+        for d, i in indices.items():
+            if d not in passive:
+                raise ValueError(f'"{d}" is not a passive dimension of "{varname}"')
+            if not 0 <= i < variable.sizes[d]:
+                raise ValueError(f'Index {i} is out of range for "{d}"')
+        indices = {d: indices.get(d, 0) for d in passive}
+        tile_extent(z, tx, ty, (0, 1, 0, 1))
+
+        key = (varname, ','.join(f'{d}={i}' for d, i in sorted(indices.items())), z, tx, ty)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        args = (varname, x, y, indices, self.bounds(varname), z, tx, ty, self.size)
+        if self._pool is None:
+            data = render_tile(self.dataset, *args)
+        else:
+            data = self._pool.apply_async(_tile_worker, (args,)).get()
+
+        self.cache.put(key, data)
+        return data
+
+
+def make_handler(server):
+    """
+    Request handler class serving tiles from a :class:`TileServer`
+    """
+
+    class TileHandler(http.server.BaseHTTPRequestHandler):
+        def _send(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status, message):
+            self._send(status, 'text/plain; charset=utf-8', message.encode('utf-8'))
+
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            parts = [urllib.parse.unquote(p) for p in url.path.strip('/').split('/')]
+
+            if parts == ['variables']:
+                body = json.dumps(server.variables()).encode('utf-8')
+                return self._send(200, 'application/json', body)
+
+            if len(parts) != 5 or parts[0] != 'tiles' or not parts[4].endswith('.png'):
+                return self._error(404, 'Tiles are at /tiles/{variable}/{z}/{x}/{y}.png?dim=index')
+
+            try:
+                z, tx, ty = int(parts[2]), int(parts[3]), int(parts[4][:-4])
+                query = urllib.parse.parse_qs(url.query)
+                indices = {d: int(v[-1]) for d, v in query.items()}
+            except ValueError:
+                return self._error(400, 'Tile positions and indices must be integers')
+
+            try:
+                data = server.tile(parts[1], indices, z, tx, ty)
+            except KeyError:
+                return self._error(404, f'No variable "{parts[1]}"')
+            except TileRangeError as e:
+                return self._error(404, str(e))
+            except ValueError as e:
+                return self._error(400, str(e))
+            except Exception as e:
+                return self._error(500, f'Rendering failed: {e}')
+
+            self._send(200, 'image/png', data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return TileHandler
+
+
+def make_server(tiles, port=8000):
+    """
+    HTTP server for a :class:`TileServer` on localhost
+
+    Args:
+        tiles: :class:`TileServer`
+        port: Port to listen on, 0 picks a free port
+
+    Returns:
+        http.server.ThreadingHTTPServer, call serve_forever() to run it
+    """
+    return http.server.ThreadingHTTPServer((host, port), make_handler(tiles))
+
+
+def serve(dataset, args):
+    """
+    Run the serve subcommand
+
+    Args:
+        dataset: xarray.Dataset from the preprocessor
+        args: argparse.Namespace with the options from :func:`add_arguments`
+    """
+    tile_dir = args.tile_dir
+    tmpdir = None
+    if tile_dir is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix='xncview-tiles-')
+        tile_dir = tmpdir.name
+
+    tiles = TileServer(dataset, x=args.xdim, y=args.ydim, size=args.tile_size,
+            workers=args.workers, worker_memory=args.worker_memory,
+            cache=TileCache(args.tile_cache, tile_dir))
+    httpd = make_server(tiles, args.port)
+
+    print(f'Serving tiles at http://{host}:{httpd.server_address[1]}/tiles/{{variable}}/{{z}}/{{x}}/{{y}}.png')
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        tiles.close()
+        if tmpdir is not None:
+            tmpdir.cleanup()
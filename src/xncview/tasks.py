@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Prioritised background work
+
+Everything the viewer computes in the background goes through one
+:class:`TaskQueue`, which starts the most urgent work first. Priorities, most
+urgent first, are
+
+ * 'visible': the frame being shown
+ * 'predicted': frames expected to be shown next, e.g. during playback
+ * 'statistics': colour bounds, histograms and the like
+ * 'warmup': work done ahead of time while the viewer is idle, like reading
+   other variables or rendering flipbooks
+
+Threads can't be interrupted, so tasks are preempted between computes
+instead. Long running tasks call :meth:`TaskQueue.checkpoint` before each
+compute of a batch of dask chunks, which runs any more urgent queued task in
+place, waits while more urgent work is running elsewhere and stops the task
+if it has been cancelled. Work done outside the queue, like reading the visible frame
+in the QT thread, is marked with :meth:`TaskQueue.running` so background
+tasks make way for it.
+
+Not every task can checkpoint, so workers can be reserved for the urgent
+priorities. Urgent tasks then never wait behind a long running task.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+
+#: Task priorities, most urgent first
+priorities = ['visible', 'predicted', 'statistics', 'warmup']
+
+#: Priorities that reserved workers run
+urgent = ['visible', 'predicted']
+
+
+class Cancelled(BaseException):
+    """
+    Raised by :meth:`TaskQueue.checkpoint` in a task that has been cancelled
+
+    Like KeyboardInterrupt this isn't an Exception, so it isn't caught by
+    the error handling of the task
+    """
+
+
+class Task(concurrent.futures.Future):
+    """
+    A function queued in a :class:`TaskQueue`
+    """
+
+    def __init__(self, priority, fn, args, kwargs):
+        super().__init__()
+
+        #: One of :data:`priorities`
+        self.priority = priority
+        self.rank = priorities.index(priority)
+
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+        #: When the task was queued and started, from time.perf_counter()
+        self.submitted = time.perf_counter()
+        self.started = None
+
+        self._stop = False
+
+    def cancel(self):
+        """
+        Cancel the task, if it is already running it stops at its next
+        checkpoint
+
+        Returns:
+            True if the task hadn't started
+        """
+        self._stop = True
+        return super().cancel()
+
+
+class TaskQueue(concurrent.futures.Executor):
+    """
+    Thread pool running tasks in order of priority
+
+    :meth:`submit` queues tasks as 'statistics', so the queue can stand in
+    for a concurrent.futures.Executor. Use :meth:`schedule` to give a
+    priority.
+    """
+
+    def __init__(self, workers=2, reserved=0):
+        """
+        Args:
+            workers: Number of worker threads for any task
+            reserved: Number of extra worker threads that only run
+                :data:`urgent` tasks
+        """
+        self._heap = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._shutdown = False
+
+        # Tasks and foreground work running, by rank
+        self._running = [0] * len(priorities)
+
+        #: Recent times between tasks being queued and starting, by priority
+        self.waits = {p: collections.deque(maxlen=50) for p in priorities}
+
+        self._threads = ([threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+                + [threading.Thread(target=self._work, args=(len(urgent),), daemon=True)
+                    for _ in range(reserved)])
+        for t in self._threads:
+            t.start()
+
+    def schedule(self, priority, fn, *args, **kwargs):
+        """
+        Queue a function
+
+        Args:
+            priority: One of :data:`priorities`
+            fn: Function to run, called as ``fn(*args, **kwargs)``
+
+        Returns:
+            :class:`Task`
+        """
+        if priority not in priorities:
+            raise ValueError(f'Unknown task priority "{priority}"')
+
+        task = Task(priority, fn, args, kwargs)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('Cannot schedule tasks after shutdown')
+            heapq.heappush(self._heap, (task.rank, next(self._order), task))
+            self._condition.notify_all()
+        return task
+
+    def submit(self, fn, /, *args, **kwargs):
+        return self.schedule('statistics', fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                for _, _, task in self._heap:
+                    task.cancel()
+            self._condition.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    @contextlib.contextmanager
+    def running(self, priority):
+        """
+        Mark work done outside of the queue, so less urgent tasks wait at
+        their checkpoints until it is finished
+
+        Args:
+            priority: One of :data:`priorities`
+        """
+        rank = priorities.index(priority)
+        with self._condition:
+            self._running[rank] += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._running[rank] -= 1
+                self._condition.notify_all()
+
+    def checkpoint(self):
+        """
+        Let more urgent work go first
+
+        Called by a running task before each chunk of work, does nothing
+        outside of a task
+
+        Raises:
+            :class:`Cancelled` if the task has been cancelled
+        """
+        task = getattr(self._local, 'task', None)
+        if task is None:
+            return
+
+        while True:
+            if task._stop:
+                raise Cancelled()
+            with self._condition:
+                urgent = self._pop(task.rank)
+                if urgent is None:
+                    if not any(self._running[:task.rank]):
+                        return
+                    # Wake up now and then to notice cancellation
+                    self._condition.wait(0.1)
+                    continue
+            self._run(urgent)
+
+    def depth(self):
+        """
+        Number of tasks waiting to start, by priority
+        """
+        counts = dict.fromkeys(priorities, 0)
+        with self._condition:
+            for _, _, task in self._heap:
+                if not task.cancelled():
+                    counts[task.priority] += 1
+        return counts
+
+    def mean_wait(self, priority):
+        """
+        Average time recent tasks of a priority spent queued, in seconds, None
+        if none have started
+        """
+        waits = list(self.waits[priority])
+        if len(waits) == 0:
+            return None
+        return sum(waits) / len(waits)
+
+    def summary(self):
+        """
+        Queue depths and waits for display
+        """
+        parts = []
+        for priority, count in self.depth().items():
+            wait = self.mean_wait(priority)
+            if count == 0 and wait is None:
+                continue
+            text = f'{priority} {count}'
+            if wait is not None:
+                text += f' (wait {wait*1000:.0f} ms)'
+            parts.append(text)
+        return 'Queued ' + ', '.join(parts) if parts else 'Queue idle'
+
+    def _pop(self, rank=len(priorities)):
+        """
+        Take the most urgent task more urgent than rank off the queue, call
+        with the lock held
+        """
+        while len(self._heap) > 0 and self._heap[0][0] < rank:
+            task = heapq.heappop(self._heap)[2]
+            if task.set_running_or_notify_cancel():
+                return task
+        return None
+
+    def _run(self, task):
+        task.started = time.perf_counter()
+        self.waits[task.priority].append(task.started - task.submitted)
+
+        outer = getattr(self._local, 'task', None)
+        self._local.task = task
+        with self._condition:
+            self._running[task.rank] += 1
+
+        try:
+            result = task.fn(*task.args, **task.kwargs)
+        except Cancelled:
+            task.set_exception(concurrent.futures.CancelledError())
+        except BaseException as e:
+            task.set_exception(e)
+        else:
+            task.set_result(result)
+        finally:
+            task.fn = task.args = task.kwargs = None
+            self._local.task = outer
+            with self._condition:
+                self._running[task.rank] -= 1
+                self._condition.notify_all()
+
+    def _work(self, rank=len(priorities)):
+        """
+        Worker thread, running tasks more urgent than rank
+        """
+        while True:
+            with self._condition:
+                task = self._pop(rank)
+                while task is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait()
+                    task = self._pop(rank)
+            self._run(task)
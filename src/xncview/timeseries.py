@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Time series of a single grid point
+
+Input files are normally chunked with one time per chunk, so a time series
+read straight from them touches every chunk. A :class:`TimeContiguousCopy`
+rewrites the variable to a local file with time as the fastest varying
+dimension, after which a point's series is one contiguous read.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import weakref
+
+import numpy
+from matplotlib.backends.qt_compat import QtWidgets as QW, QtCore
+from matplotlib.backends.backend_qt5agg import FigureCanvas
+from matplotlib.figure import Figure
+
+from .reduce import chunk_ranges
+from .tasks import Cancelled
+
+
+#: Bytes of source chunks gathered in memory before being written to a copy.
+#: Writing several chunks at once gives longer runs along the contiguous
+#: dimension, rather than scattering each chunk across the whole file
+write_batch = 64 * 2**20
+
+
+class TimeContiguousCopy:
+    """
+    Local copy of a variable with one dimension stored contiguously
+    """
+
+    def __init__(self, variable, dim, directory=None):
+        """
+        Args:
+            variable: xarray.DataArray to copy
+            dim: Dimension to make contiguous
+            directory: Where to put the copy (default system temporary
+                directory)
+        """
+        #: Name of the copied variable
+        self.name = variable.name
+
+        #: Contiguous dimension
+        self.dim = dim
+
+        #: Dimension order of the copy
+        self.dims = [d for d in variable.dims if d != dim] + [dim]
+
+        self.variable = variable.transpose(*self.dims)
+
+        #: Has :meth:`build` finished
+        self.complete = False
+
+        self._directory = tempfile.mkdtemp(prefix='xncview-', dir=directory)
+        self.path = os.path.join(self._directory, 'data.npy')
+        self._data = None
+
+        # Make sure the copy is cleaned up, even if close() isn't called
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self._directory, ignore_errors=True)
+
+    def build(self, compute=None, progress=None, cancelled=None):
+        """
+        Write the copy, one source chunk along dim at a time
+
+        Args:
+            compute: Function computing an xarray.DataArray
+            progress: Function called with the fraction complete
+            cancelled: Function returning True to stop early
+
+        Returns:
+            True if the copy was completed
+        """
+        if compute is None:
+            compute = lambda v: v.compute()
+
+        out = numpy.lib.format.open_memmap(self.path, mode='w+',
+                dtype=self.variable.dtype, shape=self.variable.shape)
+        size = self.variable.sizes[self.dim]
+
+        # Group chunks into batches of about write_batch bytes
+        step_bytes = max(self.variable.nbytes // max(size, 1), 1)
+        limit = max(write_batch // step_bytes, 1)
+        batches = []
+        for start, stop in chunk_ranges(self.variable, self.dim):
+            if len(batches) > 0 and stop - batches[-1][0][0] <= limit:
+                batches[-1].append((start, stop))
+            else:
+                batches.append([(start, stop)])
+
+        for batch in batches:
+            first = batch[0][0]
+            buffer = numpy.empty(out.shape[:-1] + (batch[-1][1] - first,), dtype=out.dtype)
+            for start, stop in batch:
+                if cancelled is not None and cancelled():
+                    return False
+                buffer[..., start - first:stop - first] = compute(
+                        self.variable.isel({self.dim: slice(start, stop)})).values
+                if progress is not None:
+                    progress(stop / size)
+            out[..., first:batch[-1][1]] = buffer
+
+        out.flush()
+        del out
+
+        self._data = numpy.load(self.path, mmap_mode='r')
+        self.complete = True
+        return True
+
+    def extract(self, point):
+        """
+        Series along dim at a point
+
+        Args:
+            point: Mapping of the other dimensions to index
+        """
+        return numpy.array(self._data[tuple(point[d] for d in self.dims[:-1])])
+
+    def close(self):
+        """
+        Remove the copy
+        """
+        self._data = None
+        self.complete = False
+        self._finalizer()
+
+
+class TimeSeriesWidget(QW.QGroupBox):
+    """
+    Plot of the series at a clicked point, with the option of building a
+    :class:`TimeContiguousCopy` to speed up later extractions
+    """
+
+    # Signals used to hand results from the background threads to the QT thread
+    _extracted = QtCore.Signal(object, object, float, str)
+    _copyProgress = QtCore.Signal(object, float)
+    _copyFinished = QtCore.Signal(object, bool, str)
+
+    def __init__(self, executor, compute):
+        """
+        Args:
+            executor: concurrent.futures.Executor for background jobs
+            compute: Function computing an xarray.DataArray within the memory
+                budget
+        """
+        super().__init__('Time series')
+
+        self._executor = executor
+        self._compute = compute
+
+        main_layout = QW.QVBoxLayout(self)
+
+        figure = Figure(tight_layout=True)
+        figure.set_frameon(False)
+        self.canvas = FigureCanvas(figure)
+        self.canvas.setStyleSheet("background-color:transparent;")
+        self.canvas.setMinimumHeight(150)
+        self.axis = self.canvas.figure.subplots()
+
+        controls = QW.QHBoxLayout()
+        self.latency = QW.QLabel()
+        self.copy_button = QW.QPushButton('Build time-contiguous copy')
+        self.copy_progress = QW.QProgressBar()
+        self.copy_progress.setRange(0, 100)
+        self.copy_progress.setVisible(False)
+        controls.addWidget(self.latency)
+        controls.addStretch()
+        controls.addWidget(self.copy_progress)
+        controls.addWidget(self.copy_button)
+
+        main_layout.addWidget(self.canvas)
+        main_layout.addLayout(controls)
+
+        self.copy_button.clicked.connect(self.build_copy)
+        self._extracted.connect(self._show)
+        self._copyProgress.connect(self._update_progress)
+        self._copyFinished.connect(self._copy_finished)
+
+        #: Variable series are extracted from
+        self.variable = None
+
+        #: Dimension of the series
+        self.dim = None
+
+        #: Local copy of the variable, if one has been built
+        self.copy = None
+
+        self._pending_copy = None
+
+    def setVariable(self, variable, dim):
+        """
+        Set the variable and dimension series are extracted along
+        """
+        if self.variable is not None and variable is not None and dim == self.dim \
+                and variable.name == self.variable.name:
+            return
+
+        self._discard_copy()
+        self.variable = variable
+        self.dim = dim
+        self.copy_button.setEnabled(dim is not None)
+
+    def extract(self, point):
+        """
+        Extract and plot the series at a point in the background
+
+        Args:
+            point: Mapping of the other dimensions of the variable to index
+        """
+        if self.variable is None or self.dim is None:
+            return
+
+        self.setVisible(True)
+        self._executor.submit(self._extract, self.variable, self.dim, dict(point), self.copy)
+
+    def _extract(self, variable, dim, point, copy):
+        try:
+            start = time.perf_counter()
+            if copy is not None and copy.complete:
+                values = copy.extract(point)
+                source = 'local copy'
+            else:
+                values = self._compute(variable.isel(point)).values
+                source = 'source files'
+            elapsed = time.perf_counter() - start
+
+            self._extracted.emit(variable, (point, values), elapsed, source)
+        except Exception as e:
+            print(e)
+
+    def _show(self, variable, result, elapsed, source):
+        point, values = result
+        dim = variable[self.dim] if self.dim in variable.coords else None
+
+        x = numpy.arange(values.size)
+        if dim is not None and dim.dtype.kind in 'iufM':
+            x = dim.values
+
+        self.axis.clear()
+        self.axis.plot(x, values)
+        self.axis.set_xlabel(self.dim)
+        self.axis.set_title(f'{variable.name} at ' + ', '.join(f'{d}={i}' for d, i in point.items()),
+                fontsize='small')
+        self.canvas.draw()
+
+        self.latency.setText(f'Extracted in {elapsed*1000:.1f} ms from {source}')
+
+    def build_copy(self):
+        """
+        Start building a time-contiguous copy of the variable in the background
+        """
+        if self.variable is None or self.dim is None or self._pending_copy is not None:
+            return
+
+        copy = TimeContiguousCopy(self.variable, self.dim)
+        self._pending_copy = copy
+
+        self.copy_button.setEnabled(False)
+        self.copy_progress.setValue(0)
+        self.copy_progress.setVisible(True)
+
+        def build():
+            message = ''
+            try:
+                done = copy.build(self._compute,
+                        progress=lambda f: self._copyProgress.emit(copy, f),
+                        cancelled=lambda: copy is not self._pending_copy)
+            except Cancelled:
+                done = False
+            except Exception as e:
+                print(e)
+                message = str(e)
+                done = False
+            self._copyFinished.emit(copy, done, message)
+
+        self._executor.submit(build)
+
+    def _update_progress(self, copy, fraction):
+        if copy is self._pending_copy:
+            self.copy_progress.setValue(int(fraction * 100))
+
+    def _copy_finished(self, copy, done, message):
+        if copy is not self._pending_copy:
+            copy.close()
+            return
+
+        self._pending_copy = None
+        self.copy_progress.setVisible(False)
+
+        if not done:
+            # Let the copy be tried again
+            copy.close()
+            self.copy_button.setEnabled(True)
+            self.latency.setText(f'Local copy failed: {message}' if message else 'Local copy cancelled')
+            return
+
+        self.copy = copy
+        self.latency.setText(f'Local copy of {copy.name} ready')
+
+    def _discard_copy(self):
+        if self.copy is not None:
+            self.copy.close()
+            self.copy = None
+        self._pending_copy = None
+        self.copy_progress.setVisible(False)
@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unstructured meshes following the UGRID conventions
+
+Variables on a UGRID mesh have a single spatial dimension, the shape of
+each face comes from a connectivity table. :func:`mesh_coords` attaches the
+face and node positions to a dataset as coordinates, so a mesh can be
+picked as the plotting axes like any other grid.
+
+The polygons or triangulation of a mesh only depend on the mesh, so they
+are built once as a :class:`Mesh` and cached, after which each frame only
+sets the colours. The mesh arrays can also be saved to a directory, so the
+connectivity doesn't need to be read again when the file is next opened.
+"""
+
+import os
+import tempfile
+
+import numpy
+import matplotlib.collections
+import matplotlib.tri
+import cartopy.crs
+import cartopy.mpl.geoaxes
+
+from . import memory
+from .interpret_cf import identify_meshes, identify_lon, identify_lat
+from .profiling import stage
+
+
+#: Directory to save mesh arrays in, None to only keep meshes in memory
+cache_directory = None
+
+#: Meshes that have been built, by (mesh token, location, projection)
+meshes = memory.BudgetCache(memory.budget, priority=2)
+
+
+def face_coordinate_names(dataset, mesh):
+    """
+    Names of the face centre coordinates of a mesh, generated names are used
+    if the mesh doesn't list any
+    """
+    names = dataset.variables[mesh].attrs.get('face_coordinates', '').split()
+    if len(names) == 2:
+        return names
+    return [f'{mesh}_face_x', f'{mesh}_face_y']
+
+
+def node_coordinate_names(dataset, mesh):
+    """
+    Names of the node coordinates of a mesh
+    """
+    names = dataset.variables[mesh].attrs.get('node_coordinates', '').split()
+    if len(names) != 2:
+        raise ValueError(f'Mesh "{mesh}" needs two node coordinates')
+    return names
+
+
+def face_nodes(dataset, mesh):
+    """
+    Node indices of each face of a mesh
+
+    Returns:
+        numpy.ndarray of shape (faces, max nodes per face), zero based and
+        padded with -1
+    """
+    attrs = dataset.variables[mesh].attrs
+    if 'face_node_connectivity' not in attrs:
+        raise ValueError(f'Mesh "{mesh}" has no faces')
+
+    conn = dataset[attrs['face_node_connectivity']]
+    face_dim = attrs.get('face_dimension', conn.dims[0])
+    conn = conn.transpose(face_dim, ...)
+
+    values = numpy.asarray(conn.values)
+    invalid = numpy.zeros(values.shape, dtype=bool)
+    if values.dtype.kind == 'f':
+        # Fill values become NaN when the file is decoded
+        invalid |= ~numpy.isfinite(values)
+    fill = conn.attrs.get('_FillValue', conn.encoding.get('_FillValue', None))
+    if fill is not None:
+        invalid |= values == fill
+
+    start = int(conn.attrs.get('start_index', 0))
+    faces = numpy.where(invalid, start - 1, values).astype('i8') - start
+    faces[faces < 0] = -1
+
+    if faces.shape[1] > 0 and (faces[:, 0] < 0).any():
+        raise ValueError(f'Mesh "{mesh}" has faces without nodes')
+    return faces
+
+
+def _centres(x, y, faces, geographic):
+    """
+    Centres of the faces of a mesh, averaging on the sphere if geographic
+    """
+    valid = faces >= 0
+    count = valid.sum(axis=1)
+    index = numpy.where(valid, faces, 0)
+
+    def mean(values):
+        return numpy.where(valid, values[index], 0).sum(axis=1) / count
+
+    if not geographic:
+        return mean(x), mean(y)
+
+    # Average as 3D vectors so faces crossing the dateline are handled
+    lon = numpy.deg2rad(x)
+    lat = numpy.deg2rad(y)
+    cx = mean(numpy.cos(lat) * numpy.cos(lon))
+    cy = mean(numpy.cos(lat) * numpy.sin(lon))
+    cz = mean(numpy.sin(lat))
+    return (numpy.rad2deg(numpy.arctan2(cy, cx)),
+            numpy.rad2deg(numpy.arctan2(cz, numpy.hypot(cx, cy))))
+
+
+def mesh_coords(dataset):
+    """
+    Attach the node and face positions of every UGRID mesh in a dataset as
+    coordinates, so variables on the mesh can be plotted
+
+    Face centres are worked out from the nodes if the mesh doesn't have
+    them. Datasets without meshes are returned unchanged.
+
+    Returns:
+        xarray.Dataset
+    """
+    for mesh in identify_meshes(dataset):
+        try:
+            nx, ny = node_coordinate_names(dataset, mesh)
+        except ValueError as e:
+            print(e)
+            continue
+        dataset = dataset.set_coords([nx, ny])
+
+        if 'face_node_connectivity' not in dataset.variables[mesh].attrs:
+            continue
+
+        fx, fy = face_coordinate_names(dataset, mesh)
+        if fx not in dataset.variables or fy not in dataset.variables:
+            faces = face_nodes(dataset, mesh)
+            geographic = nx in identify_lon(dataset) and ny in identify_lat(dataset)
+            cx, cy = _centres(dataset[nx].values, dataset[ny].values, faces, geographic)
+
+            attrs = dataset.variables[mesh].attrs
+            conn = dataset[attrs['face_node_connectivity']]
+            face_dim = attrs.get('face_dimension', conn.dims[0])
+            dataset = dataset.assign_coords({
+                fx: (face_dim, cx, dict(dataset[nx].attrs, long_name='Face centre x')),
+                fy: (face_dim, cy, dict(dataset[ny].attrs, long_name='Face centre y')),
+                })
+            dataset[mesh] = dataset[mesh].assign_attrs(face_coordinates=f'{fx} {fy}')
+
+        dataset = dataset.set_coords([fx, fy])
+
+    return dataset
+
+
+def mesh_of(dataset, x, y):
+    """
+    The UGRID mesh the plotting axes are the node or face positions of
+
+    Returns:
+        (mesh name, location), or None if x and y aren't mesh coordinates
+    """
+    for mesh in identify_meshes(dataset):
+        attrs = dataset.variables[mesh].attrs
+        if set(attrs.get('node_coordinates', '').split()) == {x, y}:
+            return mesh, 'node'
+        if set(attrs.get('face_coordinates', '').split()) == {x, y}:
+            return mesh, 'face'
+    return None
+
+
+class Mesh:
+    """
+    Geometry of a UGRID mesh, ready to be drawn in one projection
+    """
+
+    def __init__(self, x, y, faces, location, geographic=False, projection=None):
+        """
+        Args:
+            x, y: Node positions
+            faces: Zero-based node indices of each face, padded with -1
+            location: Where variable values are, 'face' to colour each face
+                or 'node' to interpolate across faces
+            geographic: Are x and y longitude and latitude?
+            projection: cartopy projection to draw in, None to use x and y
+                directly
+        """
+        if location not in ['face', 'node']:
+            raise ValueError(f'Unsupported mesh location "{location}"')
+
+        self.x = numpy.asarray(x, dtype='f8')
+        self.y = numpy.asarray(y, dtype='f8')
+        self.faces = numpy.asarray(faces, dtype='i8')
+        self.location = location
+        self.geographic = geographic
+        self.projection = projection
+
+        px, py = self.x, self.y
+        #: Distance the projected x coordinate wraps around at, if it does
+        self.period = None
+        if geographic and projection is not None:
+            points = projection.transform_points(cartopy.crs.PlateCarree(), px, py)
+            px, py = points[:, 0], points[:, 1]
+            self.period = projection.x_limits[1] - projection.x_limits[0]
+        elif geographic:
+            self.period = 360.0
+
+        #: Polygon of each face as (faces, max nodes, 2), for face values
+        self.polygons = None
+
+        #: matplotlib.tri.Triangulation of the nodes, for node values
+        self.triangulation = None
+
+        if location == 'face':
+            self.polygons = self._polygons(px, py)
+        else:
+            self.triangulation = self._triangulation(px, py)
+
+    @property
+    def size(self):
+        """
+        Number of values on the mesh
+        """
+        return self.faces.shape[0] if self.location == 'face' else self.x.size
+
+    @property
+    def nbytes(self):
+        size = self.x.nbytes + self.y.nbytes + self.faces.nbytes
+        if self.polygons is not None:
+            size += self.polygons.nbytes
+        if self.triangulation is not None:
+            size += self.triangulation.triangles.nbytes + 2 * self.x.nbytes
+        return size
+
+    def _polygons(self, px, py):
+        # Pad short faces by repeating their last node
+        count = (self.faces >= 0).sum(axis=1)
+        last = self.faces[numpy.arange(self.faces.shape[0]), count - 1]
+        index = numpy.where(self.faces >= 0, self.faces, last[:, numpy.newaxis])
+
+        vx = px[index]
+        vy = py[index]
+
+        if self.period is not None:
+            # Keep faces that cross the edge of the map in one piece,
+            # hanging off the side rather than stretching across the map
+            vx = vx[:, :1] + (vx - vx[:, :1] + self.period / 2) % self.period - self.period / 2
+
+        return numpy.stack([vx, vy], axis=-1)
+
+    def _triangulation(self, px, py):
+        # Split each face into a fan of triangles around its first node
+        triangles = []
+        for k in range(1, self.faces.shape[1] - 1):
+            fan = self.faces[:, [0, k, k + 1]]
+            triangles.append(fan[fan[:, 2] >= 0])
+        triangles = numpy.concatenate(triangles) if len(triangles) > 0 else numpy.zeros((0, 3), dtype='i8')
+
+        finite = numpy.isfinite(px) & numpy.isfinite(py)
+        px = numpy.where(finite, px, 0)
+        py = numpy.where(finite, py, 0)
+
+        mask = ~finite[triangles].all(axis=1)
+        if self.period is not None:
+            # Triangles crossing the edge of the map can't share the nodes
+            # of both sides, so leave them out
+            tx = px[triangles]
+            mask |= tx.max(axis=1) - tx.min(axis=1) > self.period / 2
+
+        return matplotlib.tri.Triangulation(px, py, triangles, mask=mask)
+
+    def save(self, path):
+        """
+        Save the mesh arrays to a .npz file
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Write then rename, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            numpy.savez(f, x=self.x, y=self.y, faces=self.faces, geographic=self.geographic)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, location, projection=None):
+        """
+        Load mesh arrays saved by :meth:`save`
+        """
+        with numpy.load(path) as data:
+            return cls(data['x'], data['y'], data['faces'], location,
+                    geographic=bool(data['geographic']), projection=projection)
+
+
+def mesh_token(dataset, mesh):
+    """
+    Identifier of a mesh's contents, see :func:`xncview.memory.variables_token`
+    """
+    nx, ny = node_coordinate_names(dataset, mesh)
+    conn = dataset.variables[mesh].attrs.get('face_node_connectivity')
+    return memory.variables_token(dataset, (nx, ny, conn))
+
+
+def load_mesh(dataset, x, y, projection=None, directory=None):
+    """
+    The cached :class:`Mesh` the plotting axes are positions on
+
+    Args:
+        dataset: xarray.Dataset prepared by :func:`mesh_coords`
+        x, y: Plotting axes
+        projection: cartopy projection the mesh will be drawn in
+        directory: Directory to save and load mesh arrays in (default
+            :data:`cache_directory`)
+
+    Returns:
+        :class:`Mesh`, or None if the axes aren't on a mesh
+    """
+    found = mesh_of(dataset, x, y)
+    if found is None:
+        return None
+    mesh, location = found
+
+    if directory is None:
+        directory = cache_directory
+
+    token = mesh_token(dataset, mesh)
+    key = (token, location, projection)
+    result = meshes.get(key)
+    if result is not None:
+        return result
+
+    path = None
+    if directory is not None:
+        path = os.path.join(directory, f'mesh-{token}.npz')
+
+    if path is not None and os.path.exists(path):
+        result = Mesh.load(path, location, projection)
+    else:
+        nx, ny = node_coordinate_names(dataset, mesh)
+        geographic = nx in identify_lon(dataset) and ny in identify_lat(dataset)
+        result = Mesh(dataset[nx].values, dataset[ny].values, face_nodes(dataset, mesh),
+                location, geographic=geographic, projection=projection)
+        if path is not None:
+            result.save(path)
+
+    meshes.put(key, result)
+    return result
+
+
+def plot_mesh(axis, mesh, v, timer=None, coastlines=True, **kwargs):
+    """
+    Plot values on a mesh onto axis
+
+    Face values colour each face, node values are interpolated across the
+    triangulation. Later frames only need the values to be changed with
+    set_array on the returned artist.
+
+    Args:
+        axis: matplotlib.axes.Axes or cartopy GeoAxes, in the projection
+            of the mesh
+        mesh: :class:`Mesh`
+        v: xarray.DataArray with only the mesh dimension remaining
+        timer: Optional :class:`xncview.profiling.FrameTimer`
+        coastlines: Draw coastlines on map plots
+        **kwargs: Colour arguments, as for pcolormesh
+
+    Returns:
+        The plot artist
+    """
+    if isinstance(axis, cartopy.mpl.geoaxes.GeoAxes) and coastlines:
+        with stage(timer, 'coastlines'):
+            axis.coastlines(alpha=0.2)
+
+    values = numpy.ma.masked_invalid(numpy.ravel(v.values))
+    if values.size != mesh.size:
+        raise ValueError(f'Expected {mesh.size} values on the {mesh.location}s of the mesh, got {values.size}')
+
+    if mesh.location == 'node':
+        with stage(timer, 'tripcolor'):
+            return axis.tripcolor(mesh.triangulation, values, shading='gouraud', **kwargs)
+
+    vmin = kwargs.pop('vmin', None)
+    vmax = kwargs.pop('vmax', None)
+    with stage(timer, 'polygons'):
+        collection = matplotlib.collections.PolyCollection(mesh.polygons, array=values,
+                edgecolors='face', linewidths=0, antialiaseds=False, **kwargs)
+        collection.set_clim(vmin, vmax)
+        axis.add_collection(collection)
+        axis.autoscale_view()
+    return collection
@@ -22,11 +22,32 @@ from matplotlib.backends.backend_qt5agg import FigureCanvas
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
 import numpy
-import dask.array
 import xarray
 import cartopy.crs
 import cartopy.mpl.geoaxes
 from .interpret_cf import *
+from .playback import PlaybackWidget
+from .timeseries import TimeSeriesWidget
+from .section import SectionWidget
+from .histogram import Histogram, HistogramJob, HistogramWidget
+from .reader import SliceReader
+from .compare import Comparison, BoundsJob, modes as compare_modes
+from .raster import aggregations, build_mapping, nearest_mapping, plot_raster
+from .image import LutImage, ImageView, is_regular
+from .offload import FrameProcess, Pixels
+from .flipbook import FlipbookWidget, FlipbookFrame, FlipbookJob, open_flipbook
+from .ugrid import mesh_of
+from .reproject import ReprojectionWeights, grid_extent, fit_shape
+from .profiling import FrameTimer
+from . import memory
+from .scheduler import Scheduler
+from .tasks import TaskQueue
+from .render import bounds_sample, sample_bounds
+from .reduce import operations, ReductionJob, reduce_dims
+from .lookup import build_index
+from .plot import (_get_variable_dims, _get_bounds, passive_dims, select_slice,
+        is_geographic, geographic_projection, projections, projection_extents, default_projection,
+        set_projection_extent, color_args, color_modes, plot_slice)
 
 
 class DimensionWidget(QW.QWidget):
@@ -37,6 +58,9 @@ class DimensionWidget(QW.QWidget):
     #: Signal emitted when value is changed
     valueChanged = QtCore.Signal(int)
 
+    #: Signal emitted when the mode changes between 'index' and a reduction
+    modeChanged = QtCore.Signal(str)
+
     def __init__(self, dimension):
         """
         Construct the widget
@@ -64,7 +88,12 @@ class DimensionWidget(QW.QWidget):
         self.slider.setValue(0)
         self.textbox.setText(str(self.dimension[0].values))
 
+        self.modebox = QW.QComboBox()
+        self.modebox.addItems(['index'] + operations)
+        self.modebox.currentTextChanged.connect(self._update_mode)
+
         main_layout.addWidget(self.title)
+        main_layout.addWidget(self.modebox)
         main_layout.addWidget(self.textbox)
         main_layout.addWidget(self.slider)
 
@@ -82,12 +111,40 @@ class DimensionWidget(QW.QWidget):
         self.valueChanged.emit(value)
     
 
+    def _update_mode(self, mode):
+        self.textbox.setEnabled(mode == 'index')
+        self.slider.setEnabled(mode == 'index')
+        self.modeChanged.emit(mode)
+
     def value(self):
         """
         The current slider index
         """
         return self.slider.value()
 
+    def mode(self):
+        """
+        'index' to select a single index, otherwise the reduction operation
+        """
+        return self.modebox.currentText()
+
+    def setValue(self, index, notify=True):
+        """
+        Set the slider index
+
+        Args:
+            index: New index
+            notify: Emit valueChanged
+        """
+        if notify:
+            self.slider.setValue(index)
+            return
+
+        self.slider.blockSignals(True)
+        self.slider.setValue(index)
+        self.slider.blockSignals(False)
+        self.textbox.setText(str(self.dimension[index].values))
+
 
 class ColorBarWidget(QW.QWidget):
     """
@@ -109,17 +166,24 @@ class ColorBarWidget(QW.QWidget):
 
         self.upperTextBox = QW.QLineEdit()
         self.lowerTextBox = QW.QLineEdit()
+        self.modebox = QW.QComboBox()
+        self.modebox.addItems(color_modes)
 
         main_layout.addWidget(self.upperTextBox)
         main_layout.addWidget(self.canvas)
         main_layout.addWidget(self.lowerTextBox)
+        main_layout.addWidget(self.modebox)
 
         self.upperTextBox.returnPressed.connect(self._update_bounds)
         self.lowerTextBox.returnPressed.connect(self._update_bounds)
+        self.modebox.currentIndexChanged.connect(self._update_mode)
 
         #: Colour bar limits
         self.bounds = [numpy.nan, numpy.nan]
 
+        #: Histogram of the variable, for the colour modes other than linear
+        self.histogram = None
+
         self.setFixedWidth(80)
 
     def setBounds(self, bounds):
@@ -128,63 +192,136 @@ class ColorBarWidget(QW.QWidget):
         self.lowerTextBox.setText("%.2e"%bounds[0])
         self.upperTextBox.setText("%.2e"%bounds[1])
 
+    def setHistogram(self, histogram):
+        """
+        Set the variable histogram used by the colour modes, or None
+        """
+        self.histogram = histogram
+
+    def mode(self):
+        """
+        The current colour mode
+        """
+        return self.modebox.currentText()
+
     def redraw(self, plot):
         """
         Redraw the colour bar
         """
         self.axis.clear()
         if plot is not None:
-            plt.colorbar(plot, cax=self.axis)
+            self.canvas.figure.colorbar(plot, cax=self.axis)
 
         self.canvas.draw()
 
     def get_plot_args(self):
-        kwargs = {}
-        if self.bounds[0] < 0 < self.bounds[1]:
-            kwargs['vmax'] = numpy.abs(self.bounds).max()
-            kwargs['vmin'] = -kwargs['vmax']
+        return color_args(self.bounds, self.mode(), self.histogram)
+
+    def color_range(self):
+        """
+        (low, high) of the colour scale, None if it isn't known yet
+        """
+        args = self.get_plot_args()
+        norm = args.get('norm')
+        if norm is not None:
+            low, high = norm.vmin, norm.vmax
         else:
-            kwargs['vmin'] = self.bounds[0]
-            kwargs['vmax'] = self.bounds[1]
-        return kwargs
+            low, high = args.get('vmin'), args.get('vmax')
+        if low is None or high is None:
+            return None
+        return (float(low), float(high))
 
     def _update_bounds(self):
         values = [self.lowerTextBox.text(), self.upperTextBox.text()]
         self.bounds = numpy.array(values, dtype=self.bounds.dtype)
         self.valueChanged.emit(self.bounds[0], self.bounds[1])
 
-def _get_variable_dims(variable):
-    """
-    Get the available dimensions for the current variable
-    """
-    all_dims = set(variable.coords.keys()).union(variable.dims)
-
-    cleaned = set(all_dims)
-    for d in all_dims:
-        if variable[d].size == 1:
-            cleaned.remove(d)
-        if variable[d].ndim > 2:
-            cleaned.remove(d)
-
-    return cleaned
-
-
+    def _update_mode(self, index):
+        self.valueChanged.emit(self.bounds[0], self.bounds[1])
 
 class Widget(QW.QWidget):
     """
     Base QT Widget for the xncview interface
     """
-    def __init__(self, dataset):
+    def __init__(self, dataset, budget=None, scheduler=None, compare=None, offload=False,
+            slice_encoding='float'):
         """
         Construct the widget
 
         Args:
             dataset: xarray.Dataset
+            budget: :class:`xncview.memory.MemoryBudget` for caches and
+                computations (default the process-wide budget)
+            scheduler: :class:`xncview.scheduler.Scheduler` or scheduler
+                description for heavy computations (default threads)
+            compare: Second xarray.Dataset on the same grid, to show
+                alongside or subtracted from dataset
+            offload: Read and colour playback frames in a worker process,
+                see :mod:`xncview.offload`
+            slice_encoding: How cached slices are stored, one of
+                :data:`xncview.encoding.encodings`
+
+        Raises:
+            ValueError if compare has no variables on the same grid as
+            dataset
         """
         super().__init__()
 
+        #: Comparison with a second dataset, alignment is checked here once
+        self.comparison = None
+        if compare is not None:
+            self.comparison = Comparison(dataset, compare)
+            for name, reason in self.comparison.skipped.items():
+                print(f'Not comparing "{name}": {reason}')
+
         main_layout = QW.QVBoxLayout(self)
 
+        #: Memory accounting
+        self.budget = budget if budget is not None else memory.budget
+
+        #: Scheduler for heavy computations, slice reads stay in-process
+        if scheduler is None or isinstance(scheduler, str):
+            scheduler = Scheduler(scheduler or 'threads')
+        self.scheduler = scheduler
+
+        #: Slices that have already been read, by (variable, x, y, indices)
+        self.slices = memory.BudgetCache(self.budget)
+
+        #: Reads of the displayed slices
+        self.reader = SliceReader(self.budget, self.slices, slice_encoding)
+
+        #: Finished reductions, by (variable, x, y, indices, reductions).
+        #: These are expensive to recompute so are kept over slices
+        self.reductions = memory.BudgetCache(self.budget, priority=1)
+
+        #: Whole variable histograms, by variable
+        self.histograms = memory.BudgetCache(self.budget, priority=1)
+
+        #: Cell to pixel mappings for the raster and reproject renderers, by
+        #: renderer, plotting axes and view
+        self.raster_mappings = memory.BudgetCache(self.budget, priority=2)
+
+        #: Nearest cell lookups, by plotting axes
+        self.grid_indices = memory.BudgetCache(self.budget, priority=2)
+
+        #: Worker process for playback frames, if offloading. It's started
+        #: now so it's ready by the time playback starts
+        self.frames = None
+        if offload:
+            self.frames = FrameProcess(dataset)
+            self.frames.start()
+
+        #: Background work - reductions, histograms, grid indexing, time
+        #: series and warming up the other variables, most urgent first. A
+        #: worker is kept for the visible frame, as flipbooks and grid
+        #: indexing can't give way part of the way through
+        self.tasks = TaskQueue(2, reserved=1)
+        self._warmup = []
+        self._reduction = None
+        self._histogram_job = None
+        self._bounds_job = None
+        self._index_jobs = {}
+
         self.varlist = QW.QComboBox()
         self.xdim = QW.QComboBox()
         self.ydim = QW.QComboBox()
@@ -192,9 +329,47 @@ class Widget(QW.QWidget):
         header = QW.QGroupBox()
         header_layout = QW.QHBoxLayout(header)
         header_layout.addWidget(self.varlist)
+
+        # Show dataset A, B or their difference
+        self.compare_mode = QW.QComboBox()
+        self.compare_mode.addItems(compare_modes)
+        self.compare_mode.setVisible(self.comparison is not None)
+        header_layout.addWidget(self.compare_mode)
+
         header_layout.addWidget(self.xdim)
         header_layout.addWidget(self.ydim)
 
+        # Map projection, only shown for geographic axes
+        self.projection = QW.QComboBox()
+        self.projection.addItems(list(projections))
+        self.projection.setCurrentText(default_projection)
+        self.projection.setVisible(False)
+        header_layout.addWidget(self.projection)
+
+        # 'cells' draws every cell, with pcolormesh or as mesh polygons, the
+        # raster renderer aggregates cells into screen pixels for grids finer
+        # than the screen, 'reproject' interpolates the grid onto screen
+        # pixels in the map projection, and 'image' skips matplotlib to draw
+        # regular grids as a plain image
+        self.renderer = QW.QComboBox()
+        self.renderer.addItems(['auto', 'cells', 'raster', 'reproject', 'image'])
+        self.aggregation = QW.QComboBox()
+        self.aggregation.addItems(aggregations)
+        header_layout.addWidget(self.renderer)
+        header_layout.addWidget(self.aggregation)
+
+        self.show_timings = QW.QCheckBox('Timings')
+        header_layout.addWidget(self.show_timings)
+
+        # While checked clicks on the map add points to a section path, a
+        # right click finishes the path
+        self.draw_section = QW.QPushButton('Draw section')
+        self.draw_section.setCheckable(True)
+        header_layout.addWidget(self.draw_section)
+
+        self.show_histogram = QW.QCheckBox('Histogram')
+        header_layout.addWidget(self.show_histogram)
+
         main_layout.addWidget(header)
 
         figure_group = QW.QGroupBox()
@@ -206,9 +381,14 @@ class Widget(QW.QWidget):
         self.canvas.setStyleSheet("background-color:transparent;")
         self.axis = self.canvas.figure.subplots()
 
+        # Replaces the canvas when using the image renderer
+        self.image = ImageView()
+        self.image.setVisible(False)
+
         self.colorbar = ColorBarWidget()
 
         figure_layout.addWidget(self.canvas)
+        figure_layout.addWidget(self.image)
         figure_layout.addWidget(self.colorbar)
 
         main_layout.addWidget(figure_group)
@@ -223,9 +403,13 @@ class Widget(QW.QWidget):
 
         # Connect slots
         self.varlist.currentIndexChanged.connect(self.change_variable)
+        self.compare_mode.currentIndexChanged.connect(self.change_variable)
         self.xdim.activated.connect(self.change_axes)
         self.ydim.activated.connect(self.change_axes)
+        self.projection.currentIndexChanged.connect(self.change_axes)
         self.colorbar.valueChanged.connect(self.redraw)
+        self.renderer.currentIndexChanged.connect(self.redraw)
+        self.aggregation.currentIndexChanged.connect(self.redraw)
 
         #: Currently active variable
         self.variable = None
@@ -239,6 +423,7 @@ class Widget(QW.QWidget):
         for name in self.dataset.coords:
             self.dims[name] = DimensionWidget(self.dataset[name])
             self.dims[name].valueChanged.connect(self.redraw)
+            self.dims[name].modeChanged.connect(self.redraw)
             dims_layout.addWidget(self.dims[name])
 
         # Create widgets for bare dims
@@ -247,10 +432,96 @@ class Widget(QW.QWidget):
                 da = xarray.DataArray(range(self.dataset.dims[name]))
                 self.dims[name] = DimensionWidget(da)
                 self.dims[name].valueChanged.connect(self.redraw)
+                self.dims[name].modeChanged.connect(self.redraw)
                 dims_layout.addWidget(self.dims[name])
 
         main_layout.addWidget(dims_group)
 
+        self.playback = PlaybackWidget(self._frame_reader, _prepare_frame,
+                lambda d: self.dims[d].value())
+        self.playback.frameReady.connect(self.show_frame)
+        main_layout.addWidget(self.playback)
+
+        #: Pre-rendered frames, shown instead of plotting while the view
+        #: matches the one they were rendered for
+        self.flipbook = None
+        self._flipbook_view = None
+        self._flipbook_job = None
+        self.flipbook_controls = FlipbookWidget()
+        self.flipbook_controls.button.toggled.connect(self._toggle_flipbook)
+        main_layout.addWidget(self.flipbook_controls)
+
+        #: Time series at the clicked point
+        self.timeseries = TimeSeriesWidget(self.tasks, self._compute_timeseries)
+        self.timeseries.setVisible(False)
+        main_layout.addWidget(self.timeseries)
+
+        #: Cross-section along a path drawn on the map
+        self.section = SectionWidget(lambda obj: self.budget.compute(obj, name='section'))
+        self.section.setVisible(False)
+        self.section.method.currentIndexChanged.connect(self._redraw_section)
+        main_layout.addWidget(self.section)
+
+        #: Histograms of the slice and variable
+        self.histogram = HistogramWidget()
+        self.histogram.setVisible(False)
+        self.show_histogram.toggled.connect(self._toggle_histogram)
+        main_layout.addWidget(self.histogram)
+
+        # Path being drawn
+        self._path = []
+        self.draw_section.toggled.connect(self._start_path)
+
+        #: Current plot artist
+        self.plot = None
+
+        #: Values in the current plot, as xarray.DataArray
+        self.plotted = None
+
+        #: Pixel mapping of the current plot, if it was rasterised
+        self.raster = None
+
+        self.canvas.mpl_connect('motion_notify_event', self._hover)
+        self.canvas.mpl_connect('button_press_event', self._click)
+
+        #: Frame timings
+        self.timer = FrameTimer()
+        self.status = QW.QStatusBar()
+        self.readout = QW.QLabel()
+        self.status.addWidget(self.readout)
+        self.timings = QW.QLabel()
+        self.status.addWidget(self.timings)
+        self.timings.setVisible(False)
+        self.show_timings.toggled.connect(self.timings.setVisible)
+
+        #: Depth and waits of the background queue, shown with the timings
+        self.queue_status = QW.QLabel()
+        self.status.addWidget(self.queue_status)
+        self.queue_status.setVisible(False)
+        self.show_timings.toggled.connect(self.queue_status.setVisible)
+        main_layout.addWidget(self.status)
+
+        # Memory usage can change from background threads, so poll it
+        self.memory_usage = QW.QLabel()
+        self.status.addPermanentWidget(self.memory_usage)
+
+        self.reduction_progress = QW.QProgressBar()
+        self.reduction_progress.setRange(0, 100)
+        self.reduction_progress.setMaximumWidth(150)
+        self.reduction_progress.setVisible(False)
+        self.status.addPermanentWidget(self.reduction_progress)
+        self._memory_timer = QtCore.QTimer()
+        self._memory_timer.timeout.connect(self._update_memory_usage)
+        self._memory_timer.timeout.connect(self._update_queue_status)
+        self._memory_timer.start(1000)
+        self._update_memory_usage()
+
+        # Other variables are read once the view has settled
+        self._warmup_timer = QtCore.QTimer()
+        self._warmup_timer.setSingleShot(True)
+        self._warmup_timer.setInterval(500)
+        self._warmup_timer.timeout.connect(self._warm_up)
+
         if len(variables) > 0:
             self.change_variable()
 
@@ -266,15 +537,35 @@ class Widget(QW.QWidget):
         if self.variable is not None:
             old_dims = self._get_variable_dims()
 
+        self.playback.stop()
+        if self._reduction is not None:
+            self._cancel_job(self._reduction)
+        if self._bounds_job is not None:
+            self._cancel_job(self._bounds_job)
+            self._bounds_job = None
+
         varname = self.varlist.currentText()
         self.variable = self.dataset[varname]
+        if self.comparison is not None:
+            self.variable = self.comparison.variable(varname, self.compare_mode.currentText())
         print('\nVariable details:')
         print(self.variable)
 
-        sample = self.variable
-        if 'time' in sample.dims:
-            sample = sample.isel(time=0)
-        self.colorbar.setBounds(dask.array.stack([sample.min(), sample.max()]).compute())
+        sample = bounds_sample(self.variable)
+
+        if self.compare_mode.currentText() == 'A-B' and self.comparison is not None:
+            # Differences aren't in the files, so work out the bounds in the
+            # background and scale to the data until then
+            self._start_bounds(sample)
+        else:
+            try:
+                self.colorbar.setBounds(sample_bounds(self.variable, lambda obj: self.budget.compute(
+                    obj, source=sample, name='bounds', scheduler=self.scheduler)))
+            except memory.MemoryBudgetError as e:
+                print(e)
+                self.status.showMessage(f'Colour bounds not updated: {e}')
+
+            self._variable_histogram()
 
         if self._get_variable_dims() != old_dims:
             self.update_dimensions()
@@ -325,91 +616,910 @@ class Widget(QW.QWidget):
         for d in [x, y, *self.variable[x].dims, *self.variable[y].dims]:
             self.dims[d].setVisible(False)
 
-        lon = identify_lon(self.variable)
-        lat = identify_lat(self.variable)
+        geographic = is_geographic(self.variable, x, y)
+        self.projection.setVisible(geographic)
+        projection = geographic_projection(self.projection.currentText())
 
-        if not isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes) and (x in lon and y in lat):
-            # Convert from standard axes to cartopy
+        if geographic and getattr(self.axis, 'projection', None) != projection:
+            # Convert to cartopy axes in the chosen projection
             self.axis.remove()
             self.axis = self.canvas.figure.subplots(subplot_kw={
-                'projection': cartopy.crs.PlateCarree(central_longitude=180.0)})
-        elif isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes) and (x not in lon or y not in lat):
+                'projection': projection})
+        elif isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes) and not geographic:
             # Convert from cartopy to standard axes
             self.axis.remove()
             self.axis = self.canvas.figure.subplots()
 
+        passive = []
+        if x != y:
+            passive = passive_dims(self.variable, x, y)
+        self.playback.setDimensions({d: self.variable.sizes[d] for d in passive})
+        self.flipbook_controls.setDimensions({d: self.variable.sizes[d] for d in passive})
+
+        series = None
+        if len(passive) > 0:
+            series = 'time' if 'time' in passive else passive[0]
+        self.timeseries.setVariable(self.variable, series)
+
+        # Paths are in the old axis coordinates
+        self._path = []
+        self.section.clearPath()
+
+        # Start indexing the grid for hover readouts
+        if x != y:
+            self._grid_index(x, y)
+
         self.redraw()
 
 
     def redraw(self):
-        self.axis.clear()
+        if self._show_flipbook(self.flipbook_frame()):
+            return
+
+        with self.timer.frame(variable=self.variable.name) as record:
+            self.axis.clear()
+            if isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes):
+                set_projection_extent(self.axis, self.projection.currentText())
+
+            x = self.xdim.currentText()
+            y = self.ydim.currentText()
+
+            plot = None
+            self.plotted = None
+            self.raster = None
+            if x != y:
+                # Flatten or reduce passive dims
+                indices, reductions = self._passive_selection(x, y)
+                record['indices'] = indices
+                record['reductions'] = reductions
+
+                try:
+                    with self.timer.stage('read'), self.tasks.running('visible'):
+                        if len(reductions) > 0:
+                            v = self._reduced_slice(x, y, indices, reductions)
+                        else:
+                            v = self._read_slice(x, y, indices)
+
+                    # Plot data
+                    if v is not None:
+                        self.plotted = v
+                        renderer = self._renderer(v, x, y)
+                        if renderer == 'raster':
+                            self.raster = self._raster_mapping(x, y)
+                        elif renderer == 'reproject':
+                            self.raster = self._reprojection(x, y)
+                        if renderer == 'image':
+                            with self.timer.stage('image'):
+                                plot = LutImage.for_slice(self.dataset, v, x, y,
+                                        **self.colorbar.get_plot_args())
+                        elif self.raster is not None:
+                            plot = plot_raster(self.axis, self.raster, v,
+                                    how=self.aggregation.currentText(),
+                                    timer=self.timer,
+                                    **self.colorbar.get_plot_args(),
+                                    )
+                        else:
+                            plot = plot_slice(self.axis, self.dataset, v, x, y,
+                                    timer=self.timer,
+                                    **self.colorbar.get_plot_args(),
+                                    )
+                except memory.MemoryBudgetError as e:
+                    print(e)
+                    self.status.showMessage(str(e))
+                except (TypeError, ValueError) as e:
+                    print(e)
+                    pass
+
+            self.plot = plot
+            self._draw_path()
+            if self.section.isVisible():
+                with self.timer.stage('section'):
+                    self._redraw_section()
+
+            self._show_image(plot if isinstance(plot, LutImage) else None)
+            with self.timer.stage('draw'):
+                self._draw()
+            with self.timer.stage('colorbar'):
+                self.colorbar.redraw(plot)
+            if self.histogram.isVisible():
+                with self.timer.stage('histogram'):
+                    self._redraw_histogram()
+
+        self.timings.setText(self.timer.summary())
+        self._cancel_warmup()
+        self._warmup_timer.start()
+
+    def _read_slice(self, x, y, indices):
+        """
+        Read the slice of the current variable at indices, using the cache
+        if possible
+        """
+        return self.reader.read([(self.variable, x, y, indices)], timer=self.timer,
+                bounds=[self.colorbar.color_range()])[0]
+
+    def _passive_selection(self, x, y):
+        """
+        Split the passive dimensions into those selected by index and those
+        being reduced
+
+        Returns:
+            (mapping of dimension to index, mapping of dimension to reduction)
+        """
+        indices = {}
+        reductions = {}
+        for d in passive_dims(self.variable, x, y):
+            mode = self.dims[d].mode()
+            if mode == 'index':
+                indices[d] = self.dims[d].value()
+            else:
+                reductions[d] = mode
+        return indices, reductions
+
+    def _schedule_job(self, priority, job):
+        """
+        Queue a background job, keeping its task so cancelling the job also
+        stops the task
+        """
+        job.task = self.tasks.schedule(priority, job.run)
+
+    @staticmethod
+    def _cancel_job(job):
+        job.cancel()
+        job.task.cancel()
+
+    def _compute_reduction(self, obj):
+        self.tasks.checkpoint()
+        return self.budget.compute(obj, name='reduction', scheduler=self.scheduler)
+
+    def _compute_timeseries(self, obj):
+        self.tasks.checkpoint()
+        return self.budget.compute(obj, name='timeseries')
+
+    def _reduced_slice(self, x, y, indices, reductions):
+        """
+        Get a reduction of the current variable, starting it in the
+        background if needed
+
+        Returns:
+            The finished reduction if available, otherwise the latest partial
+            result, or None if there is no result yet
+        """
+        key = (self.variable.name, x, y, tuple(sorted(indices.items())), tuple(reductions.items()))
+        v = self.reductions.get(key)
+        if v is not None:
+            return v
+
+        if self._reduction is not None and self._reduction.key == key:
+            return self._reduction.latest
+
+        if self._reduction is not None:
+            self._cancel_job(self._reduction)
+
+        job = ReductionJob(key, self.variable.isel(indices), reductions, self._compute_reduction)
+        job.progress.connect(self._reduction_progress)
+        job.partial.connect(self._reduction_partial)
+        job.finished.connect(self._reduction_finished)
+        job.failed.connect(self._reduction_failed)
+        self._reduction = job
+
+        self.reduction_progress.setValue(0)
+        self.reduction_progress.setVisible(True)
+        self._schedule_job('visible', job)
+
+        return None
+
+    def _reduction_progress(self, job, fraction):
+        if job is self._reduction:
+            self.reduction_progress.setValue(int(fraction * 100))
+
+    def _reduction_partial(self, job):
+        if job is self._reduction:
+            self.redraw()
+
+    def _reduction_finished(self, job):
+        self.reductions.put(job.key, job.latest)
+        if job is self._reduction:
+            self.reduction_progress.setVisible(False)
+            self.redraw()
+
+    def _reduction_failed(self, job, message):
+        print(message)
+        if job is self._reduction:
+            self.reduction_progress.setVisible(False)
+            self.status.showMessage(f'Reduction failed: {message}')
+
+    def _start_bounds(self, sample):
+        """
+        Compute the colour bounds of a sample of the current variable in the
+        background, then start its histogram
+        """
+        # The histogram of the previous variable mustn't arrive after this
+        if self._histogram_job is not None:
+            self._cancel_job(self._histogram_job)
+            self._histogram_job = None
+            self.histogram.progress.setVisible(False)
+
+        self.colorbar.setBounds(numpy.array([numpy.nan, numpy.nan]))
+        self.colorbar.setHistogram(None)
+        self.histogram.variable = None
+
+        def compute(obj):
+            self.tasks.checkpoint()
+            return self.budget.compute(obj, source=sample.data, name='bounds', scheduler=self.scheduler)
+
+        job = BoundsJob(self.variable.name, sample, compute)
+        job.finished.connect(self._bounds_finished)
+        job.failed.connect(self._bounds_failed)
+        self._bounds_job = job
+        self._schedule_job('statistics', job)
+
+    def _bounds_finished(self, job):
+        if job is not self._bounds_job:
+            return
+        self._bounds_job = None
+        self.colorbar.setBounds(job.bounds)
+        self._variable_histogram()
+        self.redraw()
+
+    def _bounds_failed(self, job, message):
+        print(message)
+        if job is self._bounds_job:
+            self._bounds_job = None
+            self.status.showMessage(f'Colour bounds not updated: {message}')
+
+    def _variable_histogram(self):
+        """
+        Use the cached histogram of the current variable, starting it in the
+        background if needed
+        """
+        if self._histogram_job is not None:
+            self._cancel_job(self._histogram_job)
+            self._histogram_job = None
+
+        key = self.variable.name
+        histogram = self.histograms.get(key)
+        self.colorbar.setHistogram(histogram)
+        self.histogram.variable = histogram
+        if histogram is not None:
+            return
+
+        try:
+            histogram = Histogram.from_bounds(self.colorbar.bounds)
+        except ValueError as e:
+            print(e)
+            return
+
+        variable = self.variable
+        def compute(obj):
+            self.tasks.checkpoint()
+            return self.budget.compute(obj, source=variable.data, name='histogram',
+                    scheduler=self.scheduler)
+
+        job = HistogramJob(key, variable, histogram, compute)
+        job.progress.connect(self._histogram_progress)
+        job.finished.connect(self._histogram_finished)
+        job.failed.connect(self._histogram_failed)
+        self._histogram_job = job
+
+        self.histogram.progress.setValue(0)
+        self.histogram.progress.setVisible(True)
+        self._schedule_job('statistics', job)
+
+    def _histogram_progress(self, job, fraction):
+        if job is self._histogram_job:
+            self.histogram.progress.setValue(int(fraction * 100))
+
+    def _histogram_finished(self, job):
+        self.histograms.put(job.key, job.histogram)
+        if job is not self._histogram_job:
+            return
+
+        self._histogram_job = None
+        self.histogram.progress.setVisible(False)
+        self.colorbar.setHistogram(job.histogram)
+        self.histogram.variable = job.histogram
+        if self.colorbar.mode() != 'linear' or self.histogram.isVisible():
+            self.redraw()
+
+    def _histogram_failed(self, job, message):
+        print(message)
+        if job is self._histogram_job:
+            self._histogram_job = None
+            self.histogram.progress.setVisible(False)
+            self.status.showMessage(f'Histogram failed: {message}')
+
+    def _toggle_histogram(self, checked):
+        self.histogram.setVisible(checked)
+        if checked:
+            self._redraw_histogram()
+
+    def _redraw_histogram(self):
+        """
+        Update the histogram panel with the current slice
+        """
+        values = self.plotted.values if self.plotted is not None else None
+        try:
+            edges = Histogram.from_bounds(self.colorbar.bounds).edges
+        except ValueError:
+            edges = numpy.linspace(0, 1, 2)
+        self.histogram.redraw(values, edges)
+
+    def _canvas_shape(self):
+        """
+        Size of the figure in pixels, as (height, width)
+
+        The axes within the figure move about as the layout is adjusted, so
+        use the figure size, which only changes when the window is resized
+        """
+        bbox = self.canvas.figure.bbox
+        return max(int(bbox.height), 1), max(int(bbox.width), 1)
+
+    def _show_image(self, image):
+        """
+        Show a :class:`xncview.image.LutImage` in place of the canvas, or go
+        back to the canvas if image is None
+        """
+        self.image.setImage(image)
+        self.image.setVisible(image is not None)
+        self.canvas.setVisible(image is None)
+
+    def _draw(self):
+        """
+        Draw the plot to the screen
+        """
+        if self.image.image is not None:
+            self.image.repaint()
+        else:
+            self.canvas.draw()
+
+    def _renderer(self, v, x, y):
+        """
+        How should a slice be drawn, 'cells', 'raster', 'reproject' or
+        'image'?
+
+        Automatically grids are reprojected onto the screen if they would
+        need every cell transforming to a map projection, the raster is used
+        if there are more cells than pixels or the grid is unstructured
+        without a UGRID mesh to draw the cells from (with each pixel taking
+        its nearest cell if there are fewer cells than pixels), and otherwise
+        each cell is drawn. The image renderer is only used when chosen, and falls back
+        to drawing cells if the grid isn't regular
+        """
+        mode = self.renderer.currentText()
+        if mode == 'image' and not is_regular(self.dataset, x, y):
+            return 'cells'
+        if mode != 'auto':
+            return mode
+
+        mesh = mesh_of(self.dataset, x, y)
+        geographic = isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes)
+        if geographic and mesh is None and self.projection.currentText() != default_projection:
+            return 'reproject'
+
+        height, width = self._canvas_shape()
+        if self._unstructured(x, y) or v.size > height * width:
+            return 'raster'
+        return 'cells'
+
+    def _unstructured(self, x, y):
+        """
+        Are the plotting axes points of an unstructured grid without a UGRID
+        mesh to draw the cells from
+        """
+        xc = self.dataset[x]
+        yc = self.dataset[y]
+        return xc.ndim == 1 and xc.dims == yc.dims and mesh_of(self.dataset, x, y) is None
 
+    def _raster_mapping(self, x, y):
+        """
+        Cell to pixel mapping of the plotting axes for the current view
+        """
+        shape = self._canvas_shape()
+        geographic = isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes)
+        projection = self.projection.currentText() if geographic else None
+
+        # Sparse unstructured grids fill each pixel from the nearest cell
+        # once the index is ready, rather than leaving gaps between cells
+        index = None
+        if self._unstructured(x, y) and self.dataset[x].size < shape[0] * shape[1]:
+            index = self._grid_index(x, y)
+
+        key = ('raster', x, y, shape, projection, index is not None)
+        mapping = self.raster_mappings.get(key)
+        if mapping is None:
+            with self.timer.stage('pixel mapping'):
+                if index is not None:
+                    mapping = nearest_mapping(self.dataset, x, y, shape, index,
+                            projection=self.axis.projection if geographic else None)
+                else:
+                    mapping = build_mapping(self.dataset, x, y, shape,
+                            projection=self.axis.projection if geographic else None)
+            self.raster_mappings.put(key, mapping)
+        return mapping
+
+    def _reprojection(self, x, y):
+        """
+        Reprojection weights of the plotting axes onto the current view
+        """
+        if not isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes):
+            raise ValueError('Only map plots can be reprojected')
+
+        projection = self.projection.currentText()
+        shape = self._canvas_shape()
+
+        key = ('reproject', x, y, shape, projection)
+        weights = self.raster_mappings.get(key)
+        if weights is None:
+            with self.timer.stage('reprojection weights'):
+                view = self.axis.get_extent() if projection in projection_extents else None
+                extent = grid_extent(self.dataset, x, y, self.axis.projection, view)
+                weights = ReprojectionWeights(self.dataset, x, y, self.axis.projection, extent,
+                        fit_shape(extent, shape), index=self.grid_indices.get((x, y)))
+            self.raster_mappings.put(key, weights)
+        return weights
+
+    def _grid_index(self, x, y):
+        """
+        Nearest cell index for the plotting axes, building it in the
+        background if needed
+
+        Returns:
+            The index, or None if it isn't ready yet
+        """
+        key = (x, y)
+        index = self.grid_indices.get(key)
+        if index is not None:
+            return index
+
+        future = self._index_jobs.get(key)
+        if future is None:
+            self._index_jobs[key] = self.tasks.schedule('statistics', build_index, self.dataset, x, y)
+            return None
+        if not future.done():
+            return None
+
+        try:
+            index = future.result()
+        except ValueError as e:
+            print(e)
+            return None
+
+        # Keep the finished job if the index doesn't fit in the cache, so it
+        # doesn't get rebuilt
+        if self.grid_indices.put(key, index):
+            del self._index_jobs[key]
+        return index
+
+    def _event_position(self, event):
+        """
+        Position of a mouse event in the plotting axis coordinates
+        """
+        px, py = event.xdata, event.ydata
+        if isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes):
+            px, py = cartopy.crs.PlateCarree().transform_point(px, py, self.axis.projection)
+        return px, py
+
+    def _cell_at(self, event):
+        """
+        Find the grid cell under a mouse event
+
+        Returns:
+            (description of the position, mapping of dimension to index or
+            None if no cell was found)
+        """
         x = self.xdim.currentText()
         y = self.ydim.currentText()
 
-        plot = None
-        if x != y:
-            v = self.variable
+        px, py = self._event_position(event)
+        text = f'{x} = {px:.4g}, {y} = {py:.4g}'
 
-            plot_args = {}
-            if isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes):
-                plot_args['transform'] = cartopy.crs.PlateCarree()
-                self.axis.coastlines(alpha=0.2)
+        index = self._grid_index(x, y)
+        if index is None:
+            return f'{text} (indexing grid)', None
 
-            # Flatten passive dims
-            for d in self.dims:
-                if d in self.variable.dims and d not in [x,y] and d not in self.variable[x].dims and d not in self.variable[y].dims:
-                    v = v.isel({d:self.dims[d].value()})
+        return text, index.query(px, py)
 
-            # Plot data
-            try:
-                x = _get_bounds(self.dataset, x)
-                y = _get_bounds(self.dataset, y)
-
-                plot = self.axis.pcolormesh(x, y, v,
-                        **plot_args,
-                        **self.colorbar.get_plot_args(),
-                        )
-            except TypeError as e:
-                print(e)
-                pass
+    def _hover(self, event):
+        """
+        Show the coordinates and value under the mouse
+        """
+        if event.inaxes is not self.axis or self.plotted is None:
+            self.readout.setText('')
+            return
 
-        self.canvas.draw()
-        self.colorbar.redraw(plot)
+        text, cell = self._cell_at(event)
+        if cell is None:
+            self.readout.setText(text)
+            return
 
+        cell = {d: cell[d] for d in self.plotted.dims if d in cell}
+        value = float(self.plotted.isel(cell).values)
+        position = ', '.join(f'{d} = {i}' for d, i in cell.items())
+        self.readout.setText(f'{text} [{position}]: {value:.4g}')
 
-def _get_bounds(dataset, dim):
-    """
-    Get bounds of a dim
-    """
-    dim = dataset[dim]
-    bound = dim.attrs.get('bounds',None)
+    def _click(self, event):
+        """
+        Add to the section path if drawing one, otherwise show the time
+        series of the clicked cell
+        """
+        if event.inaxes is not self.axis:
+            return
 
-    if bound is None:
-        return dim
+        if self.draw_section.isChecked():
+            if event.button == 1:
+                self._path.append(self._event_position(event))
+                self._draw_path()
+                self.canvas.draw_idle()
+            elif event.button == 3:
+                self._finish_path()
+            return
 
-    # Switch to DataArray
-    bound = dataset[bound]
+        if event.button != 1 or self.timeseries.dim is None:
+            return
 
-    # Get the bound dimension
-    bound_d = set(bound.dims) - set(dim.dims)
-    if len(bound_d) != 1:
-        raise Exception(f'Bad bounds for dimension "{dim.name}"')
-    bound_d = bound_d.pop()
+        _, cell = self._cell_at(event)
+        if cell is None:
+            return
 
-    if dim.ndim == 1 and bound.sizes[bound_d] != 2:
-        raise Exception(f'Bad bounds for dimension "{dim.name}"')
-    elif dim.ndim == 2 and bound.sizes[bound_d] != 4:
-        raise Exception(f'Bad bounds for dimension "{dim.name}"')
+        x = self.xdim.currentText()
+        y = self.ydim.currentText()
+        point = {d: self.dims[d].value() for d in passive_dims(self.variable, x, y)}
+        point.update(cell)
+        point.pop(self.timeseries.dim)
+        self.timeseries.extract(point)
+
+    def _start_path(self, checked):
+        if checked:
+            self._path = []
+            self.status.showMessage('Click to add points to the section, right click to finish')
+        else:
+            self.status.clearMessage()
 
-    if dim.ndim == 1:
-        return numpy.concatenate([bound.isel({bound_d:0}), bound.isel({bound_d:1})[-1:]])
+    def _finish_path(self):
+        """
+        Use the drawn path for the cross-section
+        """
+        self.draw_section.setChecked(False)
+        if len(self._path) < 2:
+            return
+
+        x = self.xdim.currentText()
+        y = self.ydim.currentText()
+        try:
+            self.section.setPath(self.dataset, x, y, self._path, index=self._grid_index(x, y))
+        except ValueError as e:
+            print(e)
+            self.status.showMessage(f'No section: {e}')
+            return
+
+        self.section.setVisible(True)
+        self._redraw_section()
 
-    if dim.ndim == 2:
-        A = numpy.concatenate([bound.isel({bound_d:0}),
-                               bound.isel({bound_d:3})[-1:, :]], axis=0)
-        B = numpy.concatenate([bound.isel({bound_d:1})[:,-1:],
-                               bound.isel({bound_d:2})[-1:,-1:]], axis=0)
-        return numpy.concatenate([A,B], axis=1)
+    def _draw_path(self):
+        """
+        Draw the section path on the map
+        """
+        path = self._path
+        if len(path) == 0 and self.section.isVisible():
+            path = self.section.vertices
+        if len(path) == 0:
+            return
+
+        kwargs = {}
+        if isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes):
+            kwargs['transform'] = cartopy.crs.PlateCarree()
+        px, py = zip(*path)
+        self.axis.plot(px, py, 'k.-', **kwargs)
+
+    def _redraw_section(self):
+        """
+        Section the current variable along the path, against the first
+        passive dimension that isn't being used for time series
+        """
+        x = self.xdim.currentText()
+        y = self.ydim.currentText()
+        passive = passive_dims(self.variable, x, y)
+
+        vertical = [d for d in passive if d != self.timeseries.dim]
+        vertical = vertical[0] if len(vertical) > 0 else None
+
+        try:
+            self.section.redraw(self.variable, {d: self.dims[d].value() for d in passive}, vertical)
+        except memory.MemoryBudgetError as e:
+            print(e)
+            self.status.showMessage(str(e))
+
+    def view_settings(self, dim):
+        """
+        Everything that affects how frames along dim look, for flipbooks
 
-    raise Exception(f'Dimensions higher than two not implemented')
+        Returns:
+            Mapping of settings, None if frames along dim can't be
+            pre-rendered
+        """
+        x = self.xdim.currentText()
+        y = self.ydim.currentText()
+        if x == y:
+            return None
+
+        indices, reductions = self._passive_selection(x, y)
+        indices.pop(dim, None)
+        reductions.pop(dim, None)
+        if len(reductions) > 0:
+            return None
+
+        geographic = isinstance(self.axis, cartopy.mpl.geoaxes.GeoAxes)
+        return {
+            'variable': self.variable.name,
+            'x': x,
+            'y': y,
+            'dim': dim,
+            'indices': indices,
+            'projection': self.projection.currentText() if geographic else None,
+            'shape': self._canvas_shape(),
+            'dpi': self.canvas.figure.dpi,
+            'plot_args': self.colorbar.get_plot_args(),
+            }
+
+    def _toggle_flipbook(self, checked):
+        """
+        Start or drop a flipbook of the chosen range
+        """
+        if self._flipbook_job is not None:
+            self._cancel_job(self._flipbook_job)
+            self._flipbook_job = None
+        self.flipbook = None
+        self._flipbook_view = None
+        self.flipbook_controls.setProgress(None)
+
+        if checked:
+            dim, indices = self.flipbook_controls.selection()
+            view = self.view_settings(dim) if len(indices) > 0 else None
+            if view is None:
+                self.status.showMessage('Can\'t make a flipbook of this view')
+                self.flipbook_controls.button.setChecked(False)
+                return
+
+            self.flipbook = open_flipbook(self.variable, view, indices)
+            self._flipbook_view = view
+            if not self.flipbook.complete:
+                job = FlipbookJob(self.flipbook, self.dataset, self.variable, view)
+                job.progress.connect(self._flipbook_progress)
+                job.finished.connect(self._flipbook_finished)
+                job.failed.connect(self._flipbook_failed)
+                self._flipbook_job = job
+                self.flipbook_controls.setProgress(0)
+                self._schedule_job('warmup', job)
+
+        self.redraw()
+
+    def _flipbook_progress(self, job, fraction):
+        if job is self._flipbook_job:
+            self.flipbook_controls.setProgress(fraction)
+
+    def _flipbook_finished(self, job):
+        if job is self._flipbook_job:
+            self._flipbook_job = None
+            self.flipbook_controls.setProgress(None)
+
+    def _flipbook_failed(self, job, message):
+        if job is self._flipbook_job:
+            print(message)
+            self.status.showMessage(f'Flipbook failed: {message}')
+            self.flipbook_controls.button.setChecked(False)
+
+    def flipbook_frame(self):
+        """
+        The flipbook frame for the current view, None if there isn't a
+        flipbook for it or the frame isn't rendered yet
+        """
+        if self.flipbook is None:
+            return None
+        dim = self._flipbook_view['dim']
+        if self.view_settings(dim) != self._flipbook_view:
+            return None
+        return self.flipbook.frame(self.dims[dim].value())
+
+    def _show_flipbook(self, frame):
+        """
+        Show a flipbook frame in place of the plot
+
+        Returns:
+            True if the frame was shown, False if frame is None
+        """
+        if frame is None:
+            return False
+
+        with self.timer.frame(variable=self.variable.name, flipbook=True):
+            self._show_image(frame)
+            with self.timer.stage('draw'):
+                self._draw()
+
+        self.timings.setText(self.timer.summary())
+        return True
+
+    def _update_memory_usage(self):
+        text = self.budget.summary()
+        ratio = self.reader.compression_ratio()
+        if self.reader.encoding != 'float' and ratio is not None:
+            text += f', slices {ratio:.1f}x compressed'
+        self.memory_usage.setText(text)
+
+    def _update_queue_status(self):
+        self.queue_status.setText(self.tasks.summary())
+
+    def _cancel_warmup(self):
+        for task in self._warmup:
+            task.cancel()
+        self._warmup = []
+
+    def _warm_up(self):
+        """
+        Read the current slice of the other variables in the background, so
+        switching to them is quick
+        """
+        self._cancel_warmup()
+
+        x = self.xdim.currentText()
+        y = self.ydim.currentText()
+        indices, reductions = self._passive_selection(x, y)
+        if x == y or len(reductions) > 0 or self.playback.isPlaying():
+            return
+
+        for i in range(self.varlist.count()):
+            name = self.varlist.itemText(i)
+            variable = self.dataset[name]
+            if self.comparison is not None:
+                variable = self.comparison.variable(name, self.compare_mode.currentText())
+            dims = _get_variable_dims(variable)
+            if variable.name == self.variable.name or x not in dims or y not in dims:
+                continue
+
+            passive = passive_dims(variable, x, y)
+            if any(d not in indices for d in passive):
+                continue
+            request = (variable, x, y, {d: indices[d] for d in passive})
+            if self.reader.key(*request) in self.slices:
+                continue
+            self._warmup.append(self.tasks.schedule('warmup', self._warm_read, request))
+
+    def _warm_read(self, request):
+        self.tasks.checkpoint()
+        try:
+            self.reader.read([request])
+        except memory.MemoryBudgetError:
+            pass
+
+    def _frame_reader(self, dim):
+        """
+        Function to read frames along dim with the other dimensions fixed at
+        their current values, for the playback pipeline
+        """
+        variable = self.variable
+        budget = self.budget
+        x = self.xdim.currentText()
+        y = self.ydim.currentText()
+        indices, reductions = self._passive_selection(x, y)
+        reductions.pop(dim, None)
+        compute = self._compute_reduction
+
+        if self._offload_frames(reductions):
+            read = self._offloaded_reader(dim, x, y, indices)
+        else:
+            def read(index):
+                if len(reductions) > 0:
+                    return reduce_dims(variable.isel({**indices, dim: index}), reductions, compute).values
+                v = select_slice(variable, x, y, {**indices, dim: index})
+                return budget.compute(v, name='playback').values
+
+        # Background tasks make way while upcoming frames are read
+        tasks = self.tasks
+        def read_predicted(index):
+            with tasks.running('predicted'):
+                return read(index)
+
+        # Take frames from the flipbook where possible
+        flipbook = self.flipbook
+        if flipbook is None or self.view_settings(dim) != self._flipbook_view:
+            return read_predicted
+
+        def read_flipbook(index):
+            frame = flipbook.frame(index)
+            return frame if frame is not None else read_predicted(index)
+
+        return read_flipbook
+
+    def _offload_frames(self, reductions):
+        """
+        Can playback frames be read in the worker process?
+
+        The worker only has the original dataset, so it can't read
+        reductions or comparisons with a second dataset
+        """
+        if self.frames is None or len(reductions) > 0:
+            return False
+        return self.comparison is None or self.compare_mode.currentText() == 'A'
+
+    def _offloaded_reader(self, dim, x, y, indices):
+        """
+        Function to read frames along dim in the worker process
+
+        Image frames are coloured in the worker as well, unless the values
+        are needed for the section or histogram
+        """
+        variable = self.variable
+        frames = self.frames
+
+        colour = None
+        if (isinstance(self.plot, LutImage) and not self.section.isVisible()
+                and not self.histogram.isVisible()):
+            colour = self.plot.settings()
+
+        shape = select_slice(variable, x, y, {**indices, dim: 0}).shape
+        frames.configure(shape, numpy.result_type(variable.dtype, 'f4'), colour)
+
+        def read(index):
+            return frames.read(variable.name, x, y, {**indices, dim: index})
+
+        return read
+
+    def show_frame(self, dim, index, frame):
+        """
+        Show a frame from the playback pipeline, only updating the plotted
+        values rather than redrawing the axes
+        """
+        self.dims[dim].setValue(index, notify=False)
+
+        if isinstance(frame, FlipbookFrame):
+            self._show_flipbook(frame)
+            return
+
+        if self.plot is None or self.image.image is not None and self.image.image is not self.plot:
+            # Nothing plotted, or the plot is hidden behind a flipbook frame
+            self.redraw()
+            return
+
+        if isinstance(frame, Pixels):
+            if not isinstance(self.plot, LutImage):
+                # Renderer changed since the frame was coloured
+                self.redraw()
+                return
+
+            with self.timer.frame(variable=self.variable.name, indices={dim: index}):
+                self.plot.set_pixels(frame.pixels)
+                self._show_image(self.plot)
+                with self.timer.stage('draw'):
+                    self._draw()
+
+            self.timings.setText(self.timer.summary())
+            return
+
+        with self.timer.frame(variable=self.variable.name, indices={dim: index}):
+            if self.plotted is not None and self.plotted.shape == frame.shape:
+                self.plotted = self.plotted.copy(data=frame)
+            if self.raster is not None:
+                with self.timer.stage('rasterise'):
+                    frame = numpy.ma.masked_invalid(self.raster.rasterise(
+                        self.plotted.transpose(*self.raster.dims).values,
+                        self.aggregation.currentText()))
+            self.plot.set_array(frame)
+            with self.timer.stage('draw'):
+                self._draw()
+            if self.section.isVisible():
+                with self.timer.stage('section'):
+                    self._redraw_section()
+            if self.histogram.isVisible():
+                with self.timer.stage('histogram'):
+                    self._redraw_histogram()
+
+        self.timings.setText(self.timer.summary())
+
+
+def _prepare_frame(values):
+    """
+    Convert a raw frame to the array given to the plot, frames already
+    coloured by the worker process or from a flipbook are left alone
+    """
+    if isinstance(values, (Pixels, FlipbookFrame)):
+        return values
+    return numpy.ma.masked_invalid(values)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.cli import Preprocessor, is_zarr
+
+import argparse
+import pytest
+import xarray
+import numpy
+
+
+def sample_dataset():
+    return xarray.Dataset({
+            'a': (['time','y','x'], numpy.random.random((4,3,2))),
+        },
+        coords = {
+            'time': (['time'], [1,2,3,4]),
+        })
+
+
+@pytest.mark.parametrize('consolidated', [True, False])
+def test_open_zarr(tmpdir, consolidated):
+    pytest.importorskip('zarr')
+
+    ds = sample_dataset()
+    path = str(tmpdir.join('sample.zarr'))
+    ds.chunk({'time': 2}).to_zarr(path, consolidated=consolidated)
+    assert is_zarr(path)
+
+    result = Preprocessor(argparse.ArgumentParser(add_help=False), [path])()
+
+    # Native chunking is kept
+    assert result.a.chunks[0] == (2, 2)
+    numpy.testing.assert_equal(result.a.values, ds.a.values)
+
+
+def test_compare_dataset(tmpdir):
+    a = sample_dataset()
+    b = sample_dataset()
+    a.to_netcdf(str(tmpdir.join('a.nc')))
+    b.to_netcdf(str(tmpdir.join('b.nc')))
+
+    pp = Preprocessor(argparse.ArgumentParser(add_help=False),
+            [str(tmpdir.join('a.nc')), '--compare', str(tmpdir.join('b.nc'))])
+    assert pp.compare_dataset() is not None
+    numpy.testing.assert_equal(pp.compare_dataset().a.values, b.a.values)
+
+    # The inputs are unchanged
+    numpy.testing.assert_equal(pp().a.values, a.a.values)
+
+    pp = Preprocessor(argparse.ArgumentParser(add_help=False), [str(tmpdir.join('a.nc'))])
+    assert pp.compare_dataset() is None
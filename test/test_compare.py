@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.compare import Comparison, stream_bounds
+from xncview.widget import Widget
+
+import pytest
+import xarray
+import numpy
+import dask
+
+
+def run(offset, x=numpy.arange(4.0)):
+    return xarray.Dataset({
+        'a': (['t', 'y', 'x'], numpy.arange(24.0).reshape((2, 3, 4)) + offset),
+        'b': (['y', 'x'], numpy.zeros((3, 4))),
+        }, coords={'x': x, 'y': numpy.arange(3.0)})
+
+
+def test_comparison():
+    c = Comparison(run(0), run(1).drop_vars('b'))
+    assert c.common == ['a']
+
+    diff = c.variable('a', 'A-B')
+    assert diff.name == 'a (A-B)'
+    assert dask.is_dask_collection(diff)
+    numpy.testing.assert_array_equal(diff.isel(t=0).values, -1)
+
+    assert c.variable('a', 'B').name == 'a (B)'
+    assert c.variable('b', 'A-B').name == 'b'
+
+    with pytest.raises(ValueError):
+        Comparison(run(0), run(1, x=numpy.arange(4.0) + 0.5))
+
+
+def test_stream_bounds():
+    da = xarray.DataArray(numpy.arange(24.0).reshape((4, 6)), dims=['t', 'x']).chunk({'t': 1})
+    steps = list(stream_bounds(da))
+    assert len(steps) == 4
+    numpy.testing.assert_array_equal(steps[-1][1], [0, 23])
+
+
+def test_widget_difference(qtbot):
+    widget = Widget(run(0), compare=run(0.5))
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+
+    with qtbot.waitSignal(widget.compare_mode.currentIndexChanged):
+        widget.compare_mode.setCurrentText('A-B')
+
+    assert widget.variable.name == 'a (A-B)'
+    qtbot.waitUntil(lambda: numpy.isfinite(widget.colorbar.bounds).all())
+    numpy.testing.assert_array_equal(widget.colorbar.bounds, [-0.5, -0.5])
+    numpy.testing.assert_array_equal(widget.plotted, -0.5)
+
+
+class PendingHistogram:
+    """
+    Stands in for a histogram job of the previous variable
+    """
+    key = 'a'
+    histogram = 'old histogram'
+    _cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+
+def test_difference_cancels_histogram(qtbot):
+    widget = Widget(run(0), compare=run(0.5))
+    qtbot.addWidget(widget)
+
+    job = PendingHistogram()
+    job.task = widget.tasks.schedule('warmup', lambda: None)
+    widget._histogram_job = job
+
+    widget.compare_mode.setCurrentText('A-B')
+    assert job._cancelled
+    assert widget._histogram_job is not job
+
+    # Finishing late doesn't change the difference's colour bar
+    widget._histogram_finished(job)
+    assert widget.colorbar.histogram != 'old histogram'
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.edges import centre_edges, curvilinear_edges, infer_edges
+from xncview.plot import _get_bounds
+import xncview.memory
+
+import xarray
+import numpy
+
+
+def test_centre_edges():
+    numpy.testing.assert_allclose(centre_edges([1, 2, 4]), [0.5, 1.5, 3, 5])
+    numpy.testing.assert_allclose(centre_edges([3]), [2.5, 3.5])
+
+    # Descending
+    numpy.testing.assert_allclose(centre_edges([4, 2, 1]), [5, 3, 1.5, 0.5])
+
+    # Longitudes crossing the date line
+    numpy.testing.assert_allclose(centre_edges([340, 0, 20], period=360), [330, 350, 370, 390])
+
+
+def test_curvilinear_edges():
+    x, y = numpy.meshgrid(numpy.array([1.0, 2.0, 3.0]), numpy.array([10.0, 20.0]))
+
+    ex = curvilinear_edges(x)
+    ey = curvilinear_edges(y)
+
+    assert ex.shape == (3, 4)
+    numpy.testing.assert_allclose(ex[0], [0.5, 1.5, 2.5, 3.5])
+    numpy.testing.assert_allclose(ey[:, 0], [5, 15, 25])
+
+    # Longitudes crossing the date line in both directions
+    lon = numpy.array([[350.0, 10.0], [350.0, 10.0]])
+    e = curvilinear_edges(lon, period=360)
+    numpy.testing.assert_allclose(e[:, 1], 360)
+    numpy.testing.assert_allclose(e[:, 0], 340)
+
+
+def test_infer_edges(monkeypatch):
+    ds = xarray.Dataset(coords={
+        'lat': ('lat', [-89.0, 0.0, 89.0], {'units': 'degrees_north'}),
+        'lon': ('lon', [0.0, 120.0, 240.0], {'units': 'degrees_east'}),
+        })
+
+    # Latitudes are kept inside the poles
+    numpy.testing.assert_allclose(infer_edges(ds.lat), [-90, -44.5, 44.5, 90])
+    numpy.testing.assert_allclose(infer_edges(ds.lon), [-60, 60, 180, 300])
+
+    # Computed once per grid
+    assert infer_edges(ds.lat) is infer_edges(ds.lat.copy())
+
+    numpy.testing.assert_allclose(_get_bounds(ds, 'lon'), [-60, 60, 180, 300])
+
+    # The coordinate isn't hashed again while the dataset has it
+    monkeypatch.setattr(xncview.memory.dask.base, 'tokenize', None)
+    assert _get_bounds(ds, 'lon') is _get_bounds(ds, 'lon')
+
+
+def test_infer_edges_2d():
+    lon, lat = numpy.meshgrid(numpy.linspace(0, 300, 6), numpy.linspace(-60, 60, 4))
+    ds = xarray.Dataset(coords={
+        'lat': (['j', 'i'], lat, {'units': 'degrees_north'}),
+        'lon': (['j', 'i'], lon, {'units': 'degrees_east'}),
+        })
+
+    e = infer_edges(ds.lon)
+    assert e.shape == (5, 7)
+    numpy.testing.assert_allclose(e[0], numpy.linspace(-30, 330, 7))
+    assert infer_edges(ds.lat).shape == (5, 7)
+
+
+def test_infer_edges_projected():
+    # Projected coordinates in metres are neither wrapped nor clipped
+    ds = xarray.Dataset(coords={
+        'x': ('x', numpy.arange(0.0, 5000, 1000), {'axis': 'X', 'units': 'm'}),
+        'y': ('y', numpy.arange(0.0, 5000, 1000), {'axis': 'Y', 'units': 'm',
+            'standard_name': 'projection_y_coordinate'}),
+        })
+
+    numpy.testing.assert_allclose(infer_edges(ds.x), numpy.arange(-500.0, 5000, 1000))
+    numpy.testing.assert_allclose(infer_edges(ds.y), numpy.arange(-500.0, 5000, 1000))
+
+
+def test_get_bounds_no_coordinate():
+    # Dimensions without a coordinate count from 0
+    ds = xarray.Dataset({'a': (['y', 'x'], numpy.zeros((2, 3)))})
+    numpy.testing.assert_allclose(_get_bounds(ds, 'x'), [-0.5, 0.5, 1.5, 2.5])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from xncview.encoding import encode, RawSlice, QuantisedSlice, CompressedSlice
+from xncview.reader import SliceReader
+from xncview.memory import MemoryBudget
+
+import xarray
+import numpy
+import pytest
+
+
+def sample_slice():
+    values = numpy.linspace(-5, 5, 200).reshape((10, 20))
+    values[3, 4] = numpy.nan
+    return xarray.DataArray(values, dims=['y', 'x'],
+            coords={'x': numpy.arange(20), 'y': numpy.arange(10)}, name='a', attrs={'units': 'K'})
+
+
+def test_raw():
+    v = sample_slice()
+    e = encode(v)
+    assert isinstance(e, RawSlice)
+    assert e.decode() is v
+
+
+@pytest.mark.parametrize('encoding,dtype', [('uint16', numpy.uint16), ('uint8', numpy.uint8)])
+def test_quantised(encoding, dtype):
+    v = sample_slice()
+    e = encode(v, encoding, (-5, 5))
+    assert isinstance(e, QuantisedSlice)
+    assert e.codes.dtype == dtype
+    assert e.nbytes == v.size * numpy.dtype(dtype).itemsize
+    assert e.raw_nbytes == v.nbytes
+
+    d = e.decode()
+    assert d.dims == v.dims
+    assert d.name == 'a'
+    assert d.attrs['units'] == 'K'
+    numpy.testing.assert_array_equal(d.x, v.x)
+
+    # NaN is kept, everything else is within half a step
+    assert numpy.isnan(d[3, 4])
+    assert numpy.isfinite(d).sum() == v.size - 1
+    numpy.testing.assert_allclose(d, v, atol=0.5 / e.scale * 1.0001)
+
+
+def test_quantised_clipped():
+    v = sample_slice()
+    e = encode(v, 'uint16', (0, 2))
+    assert e.clipped == (True, True)
+    assert float(e.decode()[0, 0]) == 0
+    assert float(e.decode()[-1, -1]) == pytest.approx(2)
+
+    # Inside the encoded range the slice is still good
+    assert e.usable((0.5, 1.5))
+    # The clipped values would be visible in a wider range
+    assert not e.usable((-1, 2))
+    assert not e.usable((0, 3))
+    # Too few steps left in a very narrow range
+    assert not e.usable((1, 1 + 1e-5))
+
+
+def test_quantised_unknown_bounds():
+    v = sample_slice()
+    e = encode(v, 'uint8', None)
+    assert e.bounds == (-5, 5)
+    assert e.clipped == (False, False)
+    assert e.usable((-100, 100))
+
+
+def test_compressed():
+    v = xarray.DataArray(numpy.zeros((100, 100)), dims=['y', 'x'])
+    v[10, 10] = numpy.nan
+    e = encode(v, 'compress')
+    assert isinstance(e, CompressedSlice)
+    assert e.nbytes < v.nbytes / 10
+    d = e.decode()
+    numpy.testing.assert_array_equal(d, v)
+    d[0, 0] = 1
+
+
+def test_reader_requantises():
+    ds = xarray.Dataset({'a': (['t', 'y', 'x'], numpy.arange(24.0).reshape((2, 3, 4)))}).chunk({'t': 1})
+    reader = SliceReader(MemoryBudget(), encoding='uint16')
+
+    a, = reader.read([(ds.a, 'x', 'y', {'t': 0})], bounds=[(0, 5)])
+    assert reader.computes == 1
+    assert float(a.max()) == 11
+    assert reader.compression_ratio() == pytest.approx(4)
+
+    # Served from the cache while the colour range is covered
+    a, = reader.read([(ds.a, 'x', 'y', {'t': 0})], bounds=[(1, 4)])
+    assert reader.computes == 1
+    assert float(a.max()) == pytest.approx(5)
+
+    # Clipped values would show, so read again
+    a, = reader.read([(ds.a, 'x', 'y', {'t': 0})], bounds=[(0, 23)])
+    assert reader.computes == 2
+    assert float(a.max()) == pytest.approx(11, abs=1e-3)
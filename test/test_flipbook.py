@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview import flipbook
+from xncview.flipbook import (Flipbook, FlipbookFrame, FlipbookJob, open_flipbook, render_rgba,
+        flipbook_token)
+from xncview.widget import Widget
+
+import xarray
+import numpy
+import pytest
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(flipbook, 'cache_directory', str(tmp_path))
+    return tmp_path
+
+
+def frames_dataset():
+    return xarray.Dataset({
+        'a': (['t', 'y', 'x'], numpy.arange(24.0).reshape((2, 3, 4))),
+        }, coords={'t': [0, 1], 'x': numpy.arange(4.0), 'y': numpy.arange(3.0)})
+
+
+def view(**kwargs):
+    return {'variable': 'a', 'x': 'x', 'y': 'y', 'dim': 't', 'indices': {}, 'projection': None,
+            'shape': (200, 300), 'dpi': 100, 'plot_args': {'vmin': 0, 'vmax': 23}, **kwargs}
+
+
+def test_render_rgba():
+    ds = frames_dataset()
+    rgba = render_rgba(ds, ds.a, 'x', 'y', {'t': 0}, {}, None, (60, 80), 100)
+    assert rgba.shape == (60, 80, 4)
+    assert rgba.dtype == numpy.uint8
+
+
+def test_flipbook_token():
+    ds = frames_dataset()
+    assert flipbook_token(ds.a, view(), range(2)) == flipbook_token(ds.a, view(), range(2))
+    assert flipbook_token(ds.a, view(), range(2)) != flipbook_token(ds.a, view(), range(1))
+    assert flipbook_token(ds.a, view(), range(2)) != flipbook_token(ds.a,
+            view(plot_args={'vmin': 0, 'vmax': 10}), range(2))
+
+
+def test_flipbook(tmp_path):
+    path = str(tmp_path / 'frames.rgba')
+    book = Flipbook(path, [3, 4], (2, 5))
+    assert not book.complete
+    assert book.frame(3) is None
+
+    book.frames[1] = 7
+    book.done[1] = True
+    frame = book.frame(4)
+    assert isinstance(frame, FlipbookFrame)
+    assert frame.rgba.shape == (2, 5, 4)
+    assert frame.qimage().width() == 5
+
+    book.done[:] = True
+    book.save()
+
+    # Finished frames are reused
+    book = Flipbook(path, [3, 4], (2, 5))
+    assert book.complete
+    numpy.testing.assert_array_equal(book.frame(4).rgba, 7)
+
+    # Unless the settings differ
+    assert not Flipbook(path, [3, 4, 5], (2, 5)).complete
+
+
+def test_flipbook_job(cache):
+    ds = frames_dataset()
+    book = open_flipbook(ds.a, view(), range(2))
+    job = FlipbookJob(book, ds, ds.a, view(), workers=2)
+
+    finished = []
+    job.finished.connect(lambda j: finished.append(j))
+    job.run()
+
+    assert finished == [job]
+    assert book.complete
+    numpy.testing.assert_array_equal(book.frames[0],
+            render_rgba(ds, ds.a, 'x', 'y', {'t': 0}, view()['plot_args'], None, (200, 300), 100))
+    assert (book.frames[0] != book.frames[1]).any()
+
+    assert open_flipbook(ds.a, view(), range(2)).complete
+
+
+def test_widget_flipbook(qtbot, cache):
+    ds = frames_dataset()
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+
+    widget.flipbook_controls.dimension.setCurrentText('t')
+    widget.flipbook_controls.button.setChecked(True)
+    assert widget.flipbook is not None
+    qtbot.waitUntil(lambda: widget.flipbook.complete, timeout=60000)
+
+    widget.dims['t'].setValue(1)
+    assert isinstance(widget.image.image, FlipbookFrame)
+
+    # Frames in playback come from the flipbook
+    frame = widget._frame_reader('t')(0)
+    assert isinstance(frame, FlipbookFrame)
+
+    # Different colours don't match the flipbook
+    widget.colorbar.setBounds(numpy.array([0.0, 5.0]))
+    widget.redraw()
+    assert widget.image.image is None
+
+    widget.flipbook_controls.button.setChecked(False)
+    assert widget.flipbook is None
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.histogram import Histogram, variable_histogram
+from xncview.plot import color_args
+from xncview.widget import Widget
+
+import xarray
+import numpy
+
+
+def test_histogram():
+    values = numpy.arange(100.0)
+
+    h = Histogram.from_bounds([0, 50], bins=10)
+    h.add(h.count(values))
+
+    # Values past the bounds go in the end bins
+    assert h.total == 100
+    assert h.counts[-1] == 55
+
+    assert abs(h.percentile(10) - 10) < 1e-6
+    assert h.percentile(100) == 50
+
+    norm = h.equalised_norm()
+    assert norm is h.equalised_norm()
+    numpy.testing.assert_allclose(norm([0, 25, 50]), [0, 0.25, 1])
+
+
+def test_variable_histogram():
+    da = xarray.DataArray(numpy.arange(24.0).reshape((4, 6)), dims=['t', 'x'])
+    da[0, 0] = numpy.nan
+
+    h = Histogram.from_bounds([0, 24], bins=4)
+    steps = list(variable_histogram(da.chunk({'t': 1}), h))
+
+    assert steps[-1] == 1
+    numpy.testing.assert_array_equal(h.counts, [5, 6, 6, 6])
+
+
+def test_color_args():
+    h = Histogram.from_bounds([0, 100], bins=100)
+    h.add(h.count(numpy.arange(100.0)))
+
+    assert color_args([0, 1]) == {'vmin': 0, 'vmax': 1}
+    assert color_args([0, 1], 'equalise') == {'vmin': 0, 'vmax': 1}
+    assert 'norm' in color_args([0, 1], 'equalise', h)
+
+    args = color_args([0, 1], 'clip', h)
+    assert abs(args['vmin'] - 2) < 1e-6 and abs(args['vmax'] - 98) < 1e-6
+
+
+def test_widget_histogram(qtbot):
+    ds = xarray.Dataset({
+        'a': (['t', 'y', 'x'], numpy.random.random((3, 4, 5))),
+        }).chunk({'t': 1})
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+
+    qtbot.waitUntil(lambda: widget.colorbar.histogram is not None)
+    assert widget.colorbar.histogram.total == 60
+
+    widget.colorbar.modebox.setCurrentText('equalise')
+    assert 'norm' in widget.colorbar.get_plot_args()
+
+    widget.show_histogram.setChecked(True)
+    assert len(widget.histogram.axis.patches) > 0
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.image import LutImage, colormap_lut, is_regular, bad_index, levels
+from xncview.widget import Widget
+
+import matplotlib.colors
+import xarray
+import numpy
+
+
+def grid_dataset():
+    return xarray.Dataset({
+        'a': (['y', 'x'], numpy.arange(12.0).reshape((3, 4))),
+        }, coords={'x': numpy.arange(4.0), 'y': numpy.arange(3.0)})
+
+
+def test_colormap_lut():
+    lut = colormap_lut('gray')
+    assert lut.shape == (256,)
+    rgba = lut.view('u1').reshape((256, 4))
+    numpy.testing.assert_array_equal(rgba[0], [0, 0, 0, 255])
+    numpy.testing.assert_array_equal(rgba[levels - 1], [255, 255, 255, 255])
+
+
+def test_is_regular():
+    ds = grid_dataset()
+    assert is_regular(ds, 'x', 'y')
+
+    ds['x'] = [0.0, 1.0, 3.0, 4.0]
+    assert not is_regular(ds, 'x', 'y')
+
+
+def test_lut_image():
+    ds = grid_dataset()
+    v = ds.a.copy()
+    v[0, 0] = numpy.nan
+
+    image = LutImage.for_slice(ds, v.transpose('x', 'y'), 'x', 'y', cmap='gray', vmin=0, vmax=11)
+    assert image.pixels.shape == (3, 4)
+
+    # The first row is drawn at the bottom
+    rgba = image.pixels.view('u1').reshape((3, 4, 4))
+    numpy.testing.assert_array_equal(rgba[0, -1], [255, 255, 255, 255])
+    numpy.testing.assert_array_equal(rgba[-1, 1, :3], rgba[-1, 1, 0])
+
+    bad = colormap_lut('gray')[bad_index]
+    assert image.pixels[-1, 0] == bad
+
+    # Non-linear norms
+    image = LutImage.for_slice(ds, ds.a, 'x', 'y', norm=matplotlib.colors.LogNorm(1, 11))
+    assert image.pixels[-1, 0] == colormap_lut()[bad_index]
+
+
+def test_widget_image(qtbot):
+    widget = Widget(grid_dataset())
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+    assert not isinstance(widget.plot, LutImage)
+
+    widget.renderer.setCurrentText('image')
+    assert isinstance(widget.plot, LutImage)
+    assert widget.image.image is widget.plot
+
+    widget.show_frame('x', 0, numpy.ma.masked_invalid(numpy.zeros((3, 4))))
+    assert (widget.plot.pixels == widget.plot.pixels[0, 0]).all()
+
+    widget.renderer.setCurrentText('cells')
+    assert not isinstance(widget.plot, LutImage)
+    assert widget.image.image is None
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.lookup import AxisIndex, CurvilinearIndex, build_index, point_weights
+from xncview.widget import Widget
+
+import xarray
+import numpy
+from matplotlib.backend_bases import MouseEvent
+
+
+def test_axis_index():
+    a = AxisIndex([0.5, 1.5, 2.5])
+    assert a.query(0.1) == 0
+    assert a.query(2.9) == 2
+    assert a.query(3.1) is None
+
+    # Descending
+    a = AxisIndex([2.5, 1.5, 0.5])
+    assert a.query(0.1) == 2
+
+    # Periodic
+    a = AxisIndex([0, 90, 180, 270], period=360)
+    assert a.query(-10) == 0
+    assert a.query(400) == 0
+
+
+def test_curvilinear_index():
+    j, i = numpy.meshgrid(numpy.arange(40), numpy.arange(60), indexing='ij')
+    x = (i * 6 + 3 * numpy.sin(j / 5)) % 360
+    y = -80 + j * 4 + numpy.cos(i / 4)
+    index = CurvilinearIndex(('j', 'i'), x, y, xperiod=360)
+
+    rng = numpy.random.default_rng(0)
+    for px, py in rng.uniform([0, -78], [360, 75], (200, 2)):
+        d = ((x - px + 180) % 360 - 180)**2 + (y - py)**2
+        expect = numpy.unravel_index(numpy.argmin(d), x.shape)
+        cell = index.query(px, py)
+        assert d[cell['j'], cell['i']] == d[expect]
+
+    assert index.query(100, 200) is None
+
+
+def test_query_points():
+    a = AxisIndex([2.5, 1.5, 0.5])
+    i, valid = a.query_points([0.1, 2.9, 3.1, numpy.nan])
+    numpy.testing.assert_array_equal(valid, [True, True, False, False])
+    numpy.testing.assert_array_equal(i[valid], [2, 0])
+
+    # Matches the single point query, including across the seam
+    rng = numpy.random.default_rng(1)
+    x = rng.uniform(0, 360, (30, 40))
+    y = rng.uniform(-90, 90, (30, 40))
+    index = CurvilinearIndex(('j', 'i'), x, y, xperiod=360)
+
+    px = rng.uniform(-180, 540, 500)
+    py = rng.uniform(-100, 100, 500)
+    cells, valid = index.query_points(px, py)
+    for n in range(px.size):
+        found = index.query(px[n], py[n])
+        assert valid[n] == (found is not None)
+        if found is not None:
+            assert found == {'j': cells['j'][n], 'i': cells['i'][n]}
+
+
+def test_hover(qtbot):
+    ds = xarray.Dataset({
+            'a': (['y','x'], numpy.arange(6.0).reshape((2,3))),
+        },
+        coords = {
+            'x': (['x'], [1,2,3]),
+            'y': (['y'], [1,2]),
+        })
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentIndex(widget.xdim.findText('x'))
+    widget.ydim.setCurrentIndex(widget.ydim.findText('y'))
+    widget.change_axes()
+
+    qtbot.waitUntil(lambda: widget._grid_index('x', 'y') is not None)
+
+    px, py = widget.axis.transData.transform((3, 2))
+    widget._hover(MouseEvent('motion_notify_event', widget.canvas, px, py))
+    assert widget.readout.text().endswith('[y = 1, x = 2]: 5')
+
+
+def test_curvilinear_index_outside(monkeypatch):
+    x, y = numpy.meshgrid(numpy.linspace(100, 120, 300), numpy.linspace(-10, 10, 300))
+    x[100:200, 100:200] = numpy.nan
+    index = CurvilinearIndex(('j', 'i'), x, y)
+
+    searches = []
+    search = index._search
+    monkeypatch.setattr(index, '_search', lambda *args: searches.append(args) or search(*args))
+
+    # Well outside the grid nothing is searched
+    assert index.query(300, 80) is None
+    assert len(searches) == 0
+
+    # Nor are all the rings searched in a hole in the grid
+    assert index.query(110, 0) is None
+    assert 0 < len(searches) < index.nb
+
+    assert index.query(100.01, -9.99) == {'j': 0, 'i': 0}
+
+
+def test_point_weights_regional():
+    ds = xarray.Dataset(coords={
+        'lon': ('lon', numpy.arange(100.0, 121.0), {'units': 'degrees_east'}),
+        'lat': ('lat', numpy.arange(-10.0, 11.0), {'units': 'degrees_north'}),
+        })
+
+    # Nothing is interpolated across the gap of a regional grid
+    _, _, _, _, _, valid = point_weights(ds, 'lon', 'lat',
+            numpy.array([110.5, 200, 300, 470.5]), numpy.zeros(4))
+    numpy.testing.assert_array_equal(valid, [True, False, False, True])
+
+    # Global grids wrap
+    ds = ds.assign_coords(lon=('lon', numpy.arange(0.0, 360.0, 10), {'units': 'degrees_east'}))
+    _, _, _, cells, weights, valid = point_weights(ds, 'lon', 'lat', numpy.array([355.0]), numpy.zeros(1))
+    assert valid[0]
+    assert sorted(set(cells[0][0])) == [0, 35]
+
+
+def projected_dataset():
+    return xarray.Dataset(coords={
+        'x': ('x', numpy.arange(0.0, 100001.0, 1000), {'axis': 'X', 'units': 'm'}),
+        'y': ('y', numpy.arange(0.0, 5001.0, 1000), {'axis': 'Y', 'units': 'm'}),
+        })
+
+
+def test_build_index_projected():
+    # An 'axis' attribute alone doesn't make the x axis periodic
+    ds = projected_dataset()
+    assert build_index(ds, 'x', 'y').query(50200., 2100.) == {'x': 50, 'y': 2}
+
+    x, y = numpy.meshgrid(ds.x.values, ds.y.values)
+    ds = ds.assign_coords(lon=(('y', 'x'), x, ds.x.attrs), lat=(('y', 'x'), y, ds.y.attrs))
+    assert build_index(ds, 'lon', 'lat').query(50200., 2100.) == {'y': 2, 'x': 50}
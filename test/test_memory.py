@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.memory import MemoryBudget, BudgetCache, MemoryBudgetError
+from xncview.widget import Widget
+
+import pytest
+import xarray
+import numpy
+
+
+def test_eviction():
+    budget = MemoryBudget(limit=300)
+    low = BudgetCache(budget, priority=0)
+    high = BudgetCache(budget, priority=1)
+
+    high.put('a', numpy.zeros(100, dtype='u1'))
+    low.put('b', numpy.zeros(100, dtype='u1'))
+    low.put('c', numpy.zeros(100, dtype='u1'))
+    assert budget.usage == 300
+
+    # Oldest entry of the low priority cache goes first
+    low.get('b')
+    high.put('d', numpy.zeros(100, dtype='u1'))
+    assert 'c' not in low
+    assert 'b' in low
+
+    # Too big to ever fit
+    assert not low.put('e', numpy.zeros(400, dtype='u1'))
+    assert 'e' not in low
+
+
+def test_compute():
+    budget = MemoryBudget(limit=700)
+    da = xarray.DataArray(numpy.ones((10, 10))).chunk(5)
+
+    assert budget.compute(da.sum(), source=da) == 100
+    assert budget.inflight == {}
+
+    # Result alone is over the limit
+    with pytest.raises(MemoryBudgetError):
+        budget.compute(da * 2)
+
+
+def test_widget_slice_cache(qtbot):
+    ds = xarray.Dataset({
+        'b': (['x','y'], numpy.zeros((2,2,))),
+        })
+
+    budget = MemoryBudget()
+    widget = Widget(ds, budget=budget)
+    qtbot.addWidget(widget)
+
+    assert len(widget.slices) == 1
+    assert budget.cached == ds.b.nbytes
+    assert 'Memory' in widget.memory_usage.text()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.offload import FrameRing, FrameProcess, Pixels
+from xncview.image import LutImage
+from xncview.widget import Widget
+
+import xarray
+import numpy
+import pytest
+
+
+def frames_dataset():
+    return xarray.Dataset({
+        'a': (['t', 'y', 'x'], numpy.arange(24.0).reshape((2, 3, 4))),
+        }, coords={'t': [0, 1], 'x': numpy.arange(4.0), 'y': numpy.arange(3.0)})
+
+
+def test_frame_ring():
+    ring = FrameRing(2, 8 * 12)
+    other = FrameRing(ring.slots, ring.slot_bytes, name=ring.name)
+
+    ring.view(1, (3, 4), 'f8')[...] = 5
+    numpy.testing.assert_array_equal(other.view(1, (3, 4), 'f8'), 5)
+    numpy.testing.assert_array_equal(other.view(0, (3, 4), 'f8'), 0)
+
+    assert [ring.next_slot() for _ in range(3)] == [0, 1, 0]
+
+    with pytest.raises(ValueError):
+        ring.view(0, (4, 4), 'f8')
+
+    other.close()
+
+    # Views still in use keep the memory around until they are gone
+    view = ring.view(0, (3, 4), 'f8')
+    assert not ring.close(unlink=True)
+    view[...] = 1
+    del view
+    assert ring.close()
+
+
+def test_frame_process():
+    ds = frames_dataset()
+    frames = FrameProcess(ds, slots=2)
+    try:
+        frames.configure((3, 4), 'f8')
+        a = frames.read('a', 'x', 'y', {'t': 0})
+        b = frames.read('a', 'x', 'y', {'t': 1})
+        numpy.testing.assert_array_equal(a, ds.a[0])
+        numpy.testing.assert_array_equal(b, ds.a[1])
+
+        # Frames coloured in the worker match those coloured here
+        image = LutImage.for_slice(ds, ds.a[1], 'x', 'y', vmin=0, vmax=23)
+        frames.configure((3, 4), 'f8', colour=image.settings())
+        pixels = frames.read('a', 'x', 'y', {'t': 1})
+        assert isinstance(pixels, Pixels)
+        numpy.testing.assert_array_equal(pixels.pixels, image.pixels)
+
+        with pytest.raises(RuntimeError):
+            frames.read('missing', 'x', 'y', {'t': 0})
+
+        # A bigger ring replaces the old one, which is closed once its frames
+        # on screen are replaced
+        old = frames.ring
+        frames.configure((3, 4), 'c16')
+        assert frames._retired == [old]
+        numpy.testing.assert_array_equal(b, ds.a[1])
+        del a, b, pixels
+        frames.read('a', 'x', 'y', {'t': 0})
+        assert frames._retired == []
+    finally:
+        frames.close()
+
+
+def test_widget_offload(qtbot):
+    ds = frames_dataset()
+    widget = Widget(ds, offload=True)
+    qtbot.addWidget(widget)
+    try:
+        widget.xdim.setCurrentText('x')
+        widget.ydim.setCurrentText('y')
+        widget.change_axes()
+
+        read = widget._frame_reader('t')
+        frame = read(1)
+        numpy.testing.assert_array_equal(frame, ds.a[1])
+
+        widget.renderer.setCurrentText('image')
+        read = widget._frame_reader('t')
+        frame = read(1)
+        assert isinstance(frame, Pixels)
+
+        widget.show_frame('t', 1, frame)
+        assert widget.plot.pixels is frame.pixels
+    finally:
+        widget.frames.close()
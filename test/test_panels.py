@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.reader import SliceReader
+from xncview.memory import MemoryBudget
+from xncview.panels import MultiWidget
+from xncview.plot import geographic_projection
+import xncview.panels
+
+import cartopy.mpl.geoaxes
+import xarray
+import numpy
+
+
+def sample_dataset():
+    return xarray.Dataset({
+        'a': (['t', 'y', 'x'], numpy.arange(24.0).reshape((2, 3, 4))),
+        'b': (['t', 'y', 'x'], -numpy.arange(24.0).reshape((2, 3, 4))),
+        'c': (['y', 'x'], numpy.ones((3, 4))),
+        }).chunk({'t': 1})
+
+
+def test_slice_reader():
+    ds = sample_dataset()
+    reader = SliceReader(MemoryBudget())
+
+    a, b, a2 = reader.read([(ds.a, 'x', 'y', {'t': 1}), (ds.b, 'x', 'y', {'t': 1}),
+        (ds.a, 'x', 'y', {'t': 1})])
+    assert reader.computes == 1
+    assert a is a2
+    numpy.testing.assert_array_equal(b, -ds.a.isel(t=1))
+
+    # Cached slices don't need another compute
+    reader.read([(ds.a, 'x', 'y', {'t': 1})])
+    assert reader.computes == 1
+
+
+def test_multi_widget(qtbot):
+    ds = sample_dataset()
+
+    widget = MultiWidget(ds, ['a', 'b', 'c'])
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+
+    assert all(p.plot is not None for p in widget.panels)
+    assert not widget.dims['t'].isHidden()
+
+    computes = widget.reader.computes
+    widget.dims['t'].setValue(1)
+    assert widget.reader.computes == computes + 1
+    numpy.testing.assert_array_equal(widget.panels[1].plot.get_array().ravel(),
+            -numpy.arange(12.0, 24.0))
+
+
+def test_multi_widget_projection(qtbot, monkeypatch):
+    # Coastlines would need downloading
+    monkeypatch.setattr(cartopy.mpl.geoaxes.GeoAxes, 'coastlines', lambda self, **kwargs: None)
+
+    ds = xarray.Dataset({
+        'a': (['lat', 'lon'], numpy.random.random((3, 4))),
+        'b': (['lat', 'lon'], numpy.random.random((3, 4))),
+        }, coords={
+            'lat': ('lat', [-30.0, 0.0, 30.0], {'units': 'degrees_north'}),
+            'lon': ('lon', [0.0, 90.0, 180.0, 270.0], {'units': 'degrees_east'}),
+        })
+
+    widget = MultiWidget(ds, ['a', 'b'])
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('lon')
+    widget.ydim.setCurrentText('lat')
+    widget.change_axes()
+    assert not widget.projection.isHidden()
+
+    widget.projection.setCurrentText('Robinson')
+    assert all(p.axis.projection == geographic_projection('Robinson') for p in widget.panels)
+    numpy.testing.assert_allclose(widget.panels[0].colorbar.bounds, [ds.a.min(), ds.a.max()])
+
+
+def test_multi_widget_plot_error(qtbot, monkeypatch):
+    ds = sample_dataset()
+
+    widget = MultiWidget(ds, ['a', 'b'])
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+
+    # A plotting error in one panel leaves the others drawn
+    plot_slice = xncview.panels.plot_slice
+    def failing(axis, dataset, v, *args, **kwargs):
+        if v.name == 'a':
+            raise ValueError('Bad slice')
+        return plot_slice(axis, dataset, v, *args, **kwargs)
+    monkeypatch.setattr(xncview.panels, 'plot_slice', failing)
+
+    widget.dims['t'].setValue(1)
+    assert widget.panels[0].plot is None
+    assert widget.panels[1].plot is not None
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.playback import FramePipeline, PlaybackWidget
+from xncview.widget import Widget
+
+import xarray
+import numpy
+
+
+def test_pipeline():
+    pipeline = FramePipeline(lambda i: i * 2, lambda v: v + 1)
+
+    for k in range(3):
+        pipeline.request(k, k)
+
+    assert pipeline.pop(2) == 5
+    pipeline.discard([0])
+    assert list(pipeline.pending) == [1]
+
+    pipeline.shutdown()
+    assert len(pipeline.pending) == 0
+
+
+def test_playback(qtbot):
+    ds = xarray.Dataset({
+            'a': (['t','y','x'], numpy.arange(5*2*2, dtype='f8').reshape((5,2,2))),
+        },
+        coords = {
+            't': (['t'], [1,2,3,4,5]),
+        })
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentIndex(widget.xdim.findText('x'))
+    widget.ydim.setCurrentIndex(widget.ydim.findText('y'))
+    widget.change_axes()
+
+    assert widget.playback.sizes == {'t': 5}
+
+    widget.playback.loop.setChecked(False)
+    widget.playback.fps.setValue(50)
+
+    with qtbot.waitSignal(widget.playback.frameReady) as blocker:
+        widget.playback.play()
+    dim, index, frame = blocker.args
+    assert dim == 't'
+    numpy.testing.assert_equal(frame, ds.a.isel(t=index).values)
+
+    # Playback stops at the end of the dimension
+    qtbot.waitUntil(lambda: not widget.playback.isPlaying())
+    assert widget.dims['t'].value() == 4
+
+
+def test_playback_error(qtbot):
+    def reader(dim):
+        def read(index):
+            raise RuntimeError('read failed')
+        return read
+
+    playback = PlaybackWidget(reader, lambda v: v, lambda dim: 0)
+    qtbot.addWidget(playback)
+    playback.setDimensions({'t': 5})
+    playback.fps.setValue(50)
+    playback.play()
+
+    # The error stops playback rather than escaping the timer
+    qtbot.waitUntil(lambda: not playback.isPlaying())
+    assert 'read failed' in playback.status.text()
+    assert not playback.button.isChecked()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.profiling import FrameTimer
+from xncview.widget import Widget
+
+import json
+import xarray
+import numpy
+
+
+def test_frame_timer(tmpdir):
+    timer = FrameTimer(history=2)
+    timer.record()
+
+    for i in range(3):
+        with timer.frame(index=i):
+            with timer.stage('read'):
+                pass
+            with timer.stage('read'):
+                pass
+            timer.add_tasks(xarray.DataArray(numpy.zeros(4)).chunk(2).sum())
+
+    assert len(timer.history) == 2
+    assert set(timer.last()) == {'read', 'total'}
+    assert set(timer.average()) == {'read', 'total'}
+    assert timer.history[-1]['tasks'] > 0
+
+    path = tmpdir.join('trace.jsonl')
+    timer.write_trace(str(path))
+    records = [json.loads(l) for l in path.readlines()]
+    assert [r['index'] for r in records] == [0, 1, 2]
+
+
+def test_widget_timings(qtbot):
+    ds = xarray.Dataset({
+        'b': (['x','y'], numpy.zeros((2,2,))),
+        })
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.redraw()
+
+    stages = widget.timer.last()
+    for s in ['read', 'bounds', 'pcolormesh', 'draw', 'colorbar']:
+        assert s in stages
+    assert 'read' in widget.timings.text()
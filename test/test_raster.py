@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.raster import PixelMapping, build_mapping, nearest_mapping
+from xncview.lookup import build_index
+from xncview.widget import Widget
+
+import pytest
+import xarray
+import numpy
+
+
+def test_pixel_mapping():
+    # Four cells in the left pixel, two in the right, one outside
+    px = numpy.array([0.1, 0.2, 0.3, 0.4, 1.5, 2.0, 5.0])
+    py = numpy.zeros(7)
+    m = PixelMapping(px, py, (0, 2, 0, 1), (1, 2), ('cell',))
+
+    values = numpy.array([1, 2, numpy.nan, 5, 10, 20, 100])
+    numpy.testing.assert_allclose(m.rasterise(values, 'mean'), [[8 / 3, 15]])
+    numpy.testing.assert_allclose(m.rasterise(values, 'max'), [[5, 20]])
+    numpy.testing.assert_allclose(m.rasterise(values, 'min'), [[1, 10]])
+    numpy.testing.assert_allclose(m.rasterise(values, 'first'), [[1, 10]])
+
+    with pytest.raises(ValueError):
+        m.rasterise(values[:3])
+
+
+def test_build_mapping():
+    ds = xarray.Dataset(coords={'x': numpy.arange(4.0), 'y': numpy.arange(2.0)})
+    m = build_mapping(ds, 'x', 'y', (2, 4))
+    assert m.dims == ('y', 'x')
+
+    values = numpy.arange(8.0).reshape((2, 4))
+    numpy.testing.assert_array_equal(m.rasterise(values), values)
+
+
+def unstructured_dataset(n=1000):
+    rng = numpy.random.default_rng(0)
+    lon = rng.uniform(0, 360, n)
+    lat = rng.uniform(-90, 90, n)
+    return xarray.Dataset({
+        'a': (['time', 'cell'], numpy.stack([lat, -lat])),
+        }, coords={
+            'lon': ('cell', lon, {'units': 'degrees_east'}),
+            'lat': ('cell', lat, {'units': 'degrees_north'}),
+        })
+
+
+def test_unstructured_index():
+    ds = unstructured_dataset()
+    index = build_index(ds, 'lon', 'lat')
+    assert index.query(float(ds.lon[10]), float(ds.lat[10])) == {'cell': 10}
+
+
+def test_nearest_mapping():
+    ds = unstructured_dataset(n=50)
+    index = build_index(ds, 'lon', 'lat')
+    m = nearest_mapping(ds, 'lon', 'lat', (100, 200), index)
+
+    # Every pixel is filled, unlike binning the centres
+    raster = m.rasterise(ds.a.isel(time=0).values)
+    assert numpy.isfinite(raster).all()
+    assert numpy.isnan(build_mapping(ds, 'lon', 'lat', (100, 200)).rasterise(
+        ds.a.isel(time=0).values)).any()
+
+    # with the value of the nearest cell
+    for k in [0, 10, 20]:
+        x0, x1, y0, y1 = m.extent
+        i = int((float(ds.lon[k]) - x0) / (x1 - x0) * 200)
+        j = int((float(ds.lat[k]) - y0) / (y1 - y0) * 100)
+        assert raster[min(j, 99), min(i, 199)] == ds.a[0, k]
+
+
+def test_widget_raster_sparse(qtbot):
+    # Projected coordinates, so no coastlines are drawn
+    ds = unstructured_dataset(n=50)
+    ds = ds.assign_coords(lon=ds.lon.assign_attrs(units='m'), lat=ds.lat.assign_attrs(units='m'))
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('lon')
+    widget.ydim.setCurrentText('lat')
+    widget.change_axes()
+    qtbot.waitUntil(lambda: widget._grid_index('lon', 'lat') is not None)
+
+    widget.redraw()
+    assert widget.raster is not None
+    assert numpy.isfinite(widget.raster.rasterise(ds.a.isel(time=0).values)).all()
+
+
+def test_widget_raster(qtbot):
+    ds = xarray.Dataset({
+        'a': (['y', 'x'], numpy.arange(12.0).reshape((3, 4))),
+        }, coords={'x': numpy.arange(4.0), 'y': numpy.arange(3.0)})
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+
+    # Few cells, so pcolormesh is used automatically
+    assert widget.raster is None
+
+    widget.renderer.setCurrentText('raster')
+    assert widget.raster is not None
+    assert widget.raster.dims == ('y', 'x')
+    assert len(widget.raster_mappings) == 1
+
+    widget.aggregation.setCurrentText('max')
+    assert numpy.nanmax(widget.plot.get_array()) == 11
+    assert len(widget.raster_mappings) == 1
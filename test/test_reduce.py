@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.reduce import stream_reduce, reduce_dims
+from xncview.widget import Widget
+
+import pytest
+import xarray
+import numpy
+
+
+def sample_data():
+    data = numpy.random.random((6,3,2,2))
+    data[0,0,0,0] = numpy.nan
+    return xarray.DataArray(data, dims=['t','z','y','x'])
+
+
+@pytest.mark.parametrize('op', ['mean', 'min', 'max', 'std'])
+def test_reduce(op):
+    da = sample_data()
+    expect = getattr(da, op)('t')
+
+    # Streamed in chunks of 2 times, one chunk at a time
+    results = list(stream_reduce(da.chunk({'t': 2}), {'t': op}, batch=1))
+    assert [f for f, _ in results] == [2/6, 4/6, 1]
+    numpy.testing.assert_allclose(results[-1][1], expect)
+
+    numpy.testing.assert_allclose(reduce_dims(da, {'t': op}), expect)
+
+
+def test_std_large_mean():
+    # Small variations on a large offset, like temperatures in K
+    data = 1e8 + numpy.random.default_rng(0).random((12, 3, 4))
+    data[:5, 0, 0] = numpy.nan
+    data[:, 1, 1] = numpy.nan
+    da = xarray.DataArray(data, dims=['t', 'y', 'x'])
+
+    result = reduce_dims(da.chunk({'t': 2}), {'t': 'std'})
+    numpy.testing.assert_allclose(result, da.std('t'), rtol=1e-6)
+
+
+def test_reduce_multiple():
+    da = sample_data()
+    result = reduce_dims(da.chunk({'t': 4}), {'t': 'mean', 'z': 'max'})
+    numpy.testing.assert_allclose(result, da.max('z').mean('t'))
+    assert result.dims == ('y', 'x')
+
+
+def test_widget_reduction(qtbot):
+    ds = xarray.Dataset({'a': sample_data()}).chunk({'t': 1})
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentIndex(widget.xdim.findText('x'))
+    widget.ydim.setCurrentIndex(widget.ydim.findText('y'))
+    widget.change_axes()
+
+    widget.dims['t'].modebox.setCurrentText('mean')
+    assert widget.reduction_progress.isVisibleTo(widget)
+
+    qtbot.waitUntil(lambda: len(widget.reductions) == 1)
+    assert not widget.reduction_progress.isVisibleTo(widget)
+    numpy.testing.assert_allclose(widget.plot.get_array(), ds.a.isel(z=0).mean('t'))
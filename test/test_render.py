@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.render import render_frames, write_animation, render, add_arguments
+
+import os
+import argparse
+import pytest
+import xarray
+import numpy
+
+
+def sample_dataset():
+    return xarray.Dataset({
+            'a': (['t','y','x'], numpy.random.random((4,3,2))),
+        },
+        coords = {
+            'x': (['x'], [1,2]),
+            'y': (['y'], [1,2,3]),
+            't': (['t'], [1,2,3,4]),
+        })
+
+
+def test_render_frames(tmpdir):
+    ds = sample_dataset()
+
+    pattern = os.path.join(tmpdir, '{variable}_{index}.png')
+    frames = render_frames(ds, 'a', 't', range(0, 4, 2), pattern, x='x', y='y', workers=2)
+
+    assert frames == [os.path.join(tmpdir, 'a_0.png'), os.path.join(tmpdir, 'a_2.png')]
+    for f in frames:
+        assert os.path.exists(f)
+
+
+def test_write_animation(tmpdir):
+    ds = sample_dataset()
+
+    pattern = os.path.join(tmpdir, '{index}.png')
+    frames = render_frames(ds, 'a', 't', range(4), pattern, x='x', y='y',
+            bounds=[0, 1], figsize=(2, 2), workers=1)
+
+    output = os.path.join(tmpdir, 'a.gif')
+    write_animation(frames, output)
+    assert os.path.getsize(output) > 0
+
+
+def test_render_2d(tmpdir):
+    ds = sample_dataset().isel(t=0, drop=True)
+
+    # A single frame if there's no dimension to step through
+    output = os.path.join(tmpdir, '{variable}_{index}.png')
+    args = add_arguments(argparse.ArgumentParser()).parse_args(
+            ['--variable', 'a', '-x', 'x', '-y', 'y', '--workers', '1', '--output', output])
+    assert render(ds, args) == [os.path.join(tmpdir, 'a_0.png')]
+    assert os.path.exists(os.path.join(tmpdir, 'a_0.png'))
+
+
+def test_render_empty_range(tmpdir):
+    output = os.path.join(tmpdir, 'a.gif')
+    args = add_arguments(argparse.ArgumentParser()).parse_args(
+            ['--variable', 'a', '-x', 'x', '-y', 'y', '--start', '3', '--stop', '3', '--output', output])
+    with pytest.raises(SystemExit, match='No frames'):
+        render(sample_dataset(), args)
+    assert not os.path.exists(output)
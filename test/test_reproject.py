@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.reproject import ReprojectionWeights, grid_extent, fit_shape
+from xncview.plot import geographic_projection, projections
+from xncview.widget import Widget
+
+import cartopy.crs
+import cartopy.mpl.geoaxes
+import xarray
+import numpy
+
+
+def global_dataset():
+    lon = numpy.arange(0.5, 360, 1.0)
+    lat = numpy.arange(-89.5, 90, 1.0)
+    return xarray.Dataset({
+        'a': (['lat', 'lon'], numpy.broadcast_to(lat[:, None], (lat.size, lon.size))),
+        }, coords={
+            'lon': ('lon', lon, {'units': 'degrees_east'}),
+            'lat': ('lat', lat, {'units': 'degrees_north'}),
+        })
+
+
+def test_projections():
+    for name in projections:
+        assert isinstance(geographic_projection(name), cartopy.crs.Projection)
+
+
+def test_fit_shape():
+    assert fit_shape((0, 2, 0, 1), (100, 100)) == (50, 100)
+    assert fit_shape((0, 1, 0, 2), (100, 100)) == (100, 50)
+
+
+def test_weights():
+    ds = global_dataset()
+    projection = geographic_projection('Robinson')
+
+    extent = grid_extent(ds, 'lon', 'lat', projection)
+    w = ReprojectionWeights(ds, 'lon', 'lat', projection, extent, (50, 100))
+    assert w.method == 'bilinear'
+    assert w.dims == ('lon', 'lat')
+
+    raster = w.rasterise(ds.a.transpose(*w.dims).values)
+    assert raster.shape == (50, 100)
+
+    # Corners are off the globe
+    assert numpy.isnan(raster[0, 0])
+
+    # Each pixel has the latitude of its centre
+    x0, x1, y0, y1 = extent
+    px = (x0 + x1) / 2
+    py = y0 + (numpy.arange(50) + 0.5) * (y1 - y0) / 50
+    lat = cartopy.crs.PlateCarree().transform_points(projection, numpy.full(50, px), py)[:, 1]
+    inside = numpy.abs(lat) < 89.5
+    numpy.testing.assert_allclose(raster[inside, 50], lat[inside], atol=1e-6)
+
+
+def test_curvilinear_weights():
+    ds = global_dataset()
+    lon, lat = xarray.broadcast(ds.lon, ds.lat)
+    curvilinear = xarray.Dataset({'a': ds.a}, coords={
+        'glon': (['lat', 'lon'], lon.transpose('lat', 'lon').values, {'units': 'degrees_east'}),
+        'glat': (['lat', 'lon'], lat.transpose('lat', 'lon').values, {'units': 'degrees_north'}),
+        }).drop_vars(['lon', 'lat'])
+
+    projection = geographic_projection('NorthPolarStereo')
+    extent = grid_extent(curvilinear, 'glon', 'glat', projection,
+            view=(-5e6, 5e6, -5e6, 5e6))
+    w = ReprojectionWeights(curvilinear, 'glon', 'glat', projection, extent, (40, 40))
+    assert w.method == 'nearest'
+
+    raster = w.rasterise(curvilinear.a.transpose(*w.dims).values)
+    assert numpy.nanmin(raster) > 0
+
+
+def test_widget(qtbot, monkeypatch):
+    # The coastline data can't be downloaded here
+    monkeypatch.setattr(cartopy.mpl.geoaxes.GeoAxes, 'coastlines', lambda self, **kwargs: None)
+
+    widget = Widget(global_dataset())
+    qtbot.addWidget(widget)
+    widget.resize(400, 300)
+
+    # Reprojection is used automatically for projections other than the default
+    widget.projection.setCurrentText('Robinson')
+    assert isinstance(widget.raster, ReprojectionWeights)
+    assert widget.plot is not None
+
+    # Weights are cached between frames
+    weights = widget.raster
+    widget.redraw()
+    assert widget.raster is weights
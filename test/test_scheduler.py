@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.scheduler import Scheduler
+from xncview.memory import MemoryBudget
+from xncview.widget import Widget
+
+import pytest
+import xarray
+import numpy
+
+
+def test_local_schedulers():
+    da = xarray.DataArray(numpy.arange(10.0)).chunk(2)
+
+    s = Scheduler('threads:2')
+    assert s.kind == 'threads' and s.workers == 2
+    assert s.in_process
+    assert s.compute(da.sum()) == 45
+
+    s = Scheduler('processes')
+    assert not s.in_process
+    assert MemoryBudget().compute(da.sum(), scheduler=s) == 45
+
+    with pytest.raises(ValueError):
+        Scheduler('bogus')
+
+
+def test_distributed(qtbot):
+    distributed = pytest.importorskip('dask.distributed')
+
+    # In-process cluster, so no network is needed
+    with distributed.LocalCluster(processes=False, n_workers=1, dashboard_address=None) as cluster:
+        s = Scheduler(cluster.scheduler_address)
+        assert s.kind == 'distributed'
+
+        ds = xarray.Dataset({
+            'b': (['t','x','y'], numpy.arange(8.0).reshape((2,2,2))),
+            }).chunk({'t': 1})
+
+        widget = Widget(ds, scheduler=s)
+        qtbot.addWidget(widget)
+        numpy.testing.assert_equal(widget.colorbar.bounds, [0, 7])
+
+        s.close()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.seam import SeamGrid, SeamMesh, seam_grid, wraps, grids
+from xncview.plot import plot_slice, geographic_projection, _bounds_token
+import xncview.memory
+
+import cartopy.crs
+from matplotlib.figure import Figure
+import xarray
+import numpy
+import pytest
+
+
+def test_wraps():
+    assert wraps(geographic_projection('PlateCarree'))
+    assert wraps(geographic_projection('Robinson'))
+    assert not wraps(geographic_projection('NorthPolarStereo'))
+
+
+def test_roll():
+    # 0-360 grid on a map centred on 180, the seam is at 0
+    lon = numpy.linspace(-30, 330, 9)
+    lat = numpy.array([-10.0, 0.0, 10.0])
+    grid = SeamGrid(lon, lat, ('lat', 'lon'), cartopy.crs.PlateCarree(central_longitude=180))
+
+    x = grid.coordinates[0, :, 0]
+    assert (numpy.diff(x) > 0).all()
+    numpy.testing.assert_allclose(x[[0, -1]], [-180, 180])
+
+    # The first cell, from -30 to 15, is split across the seam
+    assert (grid.columns == 0).sum() == 2
+    assert (grid.columns == 1).sum() == 1
+
+    values = numpy.arange(16.0).reshape((2, 8))
+    mesh = grid.mesh_values(values)
+    assert mesh.shape == (2, grid.columns.size)
+    numpy.testing.assert_array_equal(mesh[1], values[1, grid.columns])
+
+
+def test_roll_regional():
+    # Gap between two parts of a regional grid either side of the seam
+    lon = numpy.array([150.0, 170.0, 190.0, 210.0])
+    grid = SeamGrid(lon, numpy.array([0.0, 10.0]), ('lat', 'lon'), cartopy.crs.PlateCarree())
+
+    assert -1 in grid.columns
+    values = grid.mesh_values(numpy.ones((1, 3)))
+    assert values.mask[0, grid.columns == -1].all()
+    assert values.count() == 4
+
+    with pytest.raises(ValueError):
+        SeamGrid(numpy.linspace(0, 720, 9), numpy.array([0.0, 1.0]), ('lat', 'lon'), cartopy.crs.PlateCarree())
+
+
+def test_split():
+    lon, lat = numpy.meshgrid(numpy.linspace(45, 405, 5), numpy.array([-10.0, 0.0, 10.0]))
+    grid = SeamGrid(lon, lat, ('y', 'x'), cartopy.crs.PlateCarree())
+
+    # The cells from 135 to 225 wrap on a map centred on 0
+    wrapped = numpy.zeros((2, 4), dtype=bool)
+    wrapped[:, 1] = True
+    numpy.testing.assert_array_equal(grid.hidden, wrapped)
+    assert grid.polygons.shape == (4, 4, 2)
+
+    # One copy on each side of the map
+    x = grid.polygons[..., 0]
+    assert x[0].min() < 180 < x[0].max()
+    assert x[2].min() < -180 < x[2].max()
+
+    values = numpy.arange(8.0).reshape((2, 4))
+    numpy.testing.assert_array_equal(grid.polygon_values(values), [1, 5, 1, 5])
+    assert grid.mesh_values(values).mask[:, 1].all()
+
+    # Cells with an edge on the seam don't wrap
+    lon, lat = numpy.meshgrid(numpy.linspace(0, 360, 5), numpy.array([-10.0, 0.0, 10.0]))
+    grid = SeamGrid(lon, lat, ('y', 'x'), cartopy.crs.PlateCarree())
+    assert not grid.hidden.any()
+
+
+def test_plot_slice(monkeypatch):
+    grids.clear()
+    lon = numpy.arange(0.5, 360, 1.0)
+    lat = numpy.arange(-89.5, 90, 1.0)
+    ds = xarray.Dataset({
+        'a': (['lon', 'lat'], numpy.broadcast_to(lon[:, None], (lon.size, lat.size))),
+        }, coords={
+            'lon': ('lon', lon, {'units': 'degrees_east'}),
+            'lat': ('lat', lat, {'units': 'degrees_north'}),
+        })
+
+    figure = Figure()
+    axis = figure.add_subplot(projection=geographic_projection())
+    plot = plot_slice(axis, ds, ds.a, 'lon', 'lat', coastlines=False, vmin=0, vmax=360)
+    assert isinstance(plot, SeamMesh)
+    assert len(grids) == 1
+
+    # Values come through in the slice's dimension order
+    plot.set_array(ds.a.values * 2)
+    assert plot.get_array().shape == (180, 360)
+
+    # The grid is reused, without hashing the coordinates again
+    monkeypatch.setattr(xncview.memory.dask.base, 'tokenize', None)
+    axis.clear()
+    plot_slice(axis, ds, ds.a, 'lon', 'lat', coastlines=False)
+    assert len(grids) == 1
+    figure.canvas.draw()
+
+    # and looked up by the token of the coordinates, not their edge values
+    assert grids.values()[0] is seam_grid(None, None, ('lat', 'lon'), axis.projection,
+            token=_bounds_token(ds, 'lon', 'lat'))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.section import SectionWeights, path_samples
+from xncview.widget import Widget
+
+import pytest
+import xarray
+import numpy
+
+
+def linear_dataset():
+    x = numpy.arange(10.0)
+    y = numpy.arange(8.0)
+    z = numpy.arange(3.0)
+    data = z[:, None, None] * 100 + y[None, :, None] * 10 + x[None, None, :]
+    return xarray.Dataset({
+        'a': (['z', 'y', 'x'], data),
+        }, coords={'x': x, 'y': y, 'z': z}).chunk({'z': 1, 'y': 4, 'x': 5})
+
+
+def test_path_samples():
+    px, py, d = path_samples([(0, 0), (3, 4)], samples=6)
+    numpy.testing.assert_allclose(d, [0, 1, 2, 3, 4, 5])
+    numpy.testing.assert_allclose(px, [0, 0.6, 1.2, 1.8, 2.4, 3])
+
+    with pytest.raises(ValueError):
+        path_samples([(0, 0)])
+
+
+def test_bilinear():
+    ds = linear_dataset()
+    weights = SectionWeights(ds, 'x', 'y', [(0.5, 1.5), (6.5, 1.5), (6.5, 5.5)], samples=11)
+
+    section = weights.apply(ds.a)
+    assert section.dims == ('z', 'distance')
+
+    px, py, _ = path_samples([(0.5, 1.5), (6.5, 1.5), (6.5, 5.5)], samples=11)
+    numpy.testing.assert_allclose(section.isel(z=2), 200 + py * 10 + px)
+
+    # Only the points around the path are read
+    assert weights.select(ds.a).sizes['point'] < ds.x.size * ds.y.size / 2
+
+
+def test_nearest_and_outside():
+    ds = linear_dataset()
+    weights = SectionWeights(ds, 'x', 'y', [(-5, 2.2), (4.2, 2.2)], method='nearest', samples=5)
+
+    section = weights.apply(ds.a.isel(z=0))
+    assert numpy.isnan(section.values[0])
+    numpy.testing.assert_allclose(section.values[-1], 24)
+
+    with pytest.raises(ValueError):
+        SectionWeights(ds, 'x', 'y', [(20, 20), (30, 30)])
+
+
+def test_curvilinear():
+    lon, lat = numpy.meshgrid(numpy.arange(10.0), numpy.arange(8.0))
+    ds = xarray.Dataset({
+        'a': (['j', 'i'], lat * 10 + lon),
+        }, coords={
+            'lon': (['j', 'i'], lon),
+            'lat': (['j', 'i'], lat),
+        })
+
+    weights = SectionWeights(ds, 'lon', 'lat', [(1, 1), (1, 6)], samples=6)
+    assert weights.method == 'nearest'
+    numpy.testing.assert_allclose(weights.apply(ds.a), [11, 21, 31, 41, 51, 61])
+
+
+def test_widget_section(qtbot):
+    ds = linear_dataset()
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+
+    widget._path = [(0.5, 1.5), (6.5, 1.5)]
+    widget._finish_path()
+    assert not widget.section.isHidden()
+    assert widget.section.weights is not None
+
+    widget._redraw_section()
+    assert 'grid points read' in widget.section.info.text()
+
+    # An unsupported method is reported rather than raised from the slot
+    widget.section.method.addItem('cubic')
+    widget.section.method.setCurrentText('cubic')
+    assert widget.section.weights is None
+    assert 'No section' in widget.section.info.text()
+
+    widget.section.method.setCurrentText('nearest')
+    assert widget.section.weights is not None
+    assert 'grid points read' in widget.section.info.text()
+
+    # Changing axes drops the path
+    widget.change_axes()
+    assert widget.section.weights is None
+
+
+def test_projected():
+    # Projected coordinates don't wrap, and distance is in their units
+    ds = xarray.Dataset({
+        'a': (['y', 'x'], numpy.tile(numpy.arange(101.0), (6, 1))),
+        }, coords={
+            'x': ('x', numpy.arange(0.0, 100001.0, 1000), {'axis': 'X', 'units': 'm'}),
+            'y': ('y', numpy.arange(0.0, 5001.0, 1000), {'axis': 'Y', 'units': 'm'}),
+        })
+
+    weights = SectionWeights(ds, 'x', 'y', [(50200., 2100.), (50200., 4100.)],
+            method='nearest', samples=3)
+    assert weights.units == 'm'
+    numpy.testing.assert_allclose(weights.distance, [0, 1000, 2000])
+    numpy.testing.assert_array_equal(weights.apply(ds.a), [50, 50, 50])
+
+    # Nothing is interpolated past the end of the grid
+    weights = SectionWeights(ds, 'x', 'y', [(99500., 2000.), (100500., 2000.)], samples=3)
+    assert weights.valid.tolist() == [True, True, False]
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.serve import TileServer, TileCache, make_server, tile_extent, tile_cells, render_tile
+import xncview.serve as serve
+
+import io
+import json
+import threading
+import urllib.request
+import urllib.error
+import pytest
+import xarray
+import numpy
+import matplotlib.image
+
+
+def sample_dataset():
+    return xarray.Dataset({
+        'a': (['time', 'lat', 'lon'], numpy.random.random((2, 18, 36))),
+        }, coords={
+            'lat': ('lat', numpy.linspace(-85, 85, 18), {'units': 'degrees_north'}),
+            'lon': ('lon', numpy.linspace(0, 350, 36), {'units': 'degrees_east'}),
+        })
+
+
+def test_tile_extent():
+    assert tile_extent(0, 0, 0, (0, 4, 0, 2)) == (0, 4, 0, 2)
+    assert tile_extent(1, 1, 0, (0, 4, 0, 2)) == (2, 4, 1, 2)
+
+    with pytest.raises(ValueError):
+        tile_extent(1, 2, 0, (0, 4, 0, 2))
+    with pytest.raises(ValueError):
+        tile_extent(-1, 0, 0, (0, 4, 0, 2))
+
+
+def test_tile_cache(tmpdir):
+    cache = TileCache(limit=10, directory=str(tmpdir))
+    cache.put(('a', '', 0, 0, 0), b'12345678')
+    cache.put(('a', '', 1, 0, 0), b'abcdefgh')
+
+    # Evicted from memory, but still on disk
+    assert cache.nbytes == 8
+    assert cache.get(('a', '', 0, 0, 0)) == b'12345678'
+    assert cache.hits['disk'] == 1
+
+    assert TileCache(directory=str(tmpdir)).get(('a', '', 1, 0, 0)) == b'abcdefgh'
+
+
+def test_server(tmpdir):
+    tiles = TileServer(sample_dataset(), workers=0, cache=TileCache(directory=str(tmpdir)))
+    httpd = make_server(tiles, port=0)
+    assert httpd.server_address[0] == '127.0.0.1'
+
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{httpd.server_address[1]}'
+
+    try:
+        with urllib.request.urlopen(f'{url}/variables') as r:
+            assert json.load(r) == {'a': {'time': 2}}
+
+        with urllib.request.urlopen(f'{url}/tiles/a/1/0/0.png?time=1') as r:
+            assert r.headers['Content-Type'] == 'image/png'
+            image = matplotlib.image.imread(io.BytesIO(r.read()))
+        assert image.shape[:2] == (256, 256)
+
+        with urllib.request.urlopen(f'{url}/tiles/a/1/0/0.png?time=1') as r:
+            r.read()
+        assert tiles.cache.hits['memory'] == 1
+
+        for path, status in [('/tiles/b/0/0/0.png', 404), ('/tiles/a/0/1/0.png', 404),
+                ('/tiles/a/-1/0/0.png', 404), ('/tiles/a/0/0/0.png?time=5', 400), ('/other', 404)]:
+            with pytest.raises(urllib.error.HTTPError) as e:
+                urllib.request.urlopen(url + path)
+            assert e.value.code == status
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        tiles.close()
+
+
+def test_tile_cells(monkeypatch):
+    ds = sample_dataset()
+
+    # A quarter of the map in degrees, with a cell either side
+    region = tile_cells(ds, 'lon', 'lat', (0, 175, 0, 85))
+    assert region == {'lat': slice(8, 18), 'lon': slice(0, 19)}
+
+    # A tile inside a single cell still gets that cell
+    region = tile_cells(ds, 'lon', 'lat', (101, 102, 1, 2))
+    assert ds.lon[region['lon']].min() <= 101 <= ds.lon[region['lon']].max() + 5
+    assert 0 < region['lon'].stop - region['lon'].start <= 3
+
+    assert tile_cells(ds, 'lon', 'lat', (1000, 2000, 0, 1))['lon'] == slice(0, 0)
+
+    # The cell bounds are only worked out once per grid
+    monkeypatch.setattr(serve, '_get_bounds', None)
+    assert tile_cells(ds, 'lon', 'lat', (0, 175, 0, 85)) == {'lat': slice(8, 18), 'lon': slice(0, 19)}
+
+
+def test_render_tile_subset(monkeypatch):
+    ds = sample_dataset()
+
+    # Zoomed in only part of the grid is drawn, but the tile is the same
+    subset = matplotlib.image.imread(io.BytesIO(render_tile(ds, 'a', 'lon', 'lat', {}, [0, 1], 2, 1, 1)))
+    monkeypatch.setattr(serve, 'tile_cells', lambda *args: None)
+    full = matplotlib.image.imread(io.BytesIO(render_tile(ds, 'a', 'lon', 'lat', {}, [0, 1], 2, 1, 1)))
+
+    assert (subset[..., 3] > 0).all()
+    numpy.testing.assert_allclose(subset, full, atol=1/255)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from xncview.tasks import TaskQueue
+
+import concurrent.futures
+import threading
+import pytest
+
+
+def blocked_queue():
+    """
+    Queue with its one worker held until the returned event is set
+    """
+    queue = TaskQueue(1)
+    release = threading.Event()
+    started = threading.Event()
+    def block():
+        started.set()
+        release.wait()
+    queue.schedule('visible', block)
+    started.wait()
+    return queue, release
+
+
+def test_priority_order():
+    queue, release = blocked_queue()
+
+    order = []
+    tasks = [queue.schedule(p, order.append, p) for p in ['warmup', 'statistics', 'visible', 'predicted', 'visible']]
+    assert queue.depth() == {'visible': 2, 'predicted': 1, 'statistics': 1, 'warmup': 1}
+
+    release.set()
+    concurrent.futures.wait(tasks)
+    assert order == ['visible', 'visible', 'predicted', 'statistics', 'warmup']
+    assert queue.mean_wait('warmup') >= queue.mean_wait('visible')
+    assert 'warmup' in queue.summary()
+
+
+def test_submit_is_statistics():
+    queue = TaskQueue(1)
+    task = queue.submit(lambda a, b=1: a + b, 1, b=2)
+    assert task.result(timeout=5) == 3
+    assert task.priority == 'statistics'
+
+    with pytest.raises(ValueError):
+        queue.schedule('urgent', print)
+
+
+def test_checkpoint_runs_urgent():
+    queue = TaskQueue(1)
+    order = []
+    queued = threading.Event()
+
+    def background():
+        for chunk in range(3):
+            if chunk == 1:
+                queued.wait()
+            queue.checkpoint()
+            order.append(chunk)
+
+    task = queue.schedule('warmup', background)
+    urgent = queue.schedule('visible', order.append, 'urgent')
+    queued.set()
+
+    task.result(timeout=5)
+    assert urgent.done()
+    # The urgent task ran at a chunk boundary, in the middle of the other
+    assert order.index('urgent') < order.index(2)
+
+
+def test_checkpoint_waits_for_running():
+    queue = TaskQueue(1)
+    order = []
+
+    with queue.running('visible'):
+        task = queue.schedule('statistics', lambda: (queue.checkpoint(), order.append('background')))
+        with pytest.raises(concurrent.futures.TimeoutError):
+            task.result(timeout=0.3)
+        order.append('visible')
+
+    task.result(timeout=5)
+    assert order == ['visible', 'background']
+
+
+def test_cancel():
+    queue, release = blocked_queue()
+
+    ran = []
+    pending = queue.schedule('statistics', ran.append, 1)
+    assert pending.cancel()
+    assert queue.depth()['statistics'] == 0
+    release.set()
+
+    # Running tasks stop at their next checkpoint
+    started = threading.Event()
+    stop = threading.Event()
+    def chunks():
+        started.set()
+        stop.wait()
+        queue.checkpoint()
+        ran.append(2)
+
+    running = queue.schedule('statistics', chunks)
+    started.wait()
+    assert not running.cancel()
+    stop.set()
+
+    with pytest.raises(concurrent.futures.CancelledError):
+        running.result(timeout=5)
+    assert ran == []
+
+
+def test_errors():
+    queue = TaskQueue(1)
+    task = queue.schedule('statistics', lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        task.result(timeout=5)
+
+    queue.shutdown()
+    with pytest.raises(RuntimeError):
+        queue.schedule('statistics', print)
+
+
+def test_reserved_worker():
+    queue = TaskQueue(2, reserved=1)
+    release = threading.Event()
+    started = threading.Barrier(3)
+
+    def block():
+        started.wait()
+        release.wait()
+
+    # Tasks that don't checkpoint hold the general workers
+    blocked = [queue.schedule('statistics', block) for _ in range(2)]
+    started.wait()
+
+    assert queue.schedule('visible', lambda: 1).result(timeout=1) == 1
+
+    # The reserved worker doesn't take less urgent tasks
+    warmup = queue.schedule('warmup', lambda: 2)
+    with pytest.raises(concurrent.futures.TimeoutError):
+        warmup.result(timeout=0.2)
+
+    release.set()
+    assert warmup.result(timeout=5) == 2
+    concurrent.futures.wait(blocked)
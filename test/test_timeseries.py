@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.timeseries import TimeContiguousCopy
+import xncview.timeseries
+from xncview.widget import Widget
+
+import os
+import xarray
+import numpy
+
+
+def test_time_contiguous_copy():
+    da = xarray.DataArray(numpy.random.random((5, 3, 4)), dims=['time', 'y', 'x'],
+            name='a').chunk({'time': 1})
+
+    copy = TimeContiguousCopy(da, 'time')
+    assert copy.dims == ['y', 'x', 'time']
+
+    progress = []
+    assert copy.build(progress=progress.append)
+    assert progress[-1] == 1
+
+    numpy.testing.assert_array_equal(copy.extract({'x': 2, 'y': 1}), da.isel(x=2, y=1).values)
+
+    path = copy.path
+    copy.close()
+    assert not os.path.exists(path)
+
+
+def test_widget_timeseries(qtbot):
+    ds = xarray.Dataset({
+        'a': (['time', 'y', 'x'], numpy.arange(24.0).reshape((2, 3, 4))),
+        }, coords={'x': numpy.arange(4.0), 'y': numpy.arange(3.0)})
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+    assert widget.timeseries.dim == 'time'
+
+    with qtbot.waitSignal(widget.timeseries._extracted):
+        widget.timeseries.extract({'x': 1, 'y': 2})
+    assert 'source files' in widget.timeseries.latency.text()
+
+    with qtbot.waitSignal(widget.timeseries._copyFinished):
+        widget.timeseries.build_copy()
+    assert widget.timeseries.copy.complete
+
+    with qtbot.waitSignal(widget.timeseries._extracted):
+        widget.timeseries.extract({'x': 1, 'y': 2})
+    assert 'local copy' in widget.timeseries.latency.text()
+    numpy.testing.assert_array_equal(widget.timeseries.axis.lines[0].get_ydata(), [9, 21])
+
+
+def test_copy_batches(monkeypatch):
+    da = xarray.DataArray(numpy.random.random((7, 3, 4)), dims=['time', 'y', 'x'],
+            name='a').chunk({'time': 2})
+
+    # Chunks are written a couple at a time
+    monkeypatch.setattr(xncview.timeseries, 'write_batch', 4 * 3 * 4 * 8)
+    computed = []
+    copy = TimeContiguousCopy(da, 'time')
+    assert copy.build(lambda v: computed.append(v.sizes['time']) or v.compute())
+    assert computed == [2, 2, 2, 1]
+
+    numpy.testing.assert_array_equal(copy._data, da.transpose('y', 'x', 'time').values)
+    copy.close()
+
+
+def test_widget_copy_failed(qtbot):
+    ds = xarray.Dataset({
+        'a': (['time', 'y', 'x'], numpy.arange(24.0).reshape((2, 3, 4))),
+        }, coords={'x': numpy.arange(4.0), 'y': numpy.arange(3.0)})
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+
+    timeseries = widget.timeseries
+    def fail(obj):
+        raise RuntimeError('disk full')
+    timeseries._compute = fail
+
+    with qtbot.waitSignal(timeseries._copyFinished):
+        timeseries.build_copy()
+    assert timeseries.copy is None
+    assert 'disk full' in timeseries.latency.text()
+    assert timeseries.copy_button.isEnabled()
+    assert not timeseries.copy_progress.isVisibleTo(timeseries)
+
+    # It can be tried again
+    timeseries._compute = lambda obj: obj.compute()
+    with qtbot.waitSignal(timeseries._copyFinished):
+        timeseries.build_copy()
+    assert timeseries.copy.complete
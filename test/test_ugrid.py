@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Copyright 2019 Scott Wales
+#
+# Author: Scott Wales <scott.wales@unimelb.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from xncview.ugrid import mesh_coords, mesh_of, face_nodes, load_mesh, mesh_token, Mesh, meshes
+import xncview.memory
+from xncview.interpret_cf import classify_vars
+from xncview.plot import plot_slice, geographic_projection
+from xncview.widget import Widget
+
+import matplotlib.collections
+from matplotlib.figure import Figure
+import xarray
+import numpy
+
+
+def ugrid_dataset(geographic=True):
+    """
+    Two quads and a triangle, 1-based with a fill value, the last quad
+    crossing the dateline
+    """
+    lon = numpy.array([0.0, 10.0, 10.0, 0.0, 20.0, 170.0, -170.0, -170.0, 170.0])
+    lat = numpy.array([0.0, 0.0, 10.0, 10.0, 5.0, 0.0, 0.0, 10.0, 10.0])
+    faces = numpy.array([[1, 2, 3, 4], [2, 5, 3, -1], [6, 7, 8, 9]])
+
+    ds = xarray.Dataset({
+        'mesh': ((), 0, {
+            'cf_role': 'mesh_topology',
+            'topology_dimension': 2,
+            'node_coordinates': 'node_lon node_lat',
+            'face_node_connectivity': 'face_nodes',
+            }),
+        'face_nodes': (['face', 'max_nodes'], faces, {'start_index': 1, '_FillValue': -1}),
+        'node_lon': ('node', lon, {'units': 'degrees_east'} if geographic else {}),
+        'node_lat': ('node', lat, {'units': 'degrees_north'} if geographic else {}),
+        'a': (['time', 'face'], numpy.arange(6.0).reshape((2, 3)), {'mesh': 'mesh', 'location': 'face'}),
+        'b': (['time', 'node'], numpy.zeros((2, 9)), {'mesh': 'mesh', 'location': 'node'}),
+        })
+    return mesh_coords(ds)
+
+
+def test_classify():
+    ds = ugrid_dataset()
+    classes = classify_vars(ds)
+    assert {'mesh', 'face_nodes', 'node_lon', 'node_lat'} <= classes['mesh']
+    assert {'a', 'b'} <= classes['data']
+    assert 'face_nodes' not in classes['data']
+
+
+def test_mesh_coords():
+    ds = ugrid_dataset()
+    assert mesh_of(ds, 'mesh_face_x', 'mesh_face_y') == ('mesh', 'face')
+    assert mesh_of(ds, 'node_lat', 'node_lon') == ('mesh', 'node')
+    assert mesh_of(ds, 'node_lon', 'mesh_face_y') is None
+
+    assert 'mesh_face_x' in ds.a.coords
+    assert ds.mesh_face_x.attrs['units'] == 'degrees_east'
+
+    # Centre of the dateline face is on the dateline, not the prime meridian
+    numpy.testing.assert_allclose(abs(ds.mesh_face_x.values[2]), 180)
+    numpy.testing.assert_allclose(ds.mesh_face_x.values[0], 5)
+
+    # Applying twice doesn't change anything
+    assert mesh_coords(ds).identical(ds)
+
+
+def test_face_nodes():
+    ds = ugrid_dataset()
+    faces = face_nodes(ds, 'mesh')
+    numpy.testing.assert_array_equal(faces[1], [1, 4, 2, -1])
+
+    # Decoded fill values are NaN
+    decoded = xarray.decode_cf(ds.drop_vars(['mesh_face_x', 'mesh_face_y']))
+    assert decoded.face_nodes.dtype.kind == 'f'
+    numpy.testing.assert_array_equal(face_nodes(decoded, 'mesh'), faces)
+
+
+def test_polygons():
+    ds = ugrid_dataset()
+    mesh = Mesh(ds.node_lon.values, ds.node_lat.values, face_nodes(ds, 'mesh'), 'face', geographic=True)
+    assert mesh.polygons.shape == (3, 4, 2)
+
+    # Short faces repeat their last node
+    numpy.testing.assert_array_equal(mesh.polygons[1, 3], mesh.polygons[1, 2])
+
+    # Faces crossing the dateline stay in one piece
+    x = mesh.polygons[2, :, 0]
+    assert x.max() - x.min() == 20
+
+
+def test_triangulation():
+    ds = ugrid_dataset()
+    mesh = Mesh(ds.node_lon.values, ds.node_lat.values, face_nodes(ds, 'mesh'), 'node', geographic=True)
+    # Two from each quad, one from the triangle
+    assert mesh.triangulation.triangles.shape == (5, 3)
+    # The dateline quad is left out
+    dateline = (mesh.triangulation.triangles >= 5).all(axis=1)
+    numpy.testing.assert_array_equal(mesh.triangulation.mask, dateline)
+
+
+def test_load_mesh(tmp_path):
+    meshes.clear()
+    ds = ugrid_dataset()
+
+    mesh = load_mesh(ds, 'mesh_face_x', 'mesh_face_y', directory=tmp_path)
+    assert mesh.location == 'face'
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # Cached in memory
+    assert load_mesh(ds, 'mesh_face_x', 'mesh_face_y') is mesh
+
+    # Cached on disk
+    meshes.clear()
+    again = load_mesh(ds, 'mesh_face_x', 'mesh_face_y', directory=tmp_path)
+    assert again is not mesh
+    numpy.testing.assert_array_equal(again.polygons, mesh.polygons)
+
+    assert load_mesh(ds, 'node_lon', 'node_lat').location == 'node'
+    assert load_mesh(ds, 'time', 'face') is None
+
+
+def test_mesh_token(monkeypatch):
+    ds = ugrid_dataset()
+    token = mesh_token(ds, 'mesh')
+
+    # Not hashed again while the mesh is unchanged
+    monkeypatch.setattr(xncview.memory.dask.base, 'tokenize', None)
+    assert mesh_token(ds, 'mesh') == token
+    monkeypatch.undo()
+
+    moved = ds.assign(node_lon=ds.node_lon + 1)
+    assert mesh_token(moved, 'mesh') != token
+
+
+def test_plot_slice():
+    ds = ugrid_dataset()
+
+    figure = Figure()
+    axis = figure.add_subplot(projection=geographic_projection())
+    plot = plot_slice(axis, ds, ds.a.isel(time=0), 'mesh_face_x', 'mesh_face_y', coastlines=False,
+            vmin=0, vmax=5)
+    assert isinstance(plot, matplotlib.collections.PolyCollection)
+    assert plot.get_clim() == (0, 5)
+
+    # Only the colours change between frames
+    plot.set_array(ds.a.isel(time=1).values)
+
+    plot = plot_slice(figure.add_subplot(), ds, ds.b.isel(time=0), 'node_lon', 'node_lat')
+    assert plot is not None
+
+
+def test_widget(qtbot):
+    ds = ugrid_dataset(geographic=False)
+
+    widget = Widget(ds)
+    qtbot.addWidget(widget)
+    widget.varlist.setCurrentText('a')
+    widget.xdim.setCurrentText('mesh_face_x')
+    widget.ydim.setCurrentText('mesh_face_y')
+    widget.change_axes()
+
+    assert widget.raster is None
+    assert isinstance(widget.plot, matplotlib.collections.PolyCollection)
@@ -108,3 +108,26 @@ def test_get_bounds():
 
     b = _get_bounds(ds, 'c')
     numpy.testing.assert_equal(b, [[0.5,1.5,2.5],[0.5,1.5,2.5],[0.5,1.5,2.5]])
+
+
+def test_warm_up(qtbot):
+    ds = xarray.Dataset({
+        'a': (['t', 'y', 'x'], numpy.random.random((2, 3, 4))),
+        'b': (['t', 'y', 'x'], numpy.random.random((2, 3, 4))),
+        'c': (['z', 'x'], numpy.random.random((2, 4))),
+        }, coords={'x': numpy.arange(4.0), 'y': numpy.arange(3.0)})
+
+    widget = Widget(ds)
+    widget.varlist.setCurrentIndex(widget.varlist.findText('a'))
+    widget.xdim.setCurrentText('x')
+    widget.ydim.setCurrentText('y')
+    widget.change_axes()
+
+    # The same slice of 'b' is read in the background once the view settles,
+    # 'c' doesn't have the plotting axes
+    qtbot.waitUntil(lambda: len(widget._warmup) > 0)
+    for task in widget._warmup:
+        task.result(timeout=5)
+    keys = [key for key, _ in widget.slices.eviction_values()]
+    assert ('b', 'x', 'y', (('t', 0),)) in keys
+    assert not any(key[0] == 'c' for key in keys)